@@ -0,0 +1,114 @@
+"""超大歌单的内存占用
+
+生成 N 行的歌单文件，用 tracemalloc 统计批量处理过程中的内存峰值，对比：
+- 原方式：逐个编码整体读取为列表，结果累积在列表中，最后一次性写报告；
+- 流式方式：BatchDownloader.download_from_file(按开头一段判断编码、逐行读取、结果随时追加到报告临时文件)。
+下载本身替换为不联网的空操作，只衡量歌单读取和结果记录部分。
+流式方式的耗时包含 _process_songs 逐首处理和输出日志的开销，原方式没有这部分，耗时不能直接比较。
+
+下载成功的歌曲会加入已存在歌曲集合(即曲库索引，下次运行时同样会从下载目录扫描得到)，
+这部分内存随成功数增长，与歌单读取方式无关；默认成功率为 0 以单独观察读取和报告的开销。
+
+用法(在项目根目录运行):
+    python -m benchmarks.large_playlist_memory
+    python -m benchmarks.large_playlist_memory --sizes 10000,100000,1000000 --success-rate 0.1
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from src.core.batch_downloader import BatchDownloader
+from src.core.config import config
+from src.handlers.report import DownloadReportManager
+
+
+class OfflineBatchDownloader(BatchDownloader):
+    """不联网、不等待的批量下载器，按给定成功率随机返回结果"""
+
+    def __init__(self, success_rate: float):
+        super().__init__(callback=lambda message: None, auto_retry=False)
+        self.success_rate = success_rate
+        self.rng = random.Random(0)
+
+    async def _download_and_wait(self, song: str, quality: int, download_lyrics: bool,
+                                 embed_lyrics: bool, only_lyrics: bool) -> bool:
+        return self.rng.random() < self.success_rate
+
+
+def write_playlist(path: Path, lines: int) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(lines):
+            f.write(f"测试歌曲{i} - 测试歌手{i % 1000}\n")
+
+
+def legacy_read(filename: str) -> List[str]:
+    """原来的读取方式：依次用每种编码读取整个文件"""
+    for encoding in ["utf-8", "gbk", "gb2312", "ansi"]:
+        try:
+            with open(filename, "r", encoding=encoding) as f:
+                return [line.strip() for line in f if line.strip()]
+        except UnicodeDecodeError:
+            continue
+    raise UnicodeError("无法使用任何支持的编码读取文件")
+
+
+async def run_legacy(path: Path, success_rate: float) -> None:
+    songs = legacy_read(str(path))
+    rng = random.Random(0)
+    results = {'success': [], 'failed': [], 'skipped': []}
+    for song in songs:
+        results['success' if rng.random() < success_rate else 'failed'].append(song)
+    DownloadReportManager(config.REPORTS_DIR, lambda message: None).save_report(
+        {'total': len(songs), **results}, path.stem
+    )
+
+
+async def run_streaming(path: Path, success_rate: float) -> None:
+    await OfflineBatchDownloader(success_rate).download_from_file(str(path))
+
+
+def measure(run: Callable, path: Path, success_rate: float) -> Tuple[float, float]:
+    """返回 (内存峰值MB, 耗时秒)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    asyncio.run(run(path, success_rate))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='超大歌单的内存占用')
+    parser.add_argument('--sizes', default="10000,100000,1000000", help='歌单行数，逗号分隔')
+    parser.add_argument('--success-rate', type=float, default=0.0, help='模拟的下载成功率，默认0')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp = Path(tmp_dir)
+        # 下载目录、报告目录都放在临时目录中，不影响真实曲库
+        config.DOWNLOADS_DIR = tmp / 'downloads'
+        config.DOWNLOADS_FILE = config.DOWNLOADS_DIR / 'downloads.txt'
+        config.REPORTS_DIR = config.DOWNLOADS_DIR / 'reports'
+        config.REPORTS_DIR.mkdir(parents=True)
+        config.STATE_DIR = tmp / 'state'
+        config.STATE_DIR.mkdir()
+
+        print(f"{'行数':>10} {'原方式峰值':>12} {'流式峰值':>12} {'原方式耗时':>10} {'流式耗时':>10}")
+        for size in (int(value) for value in args.sizes.split(',')):
+            path = tmp / f"playlist_{size}.txt"
+            write_playlist(path, size)
+            legacy_peak, legacy_time = measure(run_legacy, path, args.success_rate)
+            stream_peak, stream_time = measure(run_streaming, path, args.success_rate)
+            print(f"{size:>10} {legacy_peak:>10.1f}MB {stream_peak:>10.1f}MB "
+                  f"{legacy_time:>9.1f}s {stream_time:>9.1f}s")
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ from pathlib import Path
 from src.core.downloader import MusicDownloader
 from src.core.batch_downloader import BatchDownloader
 from src.core.config import config
+from src.services.download_planner import ORDER_DEADLINE, ORDER_PLAYLIST, ORDER_POLICIES, parse_deadline
+from src.handlers.report import show_stats
 
 # Windows 平台特定的异步 IO 修复
 if platform.system() == 'Windows':
@@ -69,14 +71,46 @@ async def download_single(args):
 async def download_batch(args):
     cli_logger = CLILogger()
     downloader = BatchDownloader(callback=cli_logger.log_message, auto_retry=not args.retry)
-    
-    await downloader.download_from_file(
-        file_path=args.file,
-        quality=args.quality,
-        download_lyrics=args.lyrics,
-        embed_lyrics=args.embed_lyrics,
-        only_lyrics=args.only_lyrics
-    )
+
+    if args.from_report:
+        # 只重试报告中失败的歌曲
+        await downloader.retry_from_report(
+            args.from_report,
+            quality=args.quality,
+            download_lyrics=args.lyrics,
+            embed_lyrics=args.embed_lyrics,
+            only_lyrics=args.only_lyrics,
+            concurrency=args.concurrency
+        )
+        return
+
+    quality = args.quality or config.DEFAULT_QUALITY
+    deadline = parse_deadline(args.deadline) if args.deadline else None
+    if len(args.file) == 1 and not Path(args.file[0]).is_dir():
+        await downloader.download_from_file(
+            file_path=args.file[0],
+            quality=quality,
+            download_lyrics=args.lyrics,
+            embed_lyrics=args.embed_lyrics,
+            only_lyrics=args.only_lyrics,
+            resume=args.resume,
+            order=args.order,
+            deadline=deadline,
+            plan_only=args.plan
+        )
+    else:
+        # 多个歌单或歌单目录：合并去重后统一下载
+        await downloader.download_from_sources(
+            sources=args.file,
+            quality=quality,
+            download_lyrics=args.lyrics,
+            embed_lyrics=args.embed_lyrics,
+            only_lyrics=args.only_lyrics,
+            resume=args.resume,
+            order=args.order,
+            deadline=deadline,
+            plan_only=args.plan
+        )
 
 def main():
     parser = argparse.ArgumentParser(description='音乐下载器命令行工具')
@@ -93,19 +127,47 @@ def main():
 
     # 批量下载参数
     batch_parser = subparsers.add_parser('batch', help='批量下载')
-    batch_parser.add_argument('file', help='歌单文件路径或URL')
-    batch_parser.add_argument('-q', '--quality', type=int, default=11, help='音质等级(4-14)，默认为11')
+    batch_parser.add_argument('file', nargs='*', help='歌单文件路径、URL或歌单目录，可指定多个')
+    batch_parser.add_argument('-q', '--quality', type=int, default=None,
+                              help='音质等级(4-14)，默认为11；--from-report 时默认使用报告中的音质')
     batch_parser.add_argument('-l', '--lyrics', action='store_true', help='下载歌词')
     batch_parser.add_argument('-e', '--embed-lyrics', action='store_true', help='嵌入歌词')
     batch_parser.add_argument('--only-lyrics', action='store_true', help='仅下载歌词')
     batch_parser.add_argument('-r', '--retry', action='store_true', help='失败重试')
+    batch_parser.add_argument('--resume', action='store_true', help='从上次中断的位置继续下载，已成功或跳过的歌曲不再处理，上次失败的歌曲重新下载')
+    batch_parser.add_argument('--from-report', default=None,
+                              help='只重试该报告(结构化报告 .jsonl 或文本报告 .txt)中下载失败的歌曲')
+    batch_parser.add_argument('--concurrency', type=int, default=3, help='--from-report 时同时重试的歌曲数，默认3')
+    batch_parser.add_argument('--order', choices=ORDER_POLICIES, default=ORDER_PLAYLIST,
+                              help='下载顺序: playlist 歌单顺序(默认)，sjf 小文件优先，ljf 大文件优先，'
+                                   'deadline 尽量多的歌曲在 --deadline 前完成')
+    batch_parser.add_argument('--deadline', default=None, help='截止时间，例如 07:00、90m、2h')
+    batch_parser.add_argument('--plan', action='store_true', help='只显示下载计划(总量和预计耗时)，不下载')
+
+    # 下载报告统计
+    report_parser = subparsers.add_parser('report', help='下载报告统计')
+    report_parser.add_argument('action', choices=['stats'], help='stats: 统计结构化报告中的耗时和吞吐量')
+    report_parser.add_argument('files', nargs='*', help='结构化报告文件，默认为报告目录中的全部')
+    report_parser.add_argument('--days', type=float, default=None, help='只统计最近若干天的记录')
+    report_parser.add_argument('--playlist', default=None, help='只统计该歌单')
 
     args = parser.parse_args()
 
     if args.command == 'single':
         asyncio.run(download_single(args))
     elif args.command == 'batch':
+        if not args.file and not args.from_report:
+            batch_parser.error('请指定歌单文件、URL或 --from-report')
+        if args.order == ORDER_DEADLINE and not args.deadline:
+            batch_parser.error('--order deadline 需要指定 --deadline')
+        if args.deadline:
+            try:
+                parse_deadline(args.deadline)
+            except ValueError as e:
+                batch_parser.error(str(e))
         asyncio.run(download_batch(args))
+    elif args.command == 'report':
+        show_stats(args.files, args.days, args.playlist)
     else:
         parser.print_help()
 
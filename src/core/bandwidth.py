@@ -0,0 +1,290 @@
+"""全局带宽限制
+
+进程内所有 download_with_progress 的下载共享一个令牌桶(按字节)：每读到一块数据就预约相应的令牌，
+令牌不足时等待。预约按先后顺序排队，同时下载的多首歌曲每轮各得一块，平分限速。
+
+限速按时段配置在 config.BANDWIDTH_SCHEDULE_FILE(JSON)中，文件修改后几秒内生效，无需重启：
+    {
+        "default": null,
+        "schedules": [
+            {"start": "09:00", "end": "18:00", "days": [1, 2, 3, 4, 5], "limit": "2MB"},
+            {"start": "23:00", "end": "07:00", "limit": null}
+        ]
+    }
+limit 为每秒字节数，可以写成 "2MB"、"500KB" 或数字，null 表示不限速；days 为星期(1 为周一)，省略时每天生效；
+结束时间早于开始时间的时段跨过午夜。不在任何时段内时使用 default。
+还可以用 set 命令临时覆盖时段设置，到期后自动恢复。
+
+用法(在项目根目录运行):
+    python -m src.core.bandwidth status
+    python -m src.core.bandwidth set 1MB --minutes 30
+    python -m src.core.bandwidth clear
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import humanize
+
+from .config import config
+
+_RATE_PATTERN = re.compile(r'^\s*([\d.]+)\s*([kmg]?)(?:i?b)?(?:/s)?\s*$', re.IGNORECASE)
+_RATE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_rate(value: Union[str, int, float, None]) -> Optional[float]:
+    """把 "2MB"、"500KB"、数字等转换为每秒字节数，None、0 或 "unlimited" 表示不限速"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    if value.strip().lower() in ('', 'unlimited', 'none', 'off'):
+        return None
+    match = _RATE_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"无法识别的限速: {value}")
+    rate = float(match.group(1)) * _RATE_UNITS[match.group(2).lower()]
+    return rate if rate > 0 else None
+
+
+def _parse_time(value: str) -> int:
+    """"HH:MM" -> 当天的分钟数"""
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def format_rate(rate: Optional[float]) -> str:
+    return "不限速" if rate is None else f"{humanize.naturalsize(rate)}/s"
+
+
+class BandwidthSchedule:
+    """按时段的限速设置"""
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.default = parse_rate(data.get('default'))
+        self.rules: List[Dict[str, Any]] = []
+        for rule in data.get('schedules', []):
+            self.rules.append({
+                'start': _parse_time(rule['start']),
+                'end': _parse_time(rule['end']),
+                'days': set(rule.get('days') or range(1, 8)),
+                'limit': parse_rate(rule.get('limit')),
+                'label': f"{rule['start']}-{rule['end']}",
+            })
+        override = data.get('override')
+        self.override = None
+        if override and (not override.get('until') or override['until'] > time.time()):
+            self.override = {'limit': parse_rate(override.get('limit')), 'until': override.get('until')}
+
+    def rate_at(self, moment: datetime) -> Tuple[Optional[float], str]:
+        """moment 时的限速及其来源"""
+        if self.override and (not self.override['until'] or self.override['until'] > moment.timestamp()):
+            return self.override['limit'], "临时设置"
+        minute = moment.hour * 60 + moment.minute
+        day = moment.isoweekday()
+        for rule in self.rules:
+            if rule['start'] <= rule['end']:
+                active = rule['start'] <= minute < rule['end'] and day in rule['days']
+            else:
+                # 跨过午夜的时段，星期按时段开始的那天计算
+                previous_day = day - 1 or 7
+                active = ((minute >= rule['start'] and day in rule['days'])
+                          or (minute < rule['end'] and previous_day in rule['days']))
+            if active:
+                return rule['limit'], f"时段 {rule['label']}"
+        return self.default, "默认"
+
+
+class BandwidthGovernor:
+    """进程内全局的下载限速(令牌桶)
+
+    可以在多个线程、多个事件循环中同时使用(界面的下载线程各自创建事件循环)，
+    因此令牌的计算用线程锁保护，等待只在调用方的事件循环中 sleep。
+    """
+
+    def __init__(self, schedule_file: Optional[Path] = None, burst_seconds: float = 1.0,
+                 reload_interval: float = 5.0, window_seconds: int = 5):
+        self._schedule_file = schedule_file
+        self.burst_seconds = burst_seconds
+        self.reload_interval = reload_interval
+        self.window_seconds = window_seconds
+        self.schedule = BandwidthSchedule()
+        self.load_error: Optional[str] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._updated_at = time.monotonic()
+        self._rate: Optional[float] = None
+        self._rate_source = "默认"
+        # 最近几秒每秒的下载字节数: [秒, 字节数]
+        self._window: deque = deque()
+        self.total_bytes = 0
+        self.total_wait = 0.0
+
+    @property
+    def schedule_file(self) -> Path:
+        return Path(self._schedule_file or config.BANDWIDTH_SCHEDULE_FILE)
+
+    def _maybe_reload(self, now: float) -> None:
+        """定期检查设置文件，修改后重新读取；文件有误时保留之前的设置"""
+        if now - self._checked_at < self.reload_interval and self._checked_at:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.schedule_file)
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            data = None
+            if mtime is not None:
+                with open(self.schedule_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            self.schedule = BandwidthSchedule(data)
+            self.load_error = None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.load_error = f"读取限速设置失败: {str(e)}"
+
+    def _refresh_rate(self, now: float) -> None:
+        self._maybe_reload(now)
+        rate, self._rate_source = self.schedule.rate_at(datetime.now())
+        if rate != self._rate:
+            # 限速变化立即生效：令牌数不超过新的桶容量
+            self._rate = rate
+            if rate is not None:
+                self._tokens = min(self._tokens, rate * self.burst_seconds)
+
+    def reserve(self, nbytes: int) -> float:
+        """预约 nbytes 字节的令牌，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._refresh_rate(now)
+            self._record(nbytes, now)
+            if self._rate is None:
+                self._tokens, self._updated_at = 0.0, now
+                return 0.0
+            capacity = self._rate * self.burst_seconds
+            self._tokens = min(capacity, self._tokens + (now - self._updated_at) * self._rate) - nbytes
+            self._updated_at = now
+            wait = max(0.0, -self._tokens / self._rate)
+            self.total_wait += wait
+            return wait
+
+    async def acquire(self, nbytes: int) -> None:
+        """下载 nbytes 字节后调用，超出限速时等待"""
+        wait = self.reserve(nbytes)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _record(self, nbytes: int, now: float) -> None:
+        second = int(now)
+        if self._window and self._window[-1][0] == second:
+            self._window[-1][1] += nbytes
+        else:
+            self._window.append([second, nbytes])
+        while self._window and self._window[0][0] <= second - self.window_seconds:
+            self._window.popleft()
+        self.total_bytes += nbytes
+
+    def current_rate(self) -> float:
+        """最近几秒的实际下载速率(字节/秒)"""
+        with self._lock:
+            now = time.monotonic()
+            cutoff = int(now) - self.window_seconds
+            recent = sum(nbytes for second, nbytes in self._window if second > cutoff)
+        return recent / self.window_seconds
+
+    def allowed_rate(self) -> Optional[float]:
+        """当前允许的速率(字节/秒)，None 表示不限速"""
+        with self._lock:
+            self._refresh_rate(time.monotonic())
+            return self._rate
+
+    def status(self) -> Dict[str, Any]:
+        allowed = self.allowed_rate()
+        return {
+            'current_bps': round(self.current_rate()),
+            'allowed_bps': allowed,
+            'source': self._rate_source,
+            'total_bytes': self.total_bytes,
+            'total_wait_s': round(self.total_wait, 1),
+            'error': self.load_error,
+        }
+
+    def summary(self) -> str:
+        status = self.status()
+        text = (f"{humanize.naturalsize(status['current_bps'])}/s，限速 {format_rate(status['allowed_bps'])}"
+                f"({status['source']})")
+        if status['error']:
+            text += f"，{status['error']}"
+        return text
+
+    def set_override(self, limit: Optional[str], minutes: Optional[float] = None) -> None:
+        """写入临时限速(所有进程在重新读取设置后生效)，limit 为 None 时清除临时限速"""
+        data: Dict[str, Any] = {}
+        if self.schedule_file.exists():
+            with open(self.schedule_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        if limit is None:
+            data.pop('override', None)
+        else:
+            parse_rate(limit)
+            data['override'] = {'limit': limit, 'until': time.time() + minutes * 60 if minutes else None}
+        self.schedule_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = self.schedule_file.with_suffix('.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.schedule_file)
+        self._checked_at = 0.0
+
+
+# 全局实例，进程内所有下载共享
+bandwidth_governor = BandwidthGovernor()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='下载限速设置')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='显示限速时段和当前生效的限速')
+    set_parser = subparsers.add_parser('set', help='临时设置限速，例如 2MB、500KB、unlimited')
+    set_parser.add_argument('limit', help='每秒字节数')
+    set_parser.add_argument('--minutes', type=float, default=None, help='有效时长(分钟)，默认一直有效直到 clear')
+    subparsers.add_parser('clear', help='清除临时限速，恢复按时段限速')
+    args = parser.parse_args()
+
+    governor = bandwidth_governor
+    if args.command == 'set':
+        governor.set_override(args.limit, args.minutes)
+    elif args.command == 'clear':
+        governor.set_override(None)
+
+    status = governor.status()
+    if status['error']:
+        print(status['error'])
+    print(f"设置文件: {governor.schedule_file}")
+    schedule = governor.schedule
+    for rule in schedule.rules:
+        days = ",".join(str(day) for day in sorted(rule['days']))
+        print(f"  {rule['label']} 星期 {days}: {format_rate(rule['limit'])}")
+    print(f"  其他时间: {format_rate(schedule.default)}")
+    if schedule.override:
+        until = schedule.override['until']
+        print(f"  临时设置: {format_rate(schedule.override['limit'])}"
+              + (f"，至 {datetime.fromtimestamp(until):%Y-%m-%d %H:%M}" if until else ""))
+    print(f"当前限速: {format_rate(status['allowed_bps'])} ({status['source']})")
+
+
+if __name__ == "__main__":
+    main()
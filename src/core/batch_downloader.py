@@ -1,15 +1,23 @@
+import asyncio
 import os
 import threading
 import time
 import random
-from typing import Optional, Callable, Set, List
+from datetime import datetime
+from itertools import zip_longest
+from typing import Optional, Callable, Dict, Iterable, Set, List, Tuple, Union, AsyncIterable
 from pathlib import Path
 
 from .config import config
-from .downloader import MusicDownloader
+from .downloader import MusicDownloader, ERROR_LOW_CONFIDENCE
 from ..handlers.playlist import PlaylistManager
-from ..handlers.report import DownloadReportManager
+from ..handlers.report import DownloadReportManager, load_failed_songs
+from ..services.batch_checkpoint import BatchCheckpoint
+from ..services.download_planner import ORDER_PLAYLIST, DownloadPlan, PlannedSong, parse_size, plan_downloads
+from ..utils.async_iter import aiter_items, buffered
 from ..utils.decorators import ensure_downloads_dir
+from ..utils.pause import is_paused, wait_while_paused
+from ..utils.song_key import song_idempotency_key
 from ..utils.song_scanner import SongScanner
 
 
@@ -17,122 +25,588 @@ class BatchDownloader(MusicDownloader):
     """批量下载器"""
 
     def __init__(self, callback: Optional[Callable] = None, stop_event: Optional[threading.Event] = None,
-                 auto_retry: bool = True):
-        super().__init__(callback)
+                 auto_retry: bool = True, pause_event: Optional[threading.Event] = None):
+        super().__init__(callback, pause_event=pause_event)
         self.existing_songs: Set[str] = set()
         self.stop_event = stop_event
+        self.download_manager.stop_event = stop_event
         self.playlist_manager = PlaylistManager(callback)
         self.report_manager = DownloadReportManager(config.DOWNLOADS_DIR / 'reports', callback)
         self.auto_retry = auto_retry
+        # 歌单中的 "歌名 - 歌手" 按匹配得分选择搜索结果，低置信度的不下载
+        self.match_songs = True
+        # 当前批量下载的检查点日志，以及正在下载的歌曲 (序号, 歌曲)
+        self.checkpoint: Optional[BatchCheckpoint] = None
+        self._checkpoint_song: Optional[Tuple[int, str]] = None
 
     @ensure_downloads_dir
     async def download_from_file(self, file_path: str, quality: int = 11,
                                  download_lyrics: bool = False, embed_lyrics: bool = False,
-                                 only_lyrics: bool = False) -> None:
-        """从文件或URL批量下载歌曲"""
+                                 only_lyrics: bool = False, resume: bool = False,
+                                 order: str = ORDER_PLAYLIST, deadline: Optional[datetime] = None,
+                                 plan_only: bool = False) -> None:
+        """从文件或URL批量下载歌曲
+
+        下载进度记录在检查点日志中，resume 为 True 时从上次中断(停止或崩溃)的位置继续。
+        order 不是歌单顺序或 plan_only 为 True 时，先获取整个歌单和每首歌曲的大小，
+        按 order 排列并显示下载计划(总量、预计耗时)；plan_only 为 True 时只显示计划不下载。
+        """
         try:
             self.log("开始批量下载...")
             playlist_name = None
+            total = None
 
             if file_path.startswith(('http://', 'https://')):
                 self.log(f"正在获取歌单: {file_path}")
-                songs = await self.playlist_manager.get_playlist_songs(file_path)
-                if self.playlist_manager.current_playlist:
-                    playlist_name = self.playlist_manager.current_playlist['name']
+                # 边接收歌单边下载，歌单名在接收完成后从 current_playlist 中获取
+                songs = buffered(self.playlist_manager.iter_playlist_songs(file_path))
             else:
                 self.log(f"读取文件: {file_path}")
                 if not os.path.exists(file_path):
                     raise FileNotFoundError("找不到指定的文件")
-                songs = self.playlist_manager.read_playlist_file(file_path)
+                # 逐行读取，超大的歌单文件也不会一次性载入内存
+                total = self.playlist_manager.count_playlist_lines(file_path)
+                songs = self.playlist_manager.iter_playlist_file(file_path)
                 playlist_name = Path(file_path).stem
+                if not total:
+                    self.log("没有找到要下载的歌曲")
+                    return
+
+            if order != ORDER_PLAYLIST or plan_only:
+                # 排序需要整个歌单，不再边获取边下载
+                songs = [song async for song in aiter_items(songs)]
+                playlist_name = playlist_name or self.playlist_manager.current_playlist.get('name')
+                songs, _ = await self._plan_songs(songs, quality, order, deadline)
+                if plan_only:
+                    return
+                total = len(songs)
+
+            await self._process_songs(songs, quality, download_lyrics, embed_lyrics, only_lyrics, playlist_name,
+                                      total=total, checkpoint=self._open_checkpoint(
+                                          [file_path], quality, download_lyrics, embed_lyrics, only_lyrics, resume))
+
+        except Exception as e:
+            self.log(f"批量下载出错: {str(e)}")
 
-            if not songs:
+    @ensure_downloads_dir
+    async def download_from_sources(self, sources: List[str], quality: int = 11,
+                                    download_lyrics: bool = False, embed_lyrics: bool = False,
+                                    only_lyrics: bool = False, concurrency: int = 4,
+                                    resume: bool = False, order: str = ORDER_PLAYLIST,
+                                    deadline: Optional[datetime] = None, plan_only: bool = False) -> None:
+        """从多个歌单文件、URL或歌单目录(其中的 .txt 文件)批量下载
+
+        所有歌单先并发获取，再合并去重为一个下载列表：多个歌单中的同一首歌只下载一次，
+        已存在的歌曲直接跳过。下载顺序在各歌单之间轮流，每个歌单仍单独生成下载报告。
+        resume 为 True 时从同一组歌单上次中断的位置继续。
+        order、deadline 和 plan_only 与 download_from_file 相同，排序的是合并去重后的下载列表。
+        """
+        try:
+            self.log("开始批量下载...")
+            sources = self._expand_sources(sources)
+            playlists = await self._load_playlists(sources, concurrency)
+            if not any(songs for _, songs in playlists):
                 self.log("没有找到要下载的歌曲")
                 return
 
-            await self._process_songs(songs, quality, download_lyrics, embed_lyrics, only_lyrics, playlist_name)
+            if plan_only:
+                await self._process_playlists(playlists, quality, download_lyrics, embed_lyrics, only_lyrics,
+                                              order=order, deadline=deadline, plan_only=True)
+                return
+            checkpoint = self._open_checkpoint(sources, quality, download_lyrics, embed_lyrics, only_lyrics, resume)
+            await self._process_playlists(playlists, quality, download_lyrics, embed_lyrics, only_lyrics,
+                                          checkpoint, order=order, deadline=deadline)
 
         except Exception as e:
             self.log(f"批量下载出错: {str(e)}")
 
-    async def _process_songs(self, songs: List[str], quality: int,
-                             download_lyrics: bool, embed_lyrics: bool,
-                             only_lyrics: bool, playlist_name: Optional[str] = None) -> None:
-        """处理歌曲列表"""
+    @ensure_downloads_dir
+    async def download_songs(self, songs: List[str], quality: int = 11,
+                             download_lyrics: bool = False, embed_lyrics: bool = False,
+                             playlist_name: Optional[str] = None) -> Optional[Dict]:
+        """下载给定的歌曲列表(如歌单同步得到的新增歌曲)，返回下载结果
+
+        结果的 songs 中包含各分类的歌曲列表，调用方可据此确定哪些歌曲已处理完。
+        """
+        return await self._process_songs(songs, quality, download_lyrics, embed_lyrics,
+                                         only_lyrics=False, playlist_name=playlist_name,
+                                         collect_results=True)
+
+    @ensure_downloads_dir
+    async def retry_from_report(self, report_path: str, quality: Optional[int] = None,
+                                download_lyrics: bool = False, embed_lyrics: bool = False,
+                                only_lyrics: bool = False, concurrency: int = 3) -> Optional[Dict]:
+        """只重试报告(结构化报告或文本报告)中下载失败的歌曲
+
+        不扫描曲库，也不再检查报告中成功或跳过的歌曲。每首歌曲用 retry_song 重新搜索、
+        尝试其他候选结果和较低的音质，最多同时重试 concurrency 首。
+        quality 为空时使用报告中记录的请求音质。结果另存为一份下载报告，返回各分类的数量。
+        """
+        try:
+            failed = load_failed_songs(Path(report_path))
+        except (OSError, ValueError) as e:
+            self.log(f"读取报告失败: {report_path} ({str(e)})")
+            return None
+        if not failed:
+            self.log("报告中没有下载失败的歌曲")
+            return None
+
+        total = len(failed)
+        self.log(f"从报告中读取到 {total} 首下载失败的歌曲，最多同时重试 {concurrency} 首")
+        report = self.report_manager.start_report()
+        structured = self.report_manager.start_structured_report(f"{Path(report_path).stem}_retry")
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def retry(index: int, item: Dict) -> None:
+            async with semaphore:
+                await self._wait_if_paused()
+                if self.stop_event and self.stop_event.is_set():
+                    return
+                song = item['song']
+                song_quality = quality or item['quality_requested'] or config.DEFAULT_QUALITY
+                # 每首歌曲使用独立的下载器，并发时失败原因和耗时互不影响；日志前加上歌曲名以便区分
+                worker = MusicDownloader(lambda message: self.log(f"[{song}] {message}"), self.resolution_cache,
+                                         self.pause_event)
+                worker.download_manager.stop_event = self.stop_event
+                worker.match_songs = self.match_songs
+                worker.match_min_score = self.match_min_score
+                self.log(f"[{index}/{total}] 重试: {song}" + (f" (上次失败原因: {item['error']})" if item['error'] else ""))
+
+                started = time.monotonic()
+                success = await worker.retry_song(song, song_quality, download_lyrics, embed_lyrics, only_lyrics)
+                worker.last_timings['elapsed_s'] = round(time.monotonic() - started, 3)
+                status = 'success' if success else 'failed'
+                report.add(status, song)
+                row = {'song': song, 'playlist': item['playlist'], 'status': status,
+                       'quality_requested': song_quality, 'previous_error': item['error'], **worker.last_timings}
+                if not success:
+                    row['error'] = worker.last_error or 'unknown'
+                structured.add(row)
+                await asyncio.sleep(random.randint(1, 5))
+
+        try:
+            await asyncio.gather(*(retry(index, item) for index, item in enumerate(failed, 1)))
+            self._report_results(report.counts, report.iter_songs('failed'), report.iter_songs('skipped'))
+        except BaseException:
+            report.discard()
+            raise
+        finally:
+            structured.close()
+
+        report.finish(total, f"{Path(report_path).stem}_retry")
+        return dict(report.counts)
+
+    async def _wait_if_paused(self) -> None:
+        """暂停中时在开始下一首歌曲之前等待，直到继续或停止"""
+        if is_paused(self.pause_event):
+            self.log("批量下载已暂停")
+            if await wait_while_paused(self.pause_event, self.stop_event):
+                self.log("批量下载继续")
+
+    def _open_checkpoint(self, sources: List[str], quality: int, download_lyrics: bool, embed_lyrics: bool,
+                         only_lyrics: bool, resume: bool) -> BatchCheckpoint:
+        """打开这组歌单的检查点日志；resume 为 True 且有上次的日志时从中恢复"""
+        checkpoint = BatchCheckpoint(sources)
+        options = {'quality': quality, 'download_lyrics': download_lyrics,
+                   'embed_lyrics': embed_lyrics, 'only_lyrics': only_lyrics}
+        if checkpoint.open(options, resume):
+            self.log(f"从上次中断的位置继续，已有 {len(checkpoint.results)} 首歌曲的结果")
+            if checkpoint.options != options:
+                self.log(f"注意: 本次下载参数与上次不同(上次: {checkpoint.options})，未完成的歌曲使用本次参数")
+        elif resume:
+            self.log("没有可继续的下载进度，从头开始")
+        return checkpoint
+
+    def _close_checkpoint(self, checkpoint: Optional[BatchCheckpoint], completed: bool) -> None:
+        """全部处理完时删除检查点日志，中途停止时保留以便继续"""
+        self.checkpoint = self._checkpoint_song = None
+        if not checkpoint:
+            return
+        if completed:
+            checkpoint.finish()
+        else:
+            checkpoint.close()
+            self.log("下载进度已保存，可以使用继续下载(--resume)从中断处继续")
+
+    def _on_download_start(self, temp_filepath: Path) -> None:
+        if self.checkpoint and self._checkpoint_song:
+            index, song = self._checkpoint_song
+            self.checkpoint.partial(index, song, temp_filepath, self.last_timings.get('quality_level'))
+
+    async def _download_checkpointed(self, index: int, song: str, quality: int, download_lyrics: bool,
+                                     embed_lyrics: bool, only_lyrics: bool) -> bool:
+        """下载一首歌曲并在检查点日志中记录开始和结果
+
+        上次中断时正在下载这首歌且部分文件仍在时，从部分文件的音质开始下载，续传同一个文件。
+        """
+        checkpoint = self.checkpoint
+        if checkpoint:
+            resume_quality = checkpoint.resume_quality(song)
+            if resume_quality is not None and resume_quality <= quality:
+                self.log(f"继续下载上次中断的文件(音质等级 {resume_quality})")
+                quality = resume_quality
+            checkpoint.start(index, song)
+            self._checkpoint_song = (index, song)
+        try:
+            success = await self._download_and_wait(song, quality, download_lyrics, embed_lyrics, only_lyrics)
+        finally:
+            self._checkpoint_song = None
+        if checkpoint:
+            checkpoint.record(index, song, 'success' if success else 'failed')
+        return success
+
+    @staticmethod
+    def _expand_sources(sources: List[str]) -> List[str]:
+        """展开歌单目录，去掉重复的来源"""
+        expanded = []
+        for source in sources:
+            if not source.startswith(('http://', 'https://')) and os.path.isdir(source):
+                expanded.extend(str(path) for path in sorted(Path(source).glob('*.txt')))
+            else:
+                expanded.append(source)
+        return list(dict.fromkeys(expanded))
+
+    async def _load_playlists(self, sources: List[str], concurrency: int) -> List[Tuple[str, List[str]]]:
+        """并发获取所有歌单，返回 (歌单名, 歌曲列表)，顺序与 sources 相同，获取失败的歌单为空列表"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def load(source: str) -> Tuple[str, List[str]]:
+            try:
+                if source.startswith(('http://', 'https://')):
+                    async with semaphore:
+                        self.log(f"正在获取歌单: {source}")
+                        # 每个歌单使用独立的 PlaylistManager，并发获取时 current_playlist 互不影响
+                        playlist_manager = PlaylistManager(self.callback)
+                        songs = [song async for song in playlist_manager.iter_playlist_songs(source)]
+                        return playlist_manager.current_playlist.get('name') or source, songs
+
+                self.log(f"读取文件: {source}")
+                if not os.path.exists(source):
+                    raise FileNotFoundError("找不到指定的文件")
+                return Path(source).stem, self.playlist_manager.read_playlist_file(source)
+            except Exception as e:
+                self.log(f"获取歌单失败: {source} ({str(e)})")
+                return source, []
+
+        playlists = await asyncio.gather(*(load(source) for source in sources))
+
+        # 歌单重名时加上序号，避免报告互相覆盖
+        names: Dict[str, int] = {}
+        renamed = []
+        for name, songs in playlists:
+            names[name] = names.get(name, 0) + 1
+            renamed.append((name if names[name] == 1 else f"{name} ({names[name]})", songs))
+        return renamed
+
+    async def _process_playlists(self, playlists: List[Tuple[str, List[str]]], quality: int,
+                                 download_lyrics: bool, embed_lyrics: bool, only_lyrics: bool,
+                                 checkpoint: Optional[BatchCheckpoint] = None, order: str = ORDER_PLAYLIST,
+                                 deadline: Optional[datetime] = None, plan_only: bool = False) -> None:
+        """合并多个歌单统一下载，每首歌的结果记入所有包含它的歌单
+
+        checkpoint 中已有结果的歌曲(上次运行中处理过)直接沿用结果。
+        order 不是歌单顺序或 plan_only 为 True 时按 order 重新排列待下载的歌曲并显示下载计划。
+        """
+        self.checkpoint = checkpoint
         self.existing_songs = SongScanner.get_existing_songs(config.DOWNLOADS_DIR, config.DOWNLOADS_FILE)
-        total = len(songs)
+        self.log(f"扫描到已存在 {len(self.existing_songs)} 首歌曲")
+
+        results = [{'total': 0, 'success': [], 'failed': [], 'skipped': []} for _ in playlists]
+        # 幂等键 -> 包含该歌曲的歌单序号
+        members: Dict[str, List[int]] = {}
+        work_lists: List[List[Tuple[str, str]]] = []
+        # 上次运行中已有结果的歌曲: 幂等键 -> (歌曲, 结果)
+        resumed: Dict[str, Tuple[str, str]] = {}
+        duplicates = 0
+        for index, (_, songs) in enumerate(playlists):
+            work_list = []
+            for song in songs:
+                if not song.strip():
+                    continue
+                results[index]['total'] += 1
+                if song.startswith("- "):
+                    song = song[2:]
+
+                recorded = checkpoint.result_for_song(song) if checkpoint else None
+                if recorded:
+                    results[index][recorded].append(song)
+                    resumed.setdefault(song_idempotency_key(song), (song, recorded))
+                    continue
+
+                if song.split(' - ')[0].strip() in self.existing_songs:
+                    results[index]['skipped'].append(song)
+                    continue
+
+                key = song_idempotency_key(song)
+                if key in members:
+                    if index not in members[key]:
+                        members[key].append(index)
+                    duplicates += 1
+                    continue
+                members[key] = [index]
+                work_list.append((key, song))
+            work_lists.append(work_list)
+
+        # 各歌单轮流排列，避免某个大歌单独占前面的下载时间
+        work = [item for group in zip_longest(*work_lists) for item in group if item is not None]
+        total = len(work)
+        self.log(f"共 {len(playlists)} 个歌单，去重后待下载 {total} 首，"
+                 f"跨歌单重复 {duplicates} 首，已存在 {sum(len(r['skipped']) for r in results)} 首")
+        if resumed:
+            self.log(f"沿用上次运行的结果 {len(resumed)} 首")
+        if order != ORDER_PLAYLIST or plan_only:
+            by_song = {song: (key, song) for key, song in work}
+            ordered, _ = await self._plan_songs(list(by_song), quality, order, deadline)
+            if plan_only:
+                return
+            work = [by_song[song] for song in ordered]
+
         success = 0
-        success_list = []
-        failed = []
-        skipped = []
+        failed: List[str] = []
+        for song, state in resumed.values():
+            if state == 'success':
+                success += 1
+            elif state == 'failed':
+                failed.append(song)
 
-        self.log(f"共找到 {total} 首歌曲")
-        self.log(f"扫描到已存在 {len(self.existing_songs)} 首歌曲")
+        completed = False
+        structured = self.report_manager.start_structured_report('multi_batch')
+        try:
+            for i, (key, song) in enumerate(work, 1):
+                await self._wait_if_paused()
+                if self.stop_event and self.stop_event.is_set():
+                    self.log("下载已停止")
+                    break
 
-        for i, song in enumerate(songs, 1):
-            if self.stop_event and self.stop_event.is_set():
-                self.log("下载已停止")
-                break
+                song_name = song.split(' - ')[0].strip()
+                if song_name in self.existing_songs:
+                    # 本次运行中已以其他写法下载过
+                    self.log(f"[{i}/{total}] 歌曲已存在,跳过: {song}")
+                    outcome = 'skipped'
+                    if checkpoint:
+                        checkpoint.record(i, song, outcome)
+                else:
+                    self.log(f"[{i}/{total}] 处理: {song}")
+                    if await self._download_checkpointed(i, song, quality, download_lyrics, embed_lyrics,
+                                                         only_lyrics):
+                        success += 1
+                        self.existing_songs.add(song_name)
+                        outcome = 'success'
+                    else:
+                        failed.append(song)
+                        outcome = 'failed'
 
-            if not song.strip():
-                continue
+                for index in members[key]:
+                    results[index][outcome].append(song)
+                row = self._song_row(song, outcome, playlists[members[key][0]][0], quality)
+                row['playlists'] = [playlists[index][0] for index in members[key]]
+                structured.add(row)
+            else:
+                completed = True
+        finally:
+            structured.close()
+            self._close_checkpoint(checkpoint, completed)
 
-            song_name = song.split(' - ')[0].strip()
-            if song_name in self.existing_songs:
-                self.log(f"[{i}/{total}] 歌曲已存在,跳过: {song}")
-                skipped.append(song)
+        skipped = list(dict.fromkeys(song for result in results for song in result['skipped']))
+        self._report_results({'success': success, 'failed': len(failed), 'skipped': len(skipped)}, failed, skipped)
+        for (name, _), result in zip(playlists, results):
+            if not result['total']:
                 continue
+            result.update({
+                'quality': quality,
+                'download_lyrics': download_lyrics,
+                'embed_lyrics': embed_lyrics,
+                'only_lyrics': only_lyrics
+            })
+            self.report_manager.save_report(result, name)
+
+    async def _plan_songs(self, songs: List[str], quality: int, order: str,
+                          deadline: Optional[datetime] = None, concurrency: int = 4) -> Tuple[List[str], DownloadPlan]:
+        """获取每首歌曲的大小并按 order 排列，显示下载计划，返回 (排好顺序的歌曲, 下载计划)
 
+        已存在的歌曲不计入计划，排在最前面(下载时直接跳过)。获取歌曲信息时会记录其 mid，
+        之后下载时不必再次搜索。获取失败的歌曲大小未知，排序和估算时按中位数计算。
+        """
+        existing = SongScanner.get_existing_songs(config.DOWNLOADS_DIR, config.DOWNLOADS_FILE)
+        skipped: List[str] = []
+        pending: List[str] = []
+        for song in songs:
+            if not song.strip():
+                continue
             if song.startswith("- "):
                 song = song[2:]
+            (skipped if song.split(' - ')[0].strip() in existing else pending).append(song)
 
-            self.log(f"[{i}/{total}] 处理: {song}")
-            if await self.download_song(song, quality=quality,
-                                        download_lyrics=download_lyrics,
-                                        embed_lyrics=embed_lyrics,
-                                        only_lyrics=only_lyrics):
-                success += 1
-                success_list.append(song)
-                self.existing_songs.add(song_name)
-                random_wait = random.randint(1, 5)
-                self.log(f"等待 {random_wait} 秒后开始下一首...")
-                time.sleep(random_wait)
+        self.log(f"正在获取 {len(pending)} 首歌曲的大小...")
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def measure(index: int, song: str) -> PlannedSong:
+            async with semaphore:
+                if self.stop_event and self.stop_event.is_set():
+                    return PlannedSong(index, song)
+                try:
+                    song_info = await self._resolve_song_info(song, 1, quality)
+                except Exception:
+                    song_info = None
+            if not song_info:
+                return PlannedSong(index, song)
+            return PlannedSong(index, song, parse_size(song_info.size), song_info.songmid)
+
+        planned = await asyncio.gather(*(measure(index, song) for index, song in enumerate(pending)))
+        plan = plan_downloads(planned, order, deadline)
+        for line in plan.summary():
+            self.log(line)
+        if skipped:
+            self.log(f"已存在 {len(skipped)} 首，将直接跳过")
+        return skipped + [song.song for song in plan.songs], plan
+
+    async def _process_songs(self, songs: Union[Iterable[str], AsyncIterable[str]], quality: int,
+                             download_lyrics: bool, embed_lyrics: bool,
+                             only_lyrics: bool, playlist_name: Optional[str] = None,
+                             total: Optional[int] = None, collect_results: bool = False,
+                             checkpoint: Optional[BatchCheckpoint] = None) -> Optional[Dict]:
+        """处理歌曲列表，返回下载结果
+
+        songs 可以是列表、逐行读取文件的迭代器或异步迭代器(流式获取的歌单)，
+        总数未给出且无法预先得知时，进度中显示为 ?。
+        每首歌曲的结果立即追加到报告的临时文件中，内存中只保留计数，
+        返回结果中 success、failed、skipped 为数量；collect_results 为 True 时
+        另在 songs 中返回各分类的歌曲列表(只适合较小的歌单)。
+        checkpoint 中已有结果的歌曲(上次运行中处理过)直接沿用结果，每首歌曲的进度继续记录到其中。
+        """
+        self.checkpoint = checkpoint
+        completed = False
+        self.existing_songs = SongScanner.get_existing_songs(config.DOWNLOADS_DIR, config.DOWNLOADS_FILE)
+        if total is None and isinstance(songs, list):
+            total = len(songs)
+        report = self.report_manager.start_report()
+        structured = self.report_manager.start_structured_report(playlist_name or 'batch')
+
+        if total is not None:
+            self.log(f"共找到 {total} 首歌曲")
+        self.log(f"扫描到已存在 {len(self.existing_songs)} 首歌曲")
+
+        try:
+            i = 0
+            async for song in aiter_items(songs):
+                i += 1
+                await self._wait_if_paused()
+                if self.stop_event and self.stop_event.is_set():
+                    self.log("下载已停止")
+                    break
+
+                if not song.strip():
+                    continue
+
+                # 检查点中的歌曲统一去掉列表前缀
+                entry = song[2:] if song.startswith("- ") else song
+                recorded = checkpoint.result(i, entry) if checkpoint else None
+                if recorded:
+                    # 上次运行中已处理，结果已写入上次的结构化报告
+                    report.add(recorded, song)
+                    continue
+
+                song_name = song.split(' - ')[0].strip()
+                row_playlist = playlist_name or self.playlist_manager.current_playlist.get('name')
+                if song_name in self.existing_songs:
+                    self.log(f"[{i}/{total or '?'}] 歌曲已存在,跳过: {song}")
+                    report.add('skipped', song)
+                    structured.add(self._song_row(song, 'skipped', row_playlist, quality))
+                    if checkpoint:
+                        checkpoint.record(i, entry, 'skipped')
+                    continue
+
+                if song.startswith("- "):
+                    song = song[2:]
+
+                self.log(f"[{i}/{total or '?'}] 处理: {song}")
+                if await self._download_checkpointed(i, song, quality, download_lyrics, embed_lyrics, only_lyrics):
+                    report.add('success', song)
+                    structured.add(self._song_row(song, 'success', row_playlist, quality))
+                    self.existing_songs.add(song_name)
+                else:
+                    report.add('failed', song)
+                    structured.add(self._song_row(song, 'failed', row_playlist, quality))
             else:
-                failed.append(song)
-                random_wait = random.randint(5, 10)
-                self.log(f"等待 {random_wait} 秒后开始下一首...")
-                time.sleep(random_wait)
+                completed = True
+
+            if total is None:
+                total = i
+                playlist_name = playlist_name or self.playlist_manager.current_playlist.get('name')
+                if not total:
+                    self.log("没有找到要下载的歌曲")
+                    report.discard()
+                    return None
+
+            download_results = {
+                'total': total,
+                **report.counts,
+                'quality': quality,
+                'download_lyrics': download_lyrics,
+                'embed_lyrics': embed_lyrics,
+                'only_lyrics': only_lyrics
+            }
+            if collect_results:
+                download_results['songs'] = {status: report.songs(status) for status in report.counts}
+            self._report_results(report.counts, report.iter_songs('failed'), report.iter_songs('skipped'))
+        except BaseException:
+            report.discard()
+            raise
+        finally:
+            structured.close()
+            self._close_checkpoint(checkpoint, completed)
 
         # 保存下载报告
-        download_results = {
-            'total': total,
-            'success': success_list,
-            'failed': failed,
-            'skipped': skipped,
-            'quality': quality,
-            'download_lyrics': download_lyrics,
-            'embed_lyrics': embed_lyrics,
-            'only_lyrics': only_lyrics
-        }
-        self._report_results(success, failed, skipped)
-        self.report_manager.save_report(download_results, playlist_name)
-
-    def _report_results(self, success: int, failed: List[str], skipped: List[str]):
-        """报告下载结果"""
-        if failed:
+        report.finish(total, playlist_name)
+        return download_results
+
+    async def _download_and_wait(self, song: str, quality: int, download_lyrics: bool,
+                                 embed_lyrics: bool, only_lyrics: bool) -> bool:
+        """下载一首歌曲，之后随机等待一段时间再开始下一首"""
+        started = time.monotonic()
+        success = await self.download_song(song, quality=quality,
+                                           download_lyrics=download_lyrics,
+                                           embed_lyrics=embed_lyrics,
+                                           only_lyrics=only_lyrics)
+        # 不含之后的等待时间
+        self.last_timings['elapsed_s'] = round(time.monotonic() - started, 3)
+        if success:
+            random_wait = random.randint(1, 5)
+            self.log(f"等待 {random_wait} 秒后开始下一首...")
+            # 异步等待，后台可以继续接收流式歌单
+            await asyncio.sleep(random_wait)
+            return True
+
+        random_wait = random.randint(5, 10)
+        self.log(f"等待 {random_wait} 秒后开始下一首...")
+        await asyncio.sleep(random_wait)
+        return False
+
+    def _song_row(self, song: str, status: str, playlist_name: Optional[str], quality: int) -> Dict:
+        """结构化报告中的一行；跳过的歌曲没有下载耗时"""
+        row = {'song': song, 'playlist': playlist_name, 'status': status, 'quality_requested': quality}
+        if status != 'skipped':
+            row.update(self.last_timings)
+            if status == 'failed':
+                row['error'] = self.last_error or 'unknown'
+        return row
+
+    def _report_results(self, counts: Dict[str, int], failed: Iterable[str], skipped: Iterable[str]):
+        """报告下载结果，counts 为各分类的数量"""
+        if counts['failed']:
             self.log("下载失败的歌曲:")
             for song in failed:
                 self.log(f"- {song}")
 
-        if skipped:
+        if counts['skipped']:
             self.log("已跳过的歌曲:")
             for song in skipped:
                 self.log(f"- {song}")
 
         self.log("下载统计:")
-        self.log(f"成功: {success}")
-        self.log(f"失败: {len(failed)}")
-        self.log(f"跳过: {len(skipped)}")
+        self.log(f"成功: {counts['success']}")
+        self.log(f"失败: {counts['failed']}")
+        self.log(f"跳过: {counts['skipped']}")
 
     async def download_song(self, keyword: str, n: int = 1, quality: int = 11,
                             download_lyrics: bool = False, embed_lyrics: bool = False,
@@ -149,21 +623,37 @@ class BatchDownloader(MusicDownloader):
         if not quality_levels:
             quality_levels = [quality]  # 如果用户指定的音质不在预设列表中，只使用该音质
 
-        for retry_quality in quality_levels:
-            if self.stop_event and self.stop_event.is_set():
-                return False
-            
-            random_wait = random.randint(5, 10)
-            self.log(f"等待 {random_wait} 秒后重试...")
-            time.sleep(random_wait)
-            self.log(f"尝试使用音质等级 {retry_quality} 下载...")
-            success = await super().download_song(
-                keyword, n, retry_quality, download_lyrics, embed_lyrics, only_lyrics
-            )
-            if success:
-                return True
-
-            if retry_quality != quality_levels[-1]:
-                self.log("下载失败，尝试降低音质重试...")
+        # 各次尝试的耗时和字节数累加，记入结构化报告
+        attempts, retry_wait = 0, 0
+        totals = {'resolve_s': 0.0, 'download_s': 0.0, 'tag_s': 0.0, 'bytes': 0}
+        self.last_timings = {}
+        try:
+            for retry_quality in quality_levels:
+                random_wait = random.randint(5, 10)
+                self.log(f"等待 {random_wait} 秒后重试...")
+                # 异步等待，不阻塞事件循环：等待期间的暂停、停止和取消都能及时生效
+                await asyncio.sleep(random_wait)
+                retry_wait += random_wait
+                await self._wait_if_paused()
+                if self.stop_event and self.stop_event.is_set():
+                    return False
+                self.log(f"尝试使用音质等级 {retry_quality} 下载...")
+                success = await super().download_song(
+                    keyword, n, retry_quality, download_lyrics, embed_lyrics, only_lyrics
+                )
+                attempts += 1
+                for name in totals:
+                    totals[name] += self.last_timings.get(name) or 0
+                if success:
+                    return True
+                if self.last_error == ERROR_LOW_CONFIDENCE:
+                    # 没有可信的搜索结果，降低音质也无济于事
+                    return False
 
-        return False
+                if retry_quality != quality_levels[-1]:
+                    self.log("下载失败，尝试降低音质重试...")
+
+            return False
+        finally:
+            self.last_timings.update({name: round(value, 3) for name, value in totals.items()},
+                                     attempts=attempts, retry_wait_s=retry_wait)
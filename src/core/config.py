@@ -28,9 +28,16 @@ class Config:
     PLAYLISTS_DIR: Path = field(default=Path('downloads/playlists'))
     REPORTS_DIR: Path = field(default=Path('downloads/reports'))
     LOGS_DIR: Path = field(default=Path('logs'))
+    STATE_DIR: Path = field(default=Path('downloads/state'))
     DEFAULT_QUALITY: int = 11
     BLOCK_SIZE: int = 8192
     PROGRESS_UPDATE_INTERVAL: float = 0.5
+    # 按 "歌名 - 歌手" 匹配搜索结果时的最低置信度，低于该值的歌曲不下载，记入待确认列表
+    MATCH_MIN_SCORE: float = 0.6
+    # 暂停下载时保持连接的最长秒数，超过后断开连接，继续时用 Range 请求从断点续传
+    PAUSE_HOLD_SECONDS: float = 30
+    # 按时段的下载限速设置(见 src/core/bandwidth.py)，修改后无需重启即可生效
+    BANDWIDTH_SCHEDULE_FILE: Path = field(default=Path('downloads/bandwidth.json'))
 
     # 使用 default_factory 来处理可变默认值
     QUALITY_OPTIONS: List[QualityOption] = field(default_factory=get_default_quality_options)
@@ -46,6 +53,7 @@ class Config:
         self.PLAYLISTS_DIR.mkdir(exist_ok=True)
         self.REPORTS_DIR.mkdir(exist_ok=True)
         self.LOGS_DIR.mkdir(exist_ok=True)
+        self.STATE_DIR.mkdir(exist_ok=True)
 
 
 # 全局配置实例
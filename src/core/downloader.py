@@ -1,10 +1,14 @@
+import hashlib
+import json
+import threading
 import time
 from pathlib import Path
-from typing import Optional, Callable, List
+from typing import Any, Dict, Optional, Callable, List, Tuple
 from urllib.parse import urlparse
 
 import humanize
 
+from .bandwidth import bandwidth_governor
 from .config import config
 from .metadata import SongInfo
 from ..core.network import network
@@ -12,14 +16,42 @@ from ..handlers.audio import AudioHandler
 from ..handlers.lyrics import LyricsManager
 from ..handlers.musicInfo import MusicInfoFetcher
 from ..handlers.playlist import PlaylistManager
+from ..services.resolution_cache import ResolutionCache, MATCH_N
 from ..utils.decorators import ensure_downloads_dir
+from ..utils.pause import is_paused, wait_while_paused
+from ..utils.song_match import rank_candidates
+
+# 下载失败原因，记录在 last_error 中，随失败消息进入失败队列便于按原因统计
+ERROR_NO_SONG_INFO = "no_song_info"
+ERROR_EMPTY_URL = "empty_url"
+ERROR_DOWNLOAD = "download_error"
+ERROR_INVALID_FILE = "invalid_file"
+ERROR_PROCESS = "process_error"
+ERROR_LOW_CONFIDENCE = "low_confidence"
+ERROR_STOPPED = "stopped"
+
+# 重试失败歌曲时先尝试的音质(320kbps、192kbps 的链接最容易获取)，之后再尝试请求的音质
+RETRY_QUALITY_LEVELS = [8, 4]
+# 重试失败歌曲时最多尝试的候选搜索结果数
+RETRY_MAX_CANDIDATES = 3
 
 
 class DownloadManager:
-    """下载管理器"""
+    """下载管理器
+
+    所有下载共享全局限速(见 bandwidth.py)。
+    pause_event 设置后暂停下载：不再读取数据，连接最多保持 config.PAUSE_HOLD_SECONDS 秒，
+    之后断开连接，继续时用 Range 请求从断点续传。暂停中设置 stop_event 时放弃当前下载并保留部分文件。
+    """
 
-    def __init__(self, callback: Optional[Callable] = None):
+    def __init__(self, callback: Optional[Callable] = None, pause_event: Optional[threading.Event] = None,
+                 stop_event: Optional[threading.Event] = None):
         self.callback = callback or print
+        self.pause_event = pause_event
+        self.stop_event = stop_event
+        # 累计下载的字节数，用于统计下载速率
+        self.bytes_downloaded = 0
+        self.last_error: Optional[str] = None
 
     def log(self, message: str):
         """日志输出"""
@@ -27,41 +59,105 @@ class DownloadManager:
 
     @ensure_downloads_dir
     async def download_with_progress(self, url: str, filepath: Path) -> bool:
-        """带进度和速度显示的下载函数"""
+        """带进度和速度显示的下载函数
+
+        filepath 已存在时视为上次中断留下的部分文件，使用 Range 请求从断点继续下载；
+        服务器不支持断点续传时从头下载。
+        """
+        self.last_error = None
         try:
             client = await network._ensure_async_client()
-            async with client.stream('GET', url) as response:
-                if response.status_code != 200:
+            resume_from = filepath.stat().st_size if filepath.exists() else 0
+            headers = {'Range': f'bytes={resume_from}-'} if resume_from else None
+            restart = dropped = False
+
+            async with client.stream('GET', url, headers=headers) as response:
+                if response.status_code == 206 and self._range_start(response) == resume_from:
+                    self.log(f"从断点继续下载: 已有 {humanize.naturalsize(resume_from)}")
+                    mode = 'ab'
+                elif response.status_code == 200:
+                    resume_from, mode = 0, 'wb'
+                elif response.status_code == 416 and response.headers.get('content-range') == f'bytes */{resume_from}':
+                    # 上次已下载完整，只是后续处理未完成
+                    self.log("音频文件已下载完整")
+                    return True
+                elif response.status_code in (206, 416) and resume_from:
+                    # 断点位置无效(文件已变化)，删除部分文件后重新下载
+                    restart = True
+                else:
                     self.log(f"下载失败: HTTP状态码 {response.status_code}")
+                    self.last_error = f"http_{response.status_code}"
                     return False
 
-                total_size = int(response.headers.get('content-length', 0))
-                downloaded = 0
-                start_time = time.time()
-                last_update_time = start_time
-
-                with open(filepath, 'wb') as f:
-                    async for chunk in response.aiter_bytes(chunk_size=config.BLOCK_SIZE):
-                        downloaded += len(chunk)
-                        f.write(chunk)
-
-                        current_time = time.time()
-                        if current_time - last_update_time >= config.PROGRESS_UPDATE_INTERVAL:
-                            self._update_progress(downloaded, total_size, start_time, current_time)
-                            last_update_time = current_time
+                if not restart:
+                    total_size = resume_from + int(response.headers.get('content-length', 0))
+                    downloaded = resume_from
+                    start_time = time.time()
+                    last_update_time = start_time
+
+                    # 中途被取消时已写入的数据保留在文件中，下次从断点继续
+                    with open(filepath, mode) as f:
+                        async for chunk in response.aiter_bytes(chunk_size=config.BLOCK_SIZE):
+                            downloaded += len(chunk)
+                            self.bytes_downloaded += len(chunk)
+                            f.write(chunk)
+                            # 全局限速：超出当前时段允许的速率时等待，暂不读取后续数据
+                            await bandwidth_governor.acquire(len(chunk))
+
+                            if is_paused(self.pause_event):
+                                # 暂停期间不读取数据，服务器随之停止发送；暂停时间不计入速度
+                                f.flush()
+                                self.log(f"下载已暂停: 已下载 {humanize.naturalsize(downloaded)}")
+                                paused_at = time.time()
+                                if not await wait_while_paused(self.pause_event, self.stop_event,
+                                                               config.PAUSE_HOLD_SECONDS):
+                                    dropped = True
+                                    break
+                                start_time += time.time() - paused_at
+                                self.log("继续下载")
+
+                            current_time = time.time()
+                            if current_time - last_update_time >= config.PROGRESS_UPDATE_INTERVAL:
+                                self._update_progress(downloaded, total_size, start_time, current_time,
+                                                      resume_from)
+                                last_update_time = current_time
+
+                    if not dropped:
+                        self.log("音频文件下载完成！")
+                        return True
+
+            if dropped:
+                # 暂停时间较长，已断开连接；继续后从断点续传
+                self.log("暂停时间较长，已断开连接，继续后从断点续传")
+                if not await wait_while_paused(self.pause_event, self.stop_event):
+                    self.log("下载已停止，已保留部分文件以便续传")
+                    self.last_error = ERROR_STOPPED
+                    return False
+                return await self.download_with_progress(url, filepath)
 
-                self.log("音频文件下载完成！")
-                return True
+            filepath.unlink()
+            return await self.download_with_progress(url, filepath)
 
         except Exception as e:
             self.log(f"下载出错: {str(e)}")
+            self.last_error = f"{ERROR_DOWNLOAD}:{type(e).__name__}"
             return False
 
-    def _update_progress(self, downloaded: int, total_size: int, start_time: float, current_time: float):
+    @staticmethod
+    def _range_start(response) -> int:
+        """206 响应中 Content-Range 的起始位置"""
+        content_range = response.headers.get('content-range', '')
+        try:
+            return int(content_range.split(' ')[1].split('-')[0])
+        except (IndexError, ValueError):
+            return -1
+
+    def _update_progress(self, downloaded: int, total_size: int, start_time: float, current_time: float,
+                         resume_from: int = 0):
         """更新下载进度"""
         duration = current_time - start_time
         if duration > 0:
-            speed = downloaded / duration
+            speed = (downloaded - resume_from) / duration
             progress = (downloaded / total_size * 100) if total_size else 0
             self.log(f"下载进度: {progress:.1f}% | 速度: {humanize.naturalsize(speed)}/s")
 
@@ -69,12 +165,27 @@ class DownloadManager:
 class MusicDownloader:
     """音乐下载器"""
 
-    def __init__(self, callback: Optional[Callable] = None):
+    def __init__(self, callback: Optional[Callable] = None,
+                 resolution_cache: Optional[ResolutionCache] = None,
+                 pause_event: Optional[threading.Event] = None):
         self.callback = callback or print
-        self.download_manager = DownloadManager(callback)
+        # 设置后暂停下载，清除后继续(见 DownloadManager)
+        self.pause_event = pause_event
+        self.download_manager = DownloadManager(callback, pause_event)
         self.lyrics_manager = LyricsManager(callback)
         self.info_fetcher = MusicInfoFetcher(callback)
         self.playlist_manager = PlaylistManager(callback)
+        self.resolution_cache = resolution_cache or ResolutionCache()
+        # 为 True 时，"歌名 - 歌手" 形式的关键词按匹配得分选择搜索结果，而不是直接取第 n 个
+        self.match_songs = False
+        self.match_min_score = config.MATCH_MIN_SCORE
+        self.review_file = config.REPORTS_DIR / 'match_review.jsonl'
+        # 最近一次下载失败的原因
+        self.last_error: Optional[str] = None
+        # 最近一次下载各阶段的耗时(秒)、字节数和音质，写入结构化报告
+        self.last_timings: Dict[str, Any] = {}
+        # 最近一次解析使用的解析缓存记录 (关键词, n)，未使用缓存时为 None
+        self._cached_resolution: Optional[Tuple[str, int]] = None
 
     def log(self, message: str):
         """日志输出"""
@@ -85,35 +196,192 @@ class MusicDownloader:
                             download_lyrics: bool = False, embed_lyrics: bool = False,
                             only_lyrics: bool = False) -> bool:
         """下载单首歌曲"""
+        self.last_error = None
+        self.last_timings = {'quality_level': quality}
         try:
-            song_info = await self.info_fetcher.get_song_info(keyword, n, quality)
-            if not song_info:
-                return False
+            started = time.monotonic()
+            song_info = await self._resolve_song_info(keyword, n, quality)
+            self.last_timings['resolve_s'] = round(time.monotonic() - started, 3)
+            success = await self._download_song_info(song_info, download_lyrics, embed_lyrics, only_lyrics)
+        except Exception as e:
+            self.log(f"下载失败: {str(e)}")
+            self.last_error = f"exception:{type(e).__name__}"
+            success = False
+        if not success and self._cached_resolution:
+            # 记录的 mid 下载失败时删除记录，下次重新解析，不会一直使用无效的结果
+            self.resolution_cache.forget(*self._cached_resolution)
+        return success
+
+    async def _resolve_song_info(self, keyword: str, n: int, quality: int) -> Optional[SongInfo]:
+        """获取关键词第 n 个结果的歌曲信息
+
+        已解析过的关键词直接通过 mid 获取，不再重复搜索；mid 获取失败时删除记录，退回按关键词获取。
+        按关键词获取成功后记录其 mid。
+        开启 match_songs 且 n 为 1 时，"歌名 - 歌手" 形式的关键词改为按匹配得分选择搜索结果，
+        结果连同匹配得分记在单独的 MATCH_N 下，不使用按序号记录的搜索结果(未经打分的第一个结果)；
+        记录的得分低于当前的 match_min_score 时重新匹配，低置信度的结果仍会记入待确认列表。
+        """
+        self._cached_resolution = None
+        match = self.match_songs and n == 1 and ' - ' in keyword
+        key = (keyword, MATCH_N if match else n)
+        mid = self.resolution_cache.get(*key, min_score=self.match_min_score if match else None)
+        if mid:
+            song_info = await self.info_fetcher.get_song_info_by_mid(mid, quality)
+            if song_info:
+                self._cached_resolution = key
+                return song_info
+            self.log("通过已记录的 mid 获取失败，改为按关键词获取")
+            self.resolution_cache.forget(*key)
+
+        if match:
+            matched = await self._match_song(keyword)
+            if not matched:
+                return None
+            mid, score = matched
+            song_info = await self.info_fetcher.get_song_info_by_mid(mid, quality)
+            if song_info:
+                self.resolution_cache.put(keyword, MATCH_N, mid, song_info.song, song_info.singer, score=score)
+            return song_info
+
+        song_info = await self.info_fetcher.get_song_info(keyword, n, quality)
+        if song_info:
+            self.resolution_cache.put(keyword, n, song_info.songmid, song_info.song, song_info.singer)
+        return song_info
+
+    async def _match_song(self, keyword: str) -> Optional[Tuple[str, float]]:
+        """搜索一次，按歌名相似度、歌手重合度和版本标记(Live、伴奏等)为结果打分，返回最佳结果的 mid 和得分
+
+        最高得分低于 match_min_score 时不下载，记入待确认列表并返回 None。
+        """
+        results = await self.info_fetcher.search_songs(keyword)
+        ranked = rank_candidates(keyword, results)
+        if not ranked:
+            self.last_error = ERROR_NO_SONG_INFO
+            return None
+
+        score, position, candidate = ranked[0]
+        if score < self.match_min_score:
+            self.log(f"匹配置信度过低({score:.2f})，已记入待确认列表: {keyword} -> "
+                     f"{candidate.song} - {candidate.singer}")
+            self._add_to_review(keyword, ranked)
+            self.last_error = ERROR_LOW_CONFIDENCE
+            return None
+
+        self.log(f"匹配结果: {candidate.song} - {candidate.singer} (第 {position} 个结果, 置信度 {score:.2f})")
+        return candidate.mid, score
+
+    async def retry_song(self, keyword: str, quality: int = 11, download_lyrics: bool = False,
+                         embed_lyrics: bool = False, only_lyrics: bool = False,
+                         max_candidates: int = RETRY_MAX_CANDIDATES) -> bool:
+        """重试下载之前失败的歌曲
+
+        不使用解析缓存中记录的 mid，重新搜索获取最新的歌曲信息。"歌名 - 歌手" 形式的关键词
+        依次尝试匹配得分达到 match_min_score 的前 max_candidates 个结果，其他关键词依次尝试前几个搜索结果；
+        每个结果先尝试较低的音质，再尝试请求的音质。成功后把使用的 mid 记入解析缓存。
+        """
+        self.last_error = None
+        self.last_timings = {'quality_level': quality}
+        levels = [level for level in RETRY_QUALITY_LEVELS if level <= quality]
+        if quality not in levels:
+            levels.append(quality)
+        try:
+            started = time.monotonic()
+            results = await self.info_fetcher.search_songs(keyword)
+            match = self.match_songs and ' - ' in keyword
+            if match:
+                ranked = rank_candidates(keyword, results)
+                candidates = [(score, position, candidate) for score, position, candidate in ranked
+                              if score >= self.match_min_score]
+                if ranked and not candidates:
+                    self.log(f"没有置信度足够的搜索结果，需人工确认: {keyword}")
+                    self.last_error = ERROR_LOW_CONFIDENCE
             else:
-                self.log(f"歌曲信息获取成功: {song_info.song} - {song_info.singer} 音质: {song_info.quality} 大小: {song_info.size}")
+                candidates = [(None, position, candidate) for position, candidate in enumerate(results, 1)]
+            self.last_timings['resolve_s'] = round(time.monotonic() - started, 3)
+            if not candidates:
+                self.last_error = self.last_error or ERROR_NO_SONG_INFO
+                return False
 
-            if not only_lyrics:
-                if not song_info.url:
-                    self.log("api返回的URL为空, 请尝试更换音质或序号，或稍后再试")
-                    return False
+            attempts = 0
+            for score, position, candidate in candidates[:max_candidates]:
+                for level in levels:
+                    attempts += 1
+                    self.log(f"尝试第 {position} 个结果 {candidate.song} - {candidate.singer}，音质等级 {level}")
+                    self.last_timings.update(quality_level=level, attempts=attempts)
+                    song_info = await self.info_fetcher.get_song_info_by_mid(candidate.mid, level)
+                    if await self._download_song_info(song_info, download_lyrics, embed_lyrics, only_lyrics):
+                        self.resolution_cache.put(keyword, MATCH_N if match else 1, candidate.mid,
+                                                  candidate.song, candidate.singer, score=score)
+                        return True
+                    if not song_info:
+                        # 该结果无法获取歌曲信息，换下一个结果
+                        break
+            return False
+        except Exception as e:
+            self.log(f"重试失败: {str(e)}")
+            self.last_error = f"exception:{type(e).__name__}"
+            return False
 
-                temp_filepath = self._get_temp_filepath(song_info.url)
-                if not await self.download_manager.download_with_progress(song_info.url, temp_filepath):
-                    return False
+    def _add_to_review(self, keyword: str, ranked: List) -> None:
+        """把低置信度的匹配追加到待确认列表(每行一个 JSON)，附带得分最高的几个候选结果"""
+        record = {
+            'keyword': keyword,
+            'at': time.time(),
+            'candidates': [
+                {'n': position, 'score': round(score, 3), 'song': candidate.song,
+                 'singer': candidate.singer, 'album': getattr(candidate, 'album', None), 'mid': candidate.mid}
+                for score, position, candidate in ranked[:5]
+            ]
+        }
+        try:
+            with open(self.review_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            self.log(f"写入待确认列表失败: {str(e)}")
+
+    async def _download_song_info(self, song_info: Optional[SongInfo], download_lyrics: bool,
+                                  embed_lyrics: bool, only_lyrics: bool) -> bool:
+        """下载已获取信息的歌曲"""
+        if not song_info:
+            self.last_error = self.last_error or ERROR_NO_SONG_INFO
+            return False
+        else:
+            self.log(f"歌曲信息获取成功: {song_info.song} - {song_info.singer} 音质: {song_info.quality} 大小: {song_info.size}")
+        self.last_timings.update(mid=song_info.songmid, quality_obtained=song_info.quality)
+
+        if not only_lyrics:
+            if not song_info.url:
+                self.log("api返回的URL为空, 请尝试更换音质或序号，或稍后再试")
+                self.last_error = ERROR_EMPTY_URL
+                return False
 
-                success = await self._process_audio_file(temp_filepath, song_info, download_lyrics, embed_lyrics)
-                return success
-            else:
-                final_filename = self._get_final_filename(song_info)
-                success, _ = await self.lyrics_manager.download_lyrics_from_qq(
-                    song_info.songmid,
-                    audio_filename=final_filename
-                )
-                return success
+            temp_filepath = self._get_temp_filepath(song_info)
+            self._on_download_start(temp_filepath)
+            bytes_before = self.download_manager.bytes_downloaded
+            started = time.monotonic()
+            downloaded = await self.download_manager.download_with_progress(song_info.url, temp_filepath)
+            self.last_timings.update(download_s=round(time.monotonic() - started, 3),
+                                     bytes=self.download_manager.bytes_downloaded - bytes_before)
+            if not downloaded:
+                self.last_error = self.download_manager.last_error or ERROR_DOWNLOAD
+                return False
 
-        except Exception as e:
-            self.log(f"下载失败: {str(e)}")
-            return False
+            started = time.monotonic()
+            success = await self._process_audio_file(temp_filepath, song_info, download_lyrics, embed_lyrics)
+            self.last_timings['tag_s'] = round(time.monotonic() - started, 3)
+            return success
+        else:
+            final_filename = self._get_final_filename(song_info)
+            started = time.monotonic()
+            success, _ = await self.lyrics_manager.download_lyrics_from_qq(
+                song_info.songmid,
+                audio_filename=final_filename
+            )
+            self.last_timings['tag_s'] = round(time.monotonic() - started, 3)
+            return success
+
+    def _on_download_start(self, temp_filepath: Path) -> None:
+        """开始写入临时文件前调用，子类可以记录部分文件的位置"""
 
     async def _process_audio_file(self, temp_filepath: Path, song_info: SongInfo,
                                   download_lyrics: bool, embed_lyrics: bool) -> bool:
@@ -122,6 +390,7 @@ class MusicDownloader:
             # 验证文件完整性
             if not temp_filepath.exists() or temp_filepath.stat().st_size == 0:
                 self.log("下载的文件无效")
+                self.last_error = ERROR_INVALID_FILE
                 return False
             
             audio_handler = AudioHandler(temp_filepath, callback=self.callback)
@@ -177,12 +446,18 @@ class MusicDownloader:
 
         except Exception as e:
             self.log(f"处理音频文件时出错: {str(e)}")
+            self.last_error = f"{ERROR_PROCESS}:{type(e).__name__}"
             return False
 
-    def _get_temp_filepath(self, url: str) -> Path:
-        """获取临时文件路径"""
-        ext = self._get_audio_extension(url)
-        return config.DOWNLOADS_DIR / f"temp_{int(time.time())}{ext}"
+    def _get_temp_filepath(self, song_info: SongInfo) -> Path:
+        """获取临时文件路径
+
+        同一首歌曲同一音质的临时文件路径固定，下载中断后重试时可以找到部分文件断点续传。
+        """
+        ext = self._get_audio_extension(song_info.url)
+        key = hashlib.md5(f"{song_info.songmid or song_info.song + song_info.singer}:{song_info.quality}"
+                          .encode()).hexdigest()[:16]
+        return config.DOWNLOADS_DIR / f"temp_{key}{ext}"
 
     def _get_final_filename(self, song_info: SongInfo) -> str:
         """获取最终文件名"""
@@ -216,6 +491,8 @@ class MusicDownloader:
         """搜索歌曲并返回处理后的结果"""
         try:
             results = await self.info_fetcher.search_songs(keyword)
+            # 记录搜索结果的 mid，之后按关键词和序号下载时不必再次搜索
+            self.resolution_cache.put_search_results(keyword, results)
 
             # 处理搜索结果
             formatted_results = []
@@ -238,32 +515,14 @@ class MusicDownloader:
                                    embed_lyrics: bool = False,
                                    only_lyrics: bool = False) -> bool:
         """通过 mid 下载歌曲"""
+        self.last_error = None
+        self.last_timings = {'quality_level': quality}
         try:
+            started = time.monotonic()
             song_info = await self.info_fetcher.get_song_info_by_mid(mid, quality)
-            if not song_info:
-                return False
-            else:
-                self.log(f"歌曲信息获取成功: {song_info.song} - {song_info.singer} 音质: {song_info.quality} 大小: {song_info.size}")
-
-            if not only_lyrics:
-                if not song_info.url:
-                    self.log("api返回的URL为空, 请尝试更换音质或序号，或稍后再试")
-                    return False
-
-                temp_filepath = self._get_temp_filepath(song_info.url)
-                if not await self.download_manager.download_with_progress(song_info.url, temp_filepath):
-                    return False
-
-                success = await self._process_audio_file(temp_filepath, song_info, download_lyrics, embed_lyrics)
-                return success
-            else:
-                final_filename = self._get_final_filename(song_info)
-                success, _ = await self.lyrics_manager.download_lyrics_from_qq(
-                    song_info.songmid,
-                    audio_filename=final_filename
-                )
-                return success
-
+            self.last_timings['resolve_s'] = round(time.monotonic() - started, 3)
+            return await self._download_song_info(song_info, download_lyrics, embed_lyrics, only_lyrics)
         except Exception as e:
             self.log(f"下载失败: {str(e)}")
+            self.last_error = f"exception:{type(e).__name__}"
             return False
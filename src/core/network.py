@@ -1,4 +1,4 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
 
 import httpx
 import urllib3
@@ -63,11 +63,12 @@ class NetworkManager:
             return None
 
     async def async_post(self, url: str, data: Optional[Dict] = None,
-                         headers: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
-        """发送异步POST请求"""
+                         headers: Optional[Dict] = None,
+                         content: Optional[Union[str, bytes]] = None) -> Optional[Dict[str, Any]]:
+        """发送异步POST请求，content 为原样发送的请求体(例如已签名的参数字符串)"""
         try:
             client = await self._ensure_async_client()
-            response = await client.post(url, data=data, headers=headers)
+            response = await client.post(url, data=data, headers=headers, content=content)
             if response.status_code != 200:
                 return None
             return response.json()
@@ -75,6 +76,16 @@ class NetworkManager:
             print(f"异步请求失败: {str(e)}")
             return None
 
+    async def async_resolve_url(self, url: str) -> str:
+        """跟随重定向，返回最终的URL(用于短链接)，失败时返回原URL"""
+        try:
+            client = await self._ensure_async_client()
+            response = await client.head(url, follow_redirects=True)
+            return str(response.url)
+        except Exception as e:
+            print(f"异步请求失败: {str(e)}")
+            return url
+
     async def async_get_bytes(self, url: str, headers: Optional[Dict] = None) -> Optional[bytes]:
         """发送异步GET请求并返回二进制数据"""
         try:
@@ -1,8 +1,159 @@
-from typing import Optional, Callable, Dict, List
+import asyncio
+import codecs
+import hashlib
+import json
+import re
+import time
+from functools import partial
+from typing import Optional, Callable, Dict, List, AsyncIterator, Awaitable, Tuple, Any, Iterable, Iterator
 
 from ..core.config import config
 from ..core.network import network
 from ..utils.filename import sanitize_filename
+from ..utils.json_stream import JsonArrayStream
+
+NETEASE_PATTERN = re.compile(r'(163cn)|(\.163\.)')
+NETEASE_ID_PATTERN = re.compile(r'playlist[/?](?:id=)?(\d+)')
+NETEASE_PLAYLIST_API = "https://music.163.com/api/v6/playlist/detail"
+NETEASE_SONG_API = "https://music.163.com/api/v3/song/detail"
+# 每次请求歌曲详情的ID数
+NETEASE_DETAIL_BATCH = 500
+
+QQ_MUSIC_PATTERN = re.compile(r'\.qq\.')
+QQ_MUSIC_API = "https://u6.y.qq.com/cgi-bin/musics.fcg?sign={}&_={}"
+QQ_PLATFORMS = ["-1", "android", "iphone", "h5", "wxfshare", "iphone_wx", "windows"]
+# 每页歌曲数
+QQ_PAGE_SIZE = 1024
+
+# 并行请求的最大数量
+MAX_PARALLEL_REQUESTS = 8
+
+# 歌单文件依次尝试的编码
+PLAYLIST_ENCODINGS = ["utf-8", "gbk", "gb2312", "ansi"]
+
+
+def _standardize_name(name: str) -> str:
+    """标准化歌曲名称，移除括号内容"""
+    return re.sub(r'[\(（].*?[\)）]', '', name).strip()
+
+
+def _format_song(name: str, artists: Iterable[str]) -> str:
+    return f"{_standardize_name(name)} - {' / '.join(artists)}"
+
+
+def _qq_sign(param: str) -> str:
+    """QQ音乐 musics.fcg 请求签名"""
+    k1 = {
+        '0': 0, '1': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9,
+        'A': 10, 'B': 11, 'C': 12, 'D': 13, 'E': 14, 'F': 15
+    }
+    l1 = [212, 45, 80, 68, 195, 163, 163, 203, 157, 220, 254, 91, 204, 79, 104, 6]
+    t = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+
+    md5_str = hashlib.md5(param.encode()).hexdigest().upper()
+    t1 = ''.join(md5_str[i] for i in [21, 4, 9, 26, 16, 20, 27, 30])
+    t3 = ''.join(md5_str[i] for i in [18, 11, 3, 2, 1, 7, 6, 25])
+
+    ls2 = []
+    for i in range(16):
+        x1 = k1[md5_str[i * 2]]
+        x2 = k1[md5_str[i * 2 + 1]]
+        ls2.append((x1 * 16 ^ x2) ^ l1[i])
+
+    ls3 = []
+    for i in range(6):
+        if i == 5:
+            ls3.append(t[ls2[-1] >> 2])
+            ls3.append(t[(ls2[-1] & 3) << 4])
+        else:
+            x4 = ls2[i * 3] >> 2
+            x5 = (ls2[i * 3 + 1] >> 4) ^ ((ls2[i * 3] & 3) << 4)
+            x6 = (ls2[i * 3 + 2] >> 6) ^ ((ls2[i * 3 + 1] & 15) << 2)
+            x7 = 63 & ls2[i * 3 + 2]
+            ls3.append(t[x4] + t[x5] + t[x6] + t[x7])
+
+    t2 = re.sub(r'[\\/+]', '', ''.join(ls3))
+    return 'zzb' + (t1 + t2 + t3).lower()
+
+
+def _qq_request_body(disstid: int, platform: str, song_begin: int) -> str:
+    """QQ音乐歌单请求参数"""
+    return json.dumps({
+        "req_0": {
+            "module": "music.srfDissInfo.aiDissInfo",
+            "method": "uniform_get_Dissinfo",
+            "param": {
+                "disstid": disstid,
+                "enc_host_uin": "",
+                "tag": 1,
+                "userinfo": 1,
+                "song_begin": song_begin,
+                "song_num": QQ_PAGE_SIZE
+            }
+        },
+        "comm": {
+            "g_tk": 5381,
+            "uin": 0,
+            "format": "json",
+            "platform": platform
+        }
+    }, separators=(',', ':'))
+
+
+async def _fetch_qq_page(disstid: int, platform: str, song_begin: int) -> Tuple[str, Optional[Dict]]:
+    """获取QQ音乐歌单的一页，返回(平台, 页面数据)，数据无效时页面数据为 None"""
+    body = _qq_request_body(disstid, platform, song_begin)
+    data = await network.async_post(
+        QQ_MUSIC_API.format(_qq_sign(body), int(time.time() * 1000)),
+        content=body,
+        headers={'Content-Type': 'application/x-www-form-urlencoded'}
+    )
+    if not data or data.get('code') != 0 or data.get('req_0', {}).get('code') != 0:
+        return platform, None
+    page = data['req_0'].get('data') or {}
+    if 'dirinfo' not in page or page.get('songlist') is None:
+        return platform, None
+    return platform, page
+
+
+def _qq_page_songs(page: Dict) -> List[str]:
+    return [_format_song(song['name'], (singer['name'] for singer in song['singer']))
+            for song in page['songlist']]
+
+
+async def _race(factories: List[Callable[[], Awaitable[Tuple[Any, Optional[Any]]]]]) -> Tuple[Any, Optional[Any]]:
+    """同时发起多个请求，返回第一个结果有效的(键, 结果)，全部无效时结果为 None"""
+    tasks = [asyncio.create_task(factory()) for factory in factories]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                key, result = await next_done
+            except Exception:
+                continue
+            if result is not None:
+                return key, result
+        return None, None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _ordered_parallel(factories: List[Callable[[], Awaitable[Any]]],
+                            limit: int = MAX_PARALLEL_REQUESTS) -> AsyncIterator[Any]:
+    """最多 limit 个请求并行执行，按原顺序产出结果"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(factory):
+        async with semaphore:
+            return await factory()
+
+    tasks = [asyncio.create_task(run(factory)) for factory in factories]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 class PlaylistManager:
@@ -40,50 +191,194 @@ class PlaylistManager:
             self.log(f"保存歌单时出错: {str(e)}")
 
     @staticmethod
-    def read_playlist_file(filename: str) -> List[str]:
-        """读取歌单文件"""
-        encodings = ["utf-8", "gbk", "gb2312", "ansi"]
-        for encoding in encodings:
+    def detect_encoding(filename: str, prefix_size: int = 64 * 1024) -> str:
+        """只读取文件开头一段判断编码，不必为每种编码重新读取整个文件"""
+        with open(filename, "rb") as f:
+            prefix = f.read(prefix_size)
+        if prefix.startswith(codecs.BOM_UTF8):
+            return "utf-8-sig"
+
+        for encoding in PLAYLIST_ENCODINGS:
             try:
-                with open(filename, "r", encoding=encoding) as f:
-                    return [line.strip() for line in f if line.strip()]
-            except UnicodeDecodeError:
+                # final=False：开头一段可能在多字节字符中间截断
+                codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
+                return encoding
+            except (UnicodeDecodeError, LookupError):
                 continue
-        raise UnicodeDecodeError("无法使用任何支持的编码读取文件")
+        raise UnicodeError("无法使用任何支持的编码读取文件")
+
+    @classmethod
+    def iter_playlist_file(cls, filename: str) -> Iterator[str]:
+        """逐行读取歌单文件，跳过空行，内存占用与文件大小无关"""
+        encoding = cls.detect_encoding(filename)
+        # 编码按开头一段判断，后面个别无法解码的字节替换掉，不中断整个歌单
+        with open(filename, "r", encoding=encoding, errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+
+    @staticmethod
+    def count_playlist_lines(filename: str) -> int:
+        """统计歌单文件的非空行数(按字节逐行扫描，不解码)"""
+        with open(filename, "rb") as f:
+            return sum(1 for line in f if line.strip())
+
+    @classmethod
+    def read_playlist_file(cls, filename: str) -> List[str]:
+        """读取歌单文件"""
+        return list(cls.iter_playlist_file(filename))
 
     async def get_playlist_songs(self, url: str) -> List[str]:
         """从URL获取歌单列表"""
         try:
-            api_url = "https://sss.unmeta.cn/songlist"
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                "Referer": "https://music.unmeta.cn/"
-            }
-            data = {"url": url}
+            return [song async for song in self.iter_playlist_songs(url)]
+        except Exception as e:
+            self.log(f"获取歌单失败: {str(e)}")
+            return []
+
+    async def iter_playlist_songs(self, url: str) -> AsyncIterator[str]:
+        """从URL流式获取歌单，每获取到一批歌曲就立即产出
 
-            response_data = await network.async_post(api_url, data=data, headers=headers)
+        QQ音乐和网易云歌单直接请求官方接口，分批并行获取；
+        其他链接或官方接口失败(尚未产出任何歌曲)时使用第三方接口。
+        接收完成后保存歌单文件，获取失败时抛出异常。
+        """
+        self.current_playlist = {}
+        native = None
+        if NETEASE_PATTERN.search(url):
+            native = self._iter_netease_songs(url)
+        elif QQ_MUSIC_PATTERN.search(url):
+            native = self._iter_qq_songs(url)
 
-            if not response_data:
+        if native is not None:
+            yielded = False
+            try:
+                async for song in native:
+                    yielded = True
+                    yield song
+                return
+            except Exception as e:
+                if yielded:
+                    raise
+                self.log(f"官方接口获取歌单失败，改用第三方接口: {str(e)}")
+
+        async for song in self._iter_unmeta_songs(url):
+            yield song
+
+    async def _iter_unmeta_songs(self, url: str) -> AsyncIterator[str]:
+        """通过第三方接口流式获取歌单，响应中每解析出一首歌曲就立即产出"""
+        api_url = "https://sss.unmeta.cn/songlist"
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+            "Referer": "https://music.unmeta.cn/"
+        }
+        data = {"url": url}
+
+        songs: List[str] = []
+        stream = JsonArrayStream("songs")
+        client = await network._ensure_async_client()
+        async with client.stream('POST', api_url, data=data, headers=headers) as response:
+            if response.status_code != 200:
                 raise Exception("API请求失败")
+            async for text in response.aiter_text():
+                for song in stream.feed(text):
+                    songs.append(song)
+                    yield song
 
-            if response_data["code"] != 1:
-                raise Exception(f"获取歌单失败: {response_data['msg']}")
+        response_data = stream.finish()
+        if response_data["code"] != 1:
+            raise Exception(f"获取歌单失败: {response_data['msg']}")
 
-            # 保存完整的歌单信息
-            self.current_playlist = {
-                'name': response_data['data']['name'],
-                'songs': response_data["data"]["songs"],
-                'songs_count': response_data['data']['songs_count']
-            }
+        await self._finish_playlist(response_data['data']['name'], songs, response_data['data']['songs_count'])
 
-            self.log(f"成功获取歌单，歌单名: {self.current_playlist['name']}")
-            self.log(f"歌单包含 {self.current_playlist['songs_count']} 首歌曲")
+    async def _finish_playlist(self, name: str, songs: List[str], songs_count: int) -> None:
+        """记录完整的歌单信息并保存到文件"""
+        self.current_playlist = {
+            'name': name,
+            'songs': songs,
+            'songs_count': songs_count
+        }
 
-            # 保存歌单到文件
-            await self.save_playlist(self.current_playlist)
+        self.log(f"成功获取歌单，歌单名: {self.current_playlist['name']}")
+        self.log(f"歌单包含 {self.current_playlist['songs_count']} 首歌曲")
 
-            return self.current_playlist['songs']
+        # 保存歌单到文件
+        await self.save_playlist(self.current_playlist)
 
-        except Exception as e:
-            self.log(f"获取歌单失败: {str(e)}")
-            return []
+    async def _iter_netease_songs(self, url: str) -> AsyncIterator[str]:
+        """网易云歌单：先获取全部歌曲ID，再分批并行获取歌曲详情，按歌单顺序产出"""
+        match = NETEASE_ID_PATTERN.search(url)
+        if not match:
+            raise Exception("无法识别网易云歌单ID")
+
+        playlist_data = await network.async_post(NETEASE_PLAYLIST_API, data={'id': match.group(1)})
+        if not playlist_data or playlist_data.get('code') != 200:
+            raise Exception(f"网易云歌单接口返回异常: {playlist_data.get('code') if playlist_data else '请求失败'}")
+
+        playlist = playlist_data['playlist']
+        track_ids = [track['id'] for track in playlist['trackIds']]
+        self.current_playlist = {'name': playlist['name'], 'songs_count': playlist['trackCount']}
+
+        async def fetch_details(ids: List[int]) -> List[str]:
+            songs_data = await network.async_post(
+                NETEASE_SONG_API, data={'c': json.dumps([{'id': song_id} for song_id in ids])}
+            )
+            if not songs_data or 'songs' not in songs_data:
+                raise Exception("网易云歌曲详情接口返回异常")
+            return [_format_song(song['name'], (artist['name'] for artist in song['ar']))
+                    for song in songs_data['songs']]
+
+        batches = [track_ids[i:i + NETEASE_DETAIL_BATCH] for i in range(0, len(track_ids), NETEASE_DETAIL_BATCH)]
+        songs: List[str] = []
+        async for batch_songs in _ordered_parallel([partial(fetch_details, ids) for ids in batches]):
+            songs.extend(batch_songs)
+            for song in batch_songs:
+                yield song
+
+        await self._finish_playlist(playlist['name'], songs, playlist['trackCount'])
+
+    async def _iter_qq_songs(self, url: str) -> AsyncIterator[str]:
+        """QQ音乐歌单：各平台参数并发请求第一页，取最先成功的平台并行获取其余分页"""
+        disstid = await self._get_qq_playlist_id(url)
+        if not disstid:
+            raise Exception("无法识别QQ音乐歌单ID")
+
+        platform, first_page = await _race([partial(_fetch_qq_page, disstid, platform, 0)
+                                            for platform in QQ_PLATFORMS])
+        if first_page is None:
+            raise Exception("QQ音乐歌单接口在所有平台均返回异常")
+
+        name = first_page['dirinfo']['title']
+        songs_count = first_page['dirinfo']['songnum']
+        self.current_playlist = {'name': name, 'songs_count': songs_count}
+
+        async def fetch_page(begin: int) -> List[str]:
+            _, page = await _fetch_qq_page(disstid, platform, begin)
+            if page is None:
+                raise Exception(f"QQ音乐歌单分页获取失败: {begin}")
+            return _qq_page_songs(page)
+
+        songs = _qq_page_songs(first_page)
+        for song in songs:
+            yield song
+        pages = [partial(fetch_page, begin) for begin in range(QQ_PAGE_SIZE, songs_count, QQ_PAGE_SIZE)]
+        async for page_songs in _ordered_parallel(pages):
+            songs.extend(page_songs)
+            for song in page_songs:
+                yield song
+
+        await self._finish_playlist(name, songs, songs_count)
+
+    @staticmethod
+    async def _get_qq_playlist_id(url: str) -> Optional[int]:
+        """从QQ音乐链接中提取歌单ID
+
+        支持 y.qq.com/n/ryqq/playlist/7xxxxxxxxx、details/taoge.html?id=xxx
+        以及 c6.y.qq.com/base/fcgi-bin/u?__=xxx 短链接(跟随重定向后再解析)。
+        """
+        if 'fcgi-bin' in url:
+            url = await network.async_resolve_url(url)
+
+        match = re.search(r'playlist/(\d{10})', url) or re.search(r'[?&]id=(\d+)', url)
+        return int(match.group(1)) if match else None
@@ -1,8 +1,21 @@
+import argparse
+import json
+import os
+import time
+import uuid
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional, Callable
+from typing import Any, Dict, Optional, Callable, Iterable, Iterator, List, Tuple
 from ..utils.filename import sanitize_filename
 
+# 报告中的结果分类及其标题
+REPORT_SECTIONS = [
+    ('success', "下载成功的歌曲: \n"),
+    ('failed', "\n下载失败的歌曲:\n"),
+    ('skipped', "\n已跳过的歌曲:\n"),
+]
+
 
 class DownloadReportManager:
     """下载报告管理类"""
@@ -19,45 +32,307 @@ class DownloadReportManager:
     def save_report(self, download_results: Dict, playlist_name: Optional[str] = None) -> None:
         """保存下载报告"""
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            # 如果提供了歌单名，使用歌单名作为报告文件名
+            report_file = self._report_path(playlist_name)
+            sections = {status: (len(download_results[status]), download_results[status])
+                        for status, _ in REPORT_SECTIONS}
+            self._write_report(report_file, download_results['total'], sections, playlist_name)
+            self.log(f"下载报告已保存: {report_file}")
+
+        except Exception as e:
+            self.log(f"保存下载报告时出错: {str(e)}")
+
+    def start_report(self) -> "StreamingReport":
+        """开始一份边下载边写入的报告，处理完成后调用 finish 生成报告文件"""
+        return StreamingReport(self)
+
+    def start_structured_report(self, run_name: str) -> "StructuredReport":
+        """开始一份结构化报告(每首歌曲一行 JSON)，保存在报告目录的 structured 子目录中"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = self.report_dir / 'structured' / f"{timestamp}_{sanitize_filename(run_name)}.jsonl"
+        return StructuredReport(path)
+
+    def _report_path(self, playlist_name: Optional[str]) -> Path:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+        # 如果提供了歌单名，使用歌单名作为报告文件名
+        if playlist_name:
+            safe_name = sanitize_filename(playlist_name)
+            return self.report_dir / f"{safe_name}_{timestamp}.txt"
+        return self.report_dir / f"download_report_{timestamp}.txt"
+
+    @staticmethod
+    def _write_report(report_file: Path, total, sections: Dict[str, Tuple[int, Iterable[str]]],
+                      playlist_name: Optional[str] = None) -> None:
+        with open(report_file, 'w', encoding='utf-8') as f:
+            f.write(f"下载时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
             if playlist_name:
-                safe_name = sanitize_filename(playlist_name)
-                report_file = self.report_dir / f"{safe_name}_{timestamp}.txt"
-            else:
-                report_file = self.report_dir / f"download_report_{timestamp}.txt"
-
-            success = download_results['success']
-            failed = download_results['failed']
-            skipped = download_results['skipped']
-
-            with open(report_file, 'w', encoding='utf-8') as f:
-                f.write(f"下载时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                if playlist_name:
-                    f.write(f"歌单名称: {playlist_name}\n")
-                f.write(f"总数: {download_results['total']}\n")
-                f.write(f"成功: {len(success)}\n")
-                f.write(f"失败: {len(failed)}\n")
-                f.write(f"跳过: {len(skipped)}\n\n")
-
-                f.write("下载统计:\n")
-                if success:
-                    f.write(f"下载成功的歌曲: \n")
-                    for song in success:
-                        f.write(f"- {song}\n")
+                f.write(f"歌单名称: {playlist_name}\n")
+            f.write(f"总数: {total}\n")
+            f.write(f"成功: {sections['success'][0]}\n")
+            f.write(f"失败: {sections['failed'][0]}\n")
+            f.write(f"跳过: {sections['skipped'][0]}\n\n")
 
-                if failed:
-                    f.write("\n下载失败的歌曲:\n")
-                    for song in failed:
+            f.write("下载统计:\n")
+            for status, title in REPORT_SECTIONS:
+                count, songs = sections[status]
+                if count:
+                    f.write(title)
+                    for song in songs:
                         f.write(f"- {song}\n")
 
-                if skipped:
-                    f.write("\n已跳过的歌曲:\n")
-                    for song in skipped:
-                        f.write(f"- {song}\n")
 
-            self.log(f"下载报告已保存: {report_file}")
+class StreamingReport:
+    """边下载边写入的下载报告
+
+    每首歌曲的结果立即追加到报告目录下对应分类的临时文件中，内存中只保留计数，
+    歌单再大内存占用也不变；finish 时按原报告格式合并为报告文件并删除临时文件。
+    """
 
+    def __init__(self, manager: DownloadReportManager):
+        self.manager = manager
+        prefix = manager.report_dir / f".report_{uuid.uuid4().hex[:8]}"
+        self._paths = {status: prefix.with_suffix(f".{status}.part") for status, _ in REPORT_SECTIONS}
+        self._files = {status: open(path, 'w', encoding='utf-8') for status, path in self._paths.items()}
+        self.counts = {status: 0 for status, _ in REPORT_SECTIONS}
+
+    def add(self, status: str, song: str) -> None:
+        """记录一首歌曲的结果，status 为 success、failed 或 skipped"""
+        self._files[status].write(f"{song}\n")
+        self.counts[status] += 1
+
+    def iter_songs(self, status: str) -> Iterator[str]:
+        """逐行读取某一分类中已记录的歌曲"""
+        self._files[status].flush()
+        with open(self._paths[status], 'r', encoding='utf-8') as f:
+            for line in f:
+                yield line.rstrip('\n')
+
+    def songs(self, status: str) -> List[str]:
+        return list(self.iter_songs(status))
+
+    def finish(self, total, playlist_name: Optional[str] = None) -> None:
+        """生成报告文件并删除临时文件"""
+        try:
+            for f in self._files.values():
+                f.flush()
+            report_file = self.manager._report_path(playlist_name)
+            sections = {status: (self.counts[status], self.iter_songs(status)) for status, _ in REPORT_SECTIONS}
+            self.manager._write_report(report_file, total, sections, playlist_name)
+            self.manager.log(f"下载报告已保存: {report_file}")
         except Exception as e:
-            self.log(f"保存下载报告时出错: {str(e)}")
+            self.manager.log(f"保存下载报告时出错: {str(e)}")
+        finally:
+            self.discard()
+
+    def discard(self) -> None:
+        """删除临时文件(不生成报告)"""
+        for status, f in self._files.items():
+            f.close()
+            try:
+                os.remove(self._paths[status])
+            except OSError:
+                pass
+
+
+class StructuredReport:
+    """结构化下载报告
+
+    每处理完一首歌曲追加一行 JSON：状态、失败原因、解析/下载/写标签各阶段耗时、
+    下载字节数、请求和实际的音质、重试次数等，供 report stats 跨多次运行统计。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 行缓冲：每行写完即落盘，运行中断也不会丢失已完成的记录
+        self._file = open(path, 'a', encoding='utf-8', buffering=1)
+
+    def add(self, row: Dict[str, Any]) -> None:
+        row.setdefault('run', self.path.stem)
+        row.setdefault('at', time.time())
+        if row.get('bytes') and row.get('download_s'):
+            row['throughput_bps'] = round(row['bytes'] / row['download_s'])
+        self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def load_failed_songs(path: Path) -> List[Dict[str, Any]]:
+    """从报告中读取下载失败的歌曲，返回 [{'song', 'quality_requested', 'playlist', 'error'}]
+
+    支持结构化报告(.jsonl)和文本报告(.txt)；文本报告中没有音质和失败原因，对应字段为 None。
+    结构化报告中同一首歌有多行时以最后一行为准(之后下载成功的不再返回)。
+    """
+    path = Path(path)
+    if path.suffix == '.jsonl':
+        latest: Dict[str, Dict[str, Any]] = {}
+        for row in iter_structured_rows([path]):
+            if row.get('song'):
+                latest.pop(row['song'], None)
+                latest[row['song']] = row
+        return [{'song': row['song'], 'quality_requested': row.get('quality_requested'),
+                 'playlist': row.get('playlist'), 'error': row.get('error')}
+                for row in latest.values() if row.get('status') == 'failed']
+
+    failed_title = dict(REPORT_SECTIONS)['failed'].strip()
+    songs, in_section, playlist = [], False, None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith("歌单名称: "):
+                playlist = line[len("歌单名称: "):]
+            if line.strip() == failed_title:
+                in_section = True
+            elif in_section and line.startswith("- "):
+                songs.append(line[2:])
+            elif in_section and line.strip():
+                break
+    return [{'song': song, 'quality_requested': None, 'playlist': playlist, 'error': None}
+            for song in dict.fromkeys(songs)]
+
+
+def latest_structured_report(report_dir: Path) -> Optional[Path]:
+    """报告目录中最近的一份结构化报告"""
+    paths = sorted((Path(report_dir) / 'structured').glob('*.jsonl'), key=lambda path: path.stat().st_mtime)
+    return paths[-1] if paths else None
+
+
+# report stats 统计的耗时字段
+TIMING_FIELDS = ('queue_wait_s', 'resolve_s', 'download_s', 'tag_s', 'retry_wait_s', 'elapsed_s')
+
+
+def iter_structured_rows(paths: Iterable[Path], since: Optional[float] = None,
+                         playlist: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """逐行读取结构化报告，跳过无法解析的行"""
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                if since and row.get('at', 0) < since:
+                    continue
+                if playlist and row.get('playlist') != playlist:
+                    continue
+                yield row
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def compute_stats(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """汇总各状态数量、各阶段耗时的百分位数、吞吐量、降音质和重试情况"""
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    timings: Dict[str, List[float]] = {name: [] for name in TIMING_FIELDS}
+    throughputs: List[float] = []
+    attempts: Counter = Counter()
+    total_bytes = 0
+    total_download_s = 0.0
+    downgraded = 0
+    runs = set()
+
+    for row in rows:
+        statuses[row.get('status', 'unknown')] += 1
+        runs.add(row.get('run'))
+        if row.get('error'):
+            errors[row['error']] += 1
+        if row.get('status') == 'skipped':
+            continue
+        for name in TIMING_FIELDS:
+            if row.get(name) is not None:
+                timings[name].append(row[name])
+        if row.get('throughput_bps'):
+            throughputs.append(row['throughput_bps'])
+        total_bytes += row.get('bytes') or 0
+        total_download_s += row.get('download_s') or 0
+        attempts[row.get('attempts', 1)] += 1
+        if (row.get('status') == 'success' and row.get('quality_level') is not None
+                and row.get('quality_requested') is not None
+                and row['quality_level'] < row['quality_requested']):
+            downgraded += 1
+
+    for values in timings.values():
+        values.sort()
+    throughputs.sort()
+    return {
+        'runs': len(runs),
+        'rows': sum(statuses.values()),
+        'statuses': statuses,
+        'errors': errors,
+        'timings': timings,
+        'throughputs': throughputs,
+        'total_bytes': total_bytes,
+        'total_download_s': total_download_s,
+        'downgraded': downgraded,
+        'attempts': attempts,
+    }
+
+
+def print_stats(stats: Dict[str, Any]) -> None:
+    if not stats['rows']:
+        print("没有结构化报告记录")
+        return
+
+    print(f"{stats['runs']} 次运行，{stats['rows']} 首歌曲: "
+          + ", ".join(f"{status} {count}" for status, count in stats['statuses'].most_common()))
+
+    total_elapsed = sum(stats['timings']['elapsed_s'])
+    print(f"\n{'阶段':<14}{'次数':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'合计':>11}{'占比':>8}")
+    for name in TIMING_FIELDS:
+        values = stats['timings'][name]
+        if not values:
+            continue
+        total = sum(values)
+        share = f"{total / total_elapsed:.1%}" if total_elapsed and name != 'elapsed_s' else ''
+        print(f"{name:<14}{len(values):>8}{_percentile(values, 50):>8.2f}s{_percentile(values, 90):>8.2f}s"
+              f"{_percentile(values, 99):>8.2f}s{values[-1]:>8.2f}s{total:>10.0f}s{share:>8}")
+
+    throughputs = stats['throughputs']
+    if throughputs:
+        mb = 1024 * 1024
+        print(f"\n下载量 {stats['total_bytes'] / mb:.1f} MB，整体吞吐 "
+              f"{stats['total_bytes'] / stats['total_download_s'] / mb:.2f} MB/s；单曲吞吐 "
+              f"p10 {_percentile(throughputs, 10) / mb:.2f} / p50 {_percentile(throughputs, 50) / mb:.2f} / "
+              f"p90 {_percentile(throughputs, 90) / mb:.2f} MB/s")
+
+    success = stats['statuses'].get('success', 0)
+    if success:
+        print(f"降音质成功: {stats['downgraded']} 首 ({stats['downgraded'] / success:.1%})")
+    retried = sum(count for attempts, count in stats['attempts'].items() if attempts > 1)
+    if retried:
+        print("尝试次数分布: " + ", ".join(f"{attempts} 次 {count}"
+                                       for attempts, count in sorted(stats['attempts'].items())))
+    if stats['errors']:
+        print("\n失败原因:")
+        for error, count in stats['errors'].most_common(10):
+            print(f"{count:>8}  {error}")
+
+
+def show_stats(files: Iterable[str], days: Optional[float] = None, playlist: Optional[str] = None) -> None:
+    """统计并打印结构化报告，未指定文件时统计报告目录中的全部"""
+    from ..core.config import config
+
+    paths = [Path(path) for path in files] or sorted((config.REPORTS_DIR / 'structured').glob('*.jsonl'))
+    since = time.time() - days * 86400 if days else None
+    print_stats(compute_stats(iter_structured_rows(paths, since, playlist)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='下载报告工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    stats_parser = subparsers.add_parser('stats', help='统计结构化报告中的耗时和吞吐量')
+    stats_parser.add_argument('files', nargs='*', help='结构化报告文件，默认为报告目录中的全部')
+    stats_parser.add_argument('--days', type=float, default=None, help='只统计最近若干天的记录')
+    stats_parser.add_argument('--playlist', default=None, help='只统计该歌单')
+    args = parser.parse_args()
+    show_stats(args.files, args.days, args.playlist)
+
+
+if __name__ == "__main__":
+    main()
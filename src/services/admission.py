@@ -0,0 +1,222 @@
+import asyncio
+import shutil
+import time
+from collections import deque, Counter
+from pathlib import Path
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import humanize
+
+from ..core.bandwidth import BandwidthGovernor, bandwidth_governor
+
+# 准入状态：正常消费、放慢消费、暂停消费
+ADMISSION_OPEN = "open"
+ADMISSION_THROTTLED = "throttled"
+ADMISSION_PAUSED = "paused"
+
+GB = 1024 ** 3
+
+
+class AdmissionController:
+    """消费准入控制
+
+    下载服务每取出一首歌曲前先经过准入检查：
+    - 下载目录剩余空间低于 min_free_bytes 时暂停，回升到 resume_free_bytes 以上才恢复；
+    - 最近 error_window 次下载的失败率达到 max_error_rate 时暂停 error_cooldown 秒(上游接口异常)，
+      冷却结束后放慢消费试探，样本足够且失败率回落后恢复；失败率达到 throttle_error_rate 时放慢消费；
+    - 最近 throughput_window 秒的实际下载速率(由限速器 rate_meter 实时统计)超出上限时放慢消费，
+      上限为 max_bandwidth(字节/秒)，未设置时使用限速器当前允许的速率；
+    - 设置了 max_pipeline_depth 时，本地调度器积压达到上限后停止接收新消息(下载服务取消订阅)，
+      降到一半以下再恢复，未接收的消息留在队列中，可由其他下载服务消费，不会失败重试。
+    状态变化时输出日志并计入统计。
+    """
+
+    def __init__(self,
+                 downloads_dir: Path,
+                 min_free_bytes: int = 1 * GB,
+                 resume_free_bytes: int = 2 * GB,
+                 error_window: int = 20,
+                 min_error_samples: int = 5,
+                 max_error_rate: float = 0.5,
+                 throttle_error_rate: float = 0.2,
+                 error_cooldown: int = 120,
+                 throttle_delay: float = 5.0,
+                 max_bandwidth: Optional[float] = None,
+                 throughput_window: int = 60,
+                 max_pipeline_depth: Optional[int] = None,
+                 check_interval: float = 5.0,
+                 rate_meter: Optional[BandwidthGovernor] = None,
+                 callback: Optional[Callable] = None):
+        self.downloads_dir = Path(downloads_dir)
+        self.min_free_bytes = min_free_bytes
+        self.resume_free_bytes = max(resume_free_bytes, min_free_bytes)
+        self.min_error_samples = min_error_samples
+        self.max_error_rate = max_error_rate
+        self.throttle_error_rate = throttle_error_rate
+        self.error_cooldown = error_cooldown
+        self.throttle_delay = throttle_delay
+        self.max_bandwidth = max_bandwidth
+        self.throughput_window = throughput_window
+        self.max_pipeline_depth = max_pipeline_depth
+        self.check_interval = check_interval
+        self.rate_meter = rate_meter or bandwidth_governor
+        self.callback = callback or print
+
+        self.outcomes: Deque[bool] = deque(maxlen=error_window)
+        # 限速器累计下载字节数的采样: (时刻, 字节数)
+        self.byte_samples: Deque[Tuple[float, int]] = deque()
+        self.state = ADMISSION_OPEN
+        self.reason = ""
+        self.intake_paused = False
+        self.transitions: Counter = Counter()
+        self.state_durations: Counter = Counter()
+        self._state_since = time.monotonic()
+        self._disk_low = False
+        self._error_paused_until = 0.0
+        self._probing = False
+
+    def log(self, message: str):
+        self.callback(message)
+
+    def record_result(self, success: bool) -> None:
+        """记录一次下载结果"""
+        self.outcomes.append(success)
+
+    def error_rate(self) -> float:
+        """最近若干次下载的失败率"""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def throughput(self) -> float:
+        """最近 throughput_window 秒左右的下载速率(字节/秒)
+
+        按限速器累计的下载字节数计算，下载过程中实时更新；保留窗口之前的最后一个采样，
+        两次检查间隔较长(例如歌曲之间的等待)时按整个间隔计算。
+        """
+        now = time.monotonic()
+        self.byte_samples.append((now, self.rate_meter.total_bytes))
+        while len(self.byte_samples) > 1 and self.byte_samples[1][0] <= now - self.throughput_window:
+            self.byte_samples.popleft()
+        started, start_bytes = self.byte_samples[0]
+        if now - started < 1:
+            return 0.0
+        return (self.rate_meter.total_bytes - start_bytes) / (now - started)
+
+    def bandwidth_limit(self) -> Optional[float]:
+        """下载速率上限(字节/秒)，None 表示不限制"""
+        return self.max_bandwidth or self.rate_meter.allowed_rate()
+
+    def free_bytes(self) -> int:
+        return shutil.disk_usage(self.downloads_dir).free
+
+    def evaluate(self) -> Tuple[str, str, float]:
+        """根据当前指标计算准入状态，返回(状态, 原因, 放慢时每首歌曲前的等待秒数)"""
+        free = self.free_bytes()
+        if free < self.min_free_bytes:
+            self._disk_low = True
+        elif free >= self.resume_free_bytes:
+            self._disk_low = False
+        if self._disk_low:
+            return ADMISSION_PAUSED, f"磁盘剩余空间不足 ({humanize.naturalsize(free)})", 0.0
+
+        now = time.monotonic()
+        if now < self._error_paused_until:
+            return ADMISSION_PAUSED, f"下载失败率过高，冷却 {self._error_paused_until - now:.0f} 秒", 0.0
+
+        error_rate = self.error_rate()
+        if len(self.outcomes) >= self.min_error_samples and error_rate >= self.max_error_rate:
+            # 清空样本，冷却结束后重新积累，避免旧的失败样本立即再次触发暂停
+            self._error_paused_until = now + self.error_cooldown
+            self.outcomes.clear()
+            self._probing = True
+            return ADMISSION_PAUSED, f"下载失败率过高 ({error_rate:.0%})", 0.0
+
+        if self._probing:
+            if len(self.outcomes) < self.min_error_samples:
+                return ADMISSION_THROTTLED, "冷却结束，试探恢复", self.throttle_delay
+            self._probing = False
+
+        if len(self.outcomes) >= self.min_error_samples and error_rate >= self.throttle_error_rate:
+            return ADMISSION_THROTTLED, f"下载失败率升高 ({error_rate:.0%})", self.throttle_delay
+
+        limit = self.bandwidth_limit()
+        if limit:
+            throughput = self.throughput()
+            if throughput > limit:
+                # 等待到统计区间内的平均速率回落到上限
+                span = time.monotonic() - self.byte_samples[0][0]
+                delay = (throughput - limit) * span / limit
+                return (ADMISSION_THROTTLED,
+                        f"下载速率超出上限 ({humanize.naturalsize(throughput)}/s)", delay)
+
+        return ADMISSION_OPEN, "", 0.0
+
+    async def wait_admitted(self, on_pause: Optional[Callable[[], Awaitable[None]]] = None) -> None:
+        """等待准入：暂停时定期复查，放慢时等待相应的时间
+
+        on_pause 在进入暂停等待时调用一次(例如停止接收消息并归还本地缓存的消息)。
+        """
+        paused = False
+        while True:
+            state, reason, delay = self.evaluate()
+            self._transition(state, reason)
+            if state != ADMISSION_PAUSED:
+                break
+            if not paused and on_pause is not None:
+                await on_pause()
+            paused = True
+            await asyncio.sleep(self.check_interval)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def intake_allowed(self, depth: int) -> bool:
+        """是否接收新消息：本地积压达到上限时暂停，降到上限的一半以下后恢复"""
+        if not self.max_pipeline_depth:
+            return True
+        if self.intake_paused:
+            if depth <= self.max_pipeline_depth // 2:
+                self.intake_paused = False
+                self.log(f"本地积压降至 {depth} 条，恢复接收新消息")
+        elif depth >= self.max_pipeline_depth:
+            self.intake_paused = True
+            self.transitions["intake_paused"] += 1
+            self.log(f"本地积压 {depth} 条，暂停接收新消息")
+        return not self.intake_paused
+
+    def _transition(self, state: str, reason: str) -> None:
+        """记录状态变化"""
+        if state == self.state:
+            self.reason = reason
+            return
+
+        now = time.monotonic()
+        self.state_durations[self.state] += now - self._state_since
+        self.transitions[f"{self.state}->{state}"] += 1
+        self.log(f"消费准入状态: {self.state} -> {state}"
+                 f"{f' ({reason})' if reason else ''} | {self.summary()}")
+        self.state = state
+        self.reason = reason
+        self._state_since = now
+
+    def metrics(self) -> Dict:
+        """当前准入指标"""
+        durations = Counter(self.state_durations)
+        durations[self.state] += time.monotonic() - self._state_since
+        return {
+            "state": self.state,
+            "reason": self.reason,
+            "intake_paused": self.intake_paused,
+            "free_bytes": self.free_bytes(),
+            "throughput": self.throughput(),
+            "error_rate": self.error_rate(),
+            "transitions": dict(self.transitions),
+            "state_durations": dict(durations)
+        }
+
+    def summary(self) -> str:
+        metrics = self.metrics()
+        durations = ", ".join(f"{state} {seconds:.0f}s" for state, seconds in metrics["state_durations"].items())
+        return (f"剩余空间 {humanize.naturalsize(metrics['free_bytes'])}, "
+                f"速率 {humanize.naturalsize(metrics['throughput'])}/s, "
+                f"失败率 {metrics['error_rate']:.0%}, 状态累计 {durations}")
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from ..core.config import config
+from ..utils.song_key import song_idempotency_key
+
+# 终态：歌曲已有结果
+FINAL_STATES = ('success', 'failed', 'skipped')
+# 继续下载时直接沿用的结果；上次失败的歌曲重新下载
+RESUMED_STATES = ('success', 'skipped')
+STATE_DOWNLOADING = 'downloading'
+
+
+class BatchCheckpoint:
+    """批量下载的检查点日志
+
+    每首歌曲开始下载、得到部分文件、得到结果时各追加一行 JSON(序号、幂等键、状态、部分文件路径及其音质)。
+    只追加不改写，写入开销只有一次 write；文件行缓冲，进程崩溃时已写入的记录不会丢失，
+    最后一行写了一半时读取会跳过。批量下载正常结束后删除日志，中途停止或崩溃时保留，
+    下次以 resume=True 运行同一批歌单时从日志恢复：已成功或跳过的歌曲沿用结果，上次失败的歌曲重新下载，
+    中断时正在下载的歌曲按记录的音质重新下载，已下载的部分文件用 Range 请求续传。
+    """
+
+    def __init__(self, sources: Iterable[str], checkpoint_dir: Optional[Path] = None):
+        self.sources = [self._normalize_source(source) for source in sources]
+        checkpoint_dir = Path(checkpoint_dir or config.STATE_DIR / 'checkpoints')
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha1("\n".join(self.sources).encode('utf-8')).hexdigest()[:16]
+        self.path = checkpoint_dir / f"{digest}.jsonl"
+        # 以下为从日志恢复的记录，本次运行新写入的记录不再载入内存
+        # 序号 -> (幂等键, 状态)，只保留沿用的结果(RESUMED_STATES)
+        self.results: Dict[int, Tuple[str, str]] = {}
+        # 幂等键 -> 状态，多歌单合并下载时按歌曲查找
+        self.key_results: Dict[str, str] = {}
+        # 幂等键 -> 中断时正在下载的部分文件 {'partial': 路径, 'quality': 音质}
+        self.interrupted: Dict[str, Dict[str, Any]] = {}
+        self.options: Dict[str, Any] = {}
+        self._file = None
+
+    @staticmethod
+    def _normalize_source(source: str) -> str:
+        if source.startswith(('http://', 'https://')):
+            return source.strip()
+        return os.path.abspath(source)
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def open(self, options: Dict[str, Any], resume: bool = False) -> bool:
+        """开始记录，返回是否从已有日志恢复
+
+        resume 为 False 或没有日志时重新开始(清空旧日志)。
+        """
+        resumed = resume and self.exists()
+        if resumed:
+            self._load()
+            self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+        else:
+            self._file = open(self.path, 'w', encoding='utf-8', buffering=1)
+            self._append({'sources': self.sources, 'options': options, 'started_at': time.time()})
+        return resumed
+
+    def _load(self) -> None:
+        pending: Dict[str, Dict[str, Any]] = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if 'options' in entry:
+                    self.options = entry['options']
+                    continue
+                key, state = entry.get('key'), entry.get('state')
+                if state in FINAL_STATES:
+                    if state in RESUMED_STATES:
+                        self.results[entry['i']] = (key, state)
+                        self.key_results[key] = state
+                    else:
+                        self.results.pop(entry['i'], None)
+                        self.key_results.pop(key, None)
+                    pending.pop(key, None)
+                elif state == STATE_DOWNLOADING and entry.get('partial'):
+                    pending[key] = {'partial': entry['partial'], 'quality': entry.get('quality')}
+        self.interrupted = pending
+
+    def result(self, index: int, song: str) -> Optional[str]:
+        """第 index 首歌曲已记录的结果；歌单内容已变化(该位置不是同一首歌)时返回 None"""
+        recorded = self.results.get(index)
+        if recorded and recorded[0] == song_idempotency_key(song):
+            return recorded[1]
+        return None
+
+    def result_for_song(self, song: str) -> Optional[str]:
+        return self.key_results.get(song_idempotency_key(song))
+
+    def resume_quality(self, song: str) -> Optional[int]:
+        """中断时正在下载的歌曲的部分文件仍在时，返回部分文件的音质，以便续传同一个文件"""
+        entry = self.interrupted.get(song_idempotency_key(song))
+        if entry and Path(entry['partial']).exists():
+            return entry['quality']
+        return None
+
+    def start(self, index: int, song: str) -> None:
+        """记录开始下载一首歌曲"""
+        self._append({'i': index, 'key': song_idempotency_key(song), 'state': STATE_DOWNLOADING})
+
+    def partial(self, index: int, song: str, path: Path, quality: int) -> None:
+        """记录正在写入的部分文件"""
+        self._append({'i': index, 'key': song_idempotency_key(song), 'state': STATE_DOWNLOADING,
+                      'partial': str(path), 'quality': quality})
+
+    def record(self, index: int, song: str, state: str) -> None:
+        """记录一首歌曲的结果"""
+        self._append({'i': index, 'key': song_idempotency_key(song), 'state': state})
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        """关闭日志并保留，之后可以继续下载"""
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def finish(self) -> None:
+        """批量下载已完成，删除日志"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
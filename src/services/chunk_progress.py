@@ -0,0 +1,42 @@
+from pathlib import Path
+from typing import Iterable, Optional, Set
+
+from ..core.config import config
+from ..utils.sqlite_utils import connect_sqlite
+
+
+class ChunkProgressStore:
+    """分块消息的处理进度
+
+    下载服务逐首处理分块消息中的歌曲，已处理的歌曲记录在这里，分块确认后清除。
+    分块在确认前被重新投递(服务停止、暂停或崩溃)时，已处理的歌曲不会重复处理。
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or config.STATE_DIR / 'chunk_progress.db')
+        self._conn = connect_sqlite(self.db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_progress ("
+            "chunk_id TEXT NOT NULL, song_index INTEGER NOT NULL, PRIMARY KEY (chunk_id, song_index))"
+        )
+
+    def completed(self, chunk_id: str) -> Set[int]:
+        """已处理的歌曲序号"""
+        rows = self._conn.execute(
+            "SELECT song_index FROM chunk_progress WHERE chunk_id = ?", (chunk_id,)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def mark(self, chunk_id: str, indexes: Iterable[int]) -> None:
+        """记录这些歌曲已处理"""
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO chunk_progress (chunk_id, song_index) VALUES (?, ?)",
+            ((chunk_id, index) for index in indexes)
+        )
+
+    def clear(self, chunk_id: str) -> None:
+        """分块已确认，清除进度"""
+        self._conn.execute("DELETE FROM chunk_progress WHERE chunk_id = ?", (chunk_id,))
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,104 @@
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Iterable, Tuple
+
+from ..core.config import config
+from ..utils.sqlite_utils import connect_sqlite, ImmediateTransaction
+
+# stats 可用的分组字段
+GROUP_FIELDS = ("last_error", "error_class", "playlist", "submitter", "quality")
+
+
+def error_class(last_error: Optional[str]) -> str:
+    """失败原因的大类，例如 exception:ReadTimeout -> exception，http_403 -> http"""
+    if not last_error:
+        return "unknown"
+    if last_error.startswith("http_"):
+        return "http"
+    return last_error.split(":")[0]
+
+
+class DeadLetterStore:
+    """失败队列消息的本地存储
+
+    drain 把失败队列中的消息逐条写入这里后再确认，之后可以离线统计失败原因，
+    并按条件挑选一部分歌曲修改参数后重新发布。
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or config.STATE_DIR / 'dead_letters.db')
+        self._conn = connect_sqlite(self.db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, message_id TEXT UNIQUE, song_name TEXT NOT NULL, "
+            "last_error TEXT, error_class TEXT, quality INTEGER, n INTEGER, lane TEXT, "
+            "submitter TEXT, playlist TEXT, retry_count INTEGER, failed_at REAL, "
+            "drained_at REAL NOT NULL, replayed_at REAL, body TEXT NOT NULL)"
+        )
+
+    def add(self, body: Dict) -> bool:
+        """保存一条失败消息，同一消息重复写入时忽略，返回是否新增"""
+        last_error = body.get("last_error")
+        with ImmediateTransaction(self._conn):
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO dead_letters (message_id, song_name, last_error, error_class, quality, n, "
+                "lane, submitter, playlist, retry_count, failed_at, drained_at, body) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (body.get("message_id") or uuid.uuid4().hex, body.get("song_name", ""),
+                 last_error or "unknown", error_class(last_error), body.get("quality"), body.get("n", 1),
+                 body.get("lane"), body.get("submitter"), body.get("playlist"), body.get("retry_count"),
+                 body.get("failed_at"), time.time(), json.dumps(body, ensure_ascii=False))
+            )
+            return cursor.rowcount > 0
+
+    def summary(self, group_by: str = "last_error",
+                include_replayed: bool = False) -> List[Tuple[str, int, List[str]]]:
+        """按字段分组统计，返回(分组值, 数量, 示例歌曲)，数量从多到少"""
+        if group_by not in GROUP_FIELDS:
+            raise ValueError(f"不支持的分组字段: {group_by}")
+        where = "" if include_replayed else "WHERE replayed_at IS NULL"
+        rows = self._conn.execute(
+            f"SELECT {group_by}, COUNT(*), GROUP_CONCAT(song_name, '\n') FROM dead_letters {where} "
+            f"GROUP BY {group_by} ORDER BY COUNT(*) DESC"
+        ).fetchall()
+        return [(str(key), count, (songs or "").split("\n")[:3]) for key, count, songs in rows]
+
+    def select(self, last_error: Optional[str] = None, error_class: Optional[str] = None,
+               playlist: Optional[str] = None, submitter: Optional[str] = None,
+               ids: Optional[Iterable[int]] = None, include_replayed: bool = False,
+               limit: Optional[int] = None) -> List[Dict]:
+        """按条件挑选失败记录，返回原始消息体(附带记录 id)"""
+        conditions, params = [], []
+        for column, value in (("last_error", last_error), ("error_class", error_class),
+                              ("playlist", playlist), ("submitter", submitter)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if ids:
+            ids = list(ids)
+            conditions.append(f"id IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+        if not include_replayed:
+            conditions.append("replayed_at IS NULL")
+
+        sql = "SELECT id, body FROM dead_letters"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [{**json.loads(body), "id": row_id} for row_id, body in self._conn.execute(sql, params)]
+
+    def mark_replayed(self, ids: Iterable[int]) -> None:
+        """标记为已重新发布"""
+        now = time.time()
+        with ImmediateTransaction(self._conn):
+            self._conn.executemany(
+                "UPDATE dead_letters SET replayed_at = ? WHERE id = ?", [(now, row_id) for row_id in ids]
+            )
+
+    def close(self) -> None:
+        self._conn.close()
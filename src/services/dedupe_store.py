@@ -0,0 +1,106 @@
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from ..core.config import config
+from ..utils.sqlite_utils import connect_sqlite, ImmediateTransaction
+
+# 状态：已入队/处理中 与 已完成
+STATE_PENDING = "pending"
+STATE_DONE = "done"
+
+
+def dedupe_db_path(queue_url: Optional[str] = None) -> Path:
+    """幂等键数据库的路径
+
+    发布端和下载服务使用同一个数据库才能看到彼此的认领：设置了环境变量 DEDUPE_DB 时使用该路径
+    (跨机器部署时指向各机器共享的存储)；使用 SQLite 队列时与队列数据库放在同一目录；
+    否则为本机的 state/dedupe.db。
+    """
+    path = os.getenv("DEDUPE_DB")
+    if path:
+        return Path(path)
+    if queue_url and queue_url.startswith("sqlite:///") and len(queue_url) > len("sqlite:///"):
+        return Path(queue_url[len("sqlite:///"):]).with_name('dedupe.db')
+    return config.STATE_DIR / 'dedupe.db'
+
+
+class DedupeStore:
+    """基于 SQLite 的幂等键存储
+
+    发布端(CLI、机器人)和下载服务共享同一个数据库文件，路径见 dedupe_db_path。
+    每个幂等键记录持有它的消息ID和过期时间：
+    - 发布时认领，已被其他消息认领的键视为重复，不再发布；
+    - 消费时再次认领，只有持有该键的消息才会进入下载流程；
+    - 下载成功后标记为完成，在 done_ttl 内再次提交的同一首歌会被直接丢弃
+      (交互式请求除外，见 claim 的 allow_done)。
+    """
+
+    def __init__(self, db_path: Optional[Path] = None,
+                 pending_ttl: int = 24 * 3600,
+                 done_ttl: int = 7 * 24 * 3600,
+                 queue_url: Optional[str] = None):
+        self.db_path = Path(db_path or dedupe_db_path(queue_url))
+        self.pending_ttl = pending_ttl
+        self.done_ttl = done_ttl
+        self._conn = connect_sqlite(self.db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dedupe ("
+            "key TEXT PRIMARY KEY, owner TEXT, state TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def claim(self, key: str, owner: str, ttl: Optional[int] = None, allow_done: bool = False) -> bool:
+        """认领幂等键
+
+        键不存在、已过期或本就属于 owner 时认领成功并刷新过期时间，
+        否则说明已有其他消息在处理(或已完成)同一首歌。
+        allow_done 为 True 时已完成的键也可以重新认领：用户明确重新请求的歌曲(例如已删除的)不应被丢弃。
+        """
+        now = time.time()
+        expires_at = now + (ttl or self.pending_ttl)
+        with self._transaction():
+            row = self._conn.execute(
+                "SELECT owner, state, expires_at FROM dedupe WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[2] > now:
+                current_owner, state, _ = row
+                if state == STATE_DONE:
+                    if not allow_done:
+                        return False
+                elif current_owner != owner:
+                    return False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dedupe (key, owner, state, expires_at) VALUES (?, ?, ?, ?)",
+                (key, owner, STATE_PENDING, expires_at)
+            )
+            return True
+
+    def mark_done(self, key: str, ttl: Optional[int] = None) -> None:
+        """标记为已完成"""
+        with self._transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dedupe (key, owner, state, expires_at) VALUES (?, NULL, ?, ?)",
+                (key, STATE_DONE, time.time() + (ttl or self.done_ttl))
+            )
+
+    def release(self, key: str, owner: str) -> None:
+        """释放认领(例如彻底失败后)，之后同一首歌可以重新提交"""
+        with self._transaction():
+            self._conn.execute(
+                "DELETE FROM dedupe WHERE key = ? AND owner = ? AND state = ?",
+                (key, owner, STATE_PENDING)
+            )
+
+    def purge_expired(self) -> int:
+        """清理过期记录，返回清理数量"""
+        with self._transaction():
+            cursor = self._conn.execute("DELETE FROM dedupe WHERE expires_at <= ?", (time.time(),))
+            return cursor.rowcount
+
+    def _transaction(self) -> ImmediateTransaction:
+        return ImmediateTransaction(self._conn)
+
+    def close(self) -> None:
+        self._conn.close()
+
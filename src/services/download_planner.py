@@ -0,0 +1,194 @@
+import heapq
+import re
+import statistics
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import humanize
+
+from ..core.bandwidth import bandwidth_governor
+from ..core.config import config
+from ..handlers.report import compute_stats, iter_structured_rows
+
+# 下载顺序策略
+ORDER_PLAYLIST = "playlist"   # 歌单原有顺序
+ORDER_SJF = "sjf"             # 小文件优先：单位时间内完成的歌曲最多
+ORDER_LJF = "ljf"             # 大文件优先：尽早开始长时间的传输，链路利用率高
+ORDER_DEADLINE = "deadline"   # 截止时间：尽量多的歌曲在截止时间前完成，其余排在最后
+ORDER_POLICIES = (ORDER_PLAYLIST, ORDER_SJF, ORDER_LJF, ORDER_DEADLINE)
+
+# 没有历史记录时假设的下载速率(字节/秒)和每首歌曲除下载外的耗时(解析、写标签、歌曲间等待，秒)
+DEFAULT_THROUGHPUT = 2 * 1024 * 1024
+DEFAULT_OVERHEAD_S = 6.0
+# 估算速率时读取的最近结构化报告数
+HISTORY_REPORTS = 5
+
+_SIZE_PATTERN = re.compile(r'^\s*([\d.]+)\s*([kmgt]?)i?b?\s*$', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+_DURATION_PATTERN = re.compile(r'^\s*([\d.]+)\s*([hm]?)\s*$', re.IGNORECASE)
+
+
+def parse_size(size: Optional[str]) -> Optional[int]:
+    """把接口返回的大小(例如 "165.08MB")转换为字节数，无法识别时返回 None"""
+    if not size:
+        return None
+    match = _SIZE_PATTERN.match(str(size))
+    if not match:
+        return None
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()]) or None
+
+
+def parse_deadline(value: str, now: Optional[datetime] = None) -> datetime:
+    """截止时间："07:00"(下一次到达该时刻)、"90m"、"2h" 或分钟数"""
+    now = now or datetime.now()
+    if ':' in value:
+        hours, minutes = value.split(':')
+        deadline = now.replace(hour=int(hours), minute=int(minutes), second=0, microsecond=0)
+        return deadline if deadline > now else deadline + timedelta(days=1)
+    match = _DURATION_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"无法识别的截止时间: {value}")
+    amount = float(match.group(1))
+    return now + (timedelta(hours=amount) if match.group(2).lower() == 'h' else timedelta(minutes=amount))
+
+
+@dataclass
+class PlannedSong:
+    """计划中的一首歌曲，index 为在歌单中的顺序"""
+    index: int
+    song: str
+    size: Optional[int] = None
+    # 大小未知时按已知大小的中位数估算
+    estimated_size: int = 0
+    mid: Optional[str] = None
+
+
+@dataclass
+class DownloadPlan:
+    """下载计划：排好顺序的歌曲和总量、耗时估算"""
+    songs: List[PlannedSong]
+    policy: str
+    throughput: float
+    overhead_s: float
+    deadline: Optional[datetime] = None
+    # 按截止时间排序时预计无法在截止时间前完成的歌曲数(排在最后)
+    late: int = 0
+    started_at: datetime = field(default_factory=datetime.now)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(song.estimated_size for song in self.songs)
+
+    @property
+    def unknown(self) -> int:
+        return sum(1 for song in self.songs if song.size is None)
+
+    def duration(self, song: PlannedSong) -> float:
+        return song.estimated_size / self.throughput + self.overhead_s
+
+    @property
+    def eta_s(self) -> float:
+        return sum(self.duration(song) for song in self.songs)
+
+    def completed_within(self, seconds: float) -> int:
+        """按计划顺序，seconds 秒内预计完成的歌曲数"""
+        elapsed, count = 0.0, 0
+        for song in self.songs:
+            elapsed += self.duration(song)
+            if elapsed > seconds:
+                break
+            count += 1
+        return count
+
+    def summary(self) -> List[str]:
+        finish = self.started_at + timedelta(seconds=self.eta_s)
+        lines = [
+            f"下载计划({self.policy}): {len(self.songs)} 首，共约 {humanize.naturalsize(self.total_bytes)}"
+            + (f"(其中 {self.unknown} 首大小未知，按中位数估算)" if self.unknown else ""),
+            f"预计速率 {humanize.naturalsize(self.throughput)}/s，每首另需约 {self.overhead_s:.0f} 秒，"
+            f"预计耗时 {timedelta(seconds=round(self.eta_s))}，约 {finish:%m-%d %H:%M} 完成",
+            f"第一小时预计完成 {self.completed_within(3600)} 首",
+        ]
+        if self.deadline:
+            on_time = self.completed_within((self.deadline - self.started_at).total_seconds())
+            lines.append(f"截止 {self.deadline:%m-%d %H:%M} 前预计完成 {on_time} 首"
+                         + (f"，{len(self.songs) - on_time} 首可能来不及" if on_time < len(self.songs) else ""))
+        return lines
+
+
+def estimate_throughput(report_dir: Optional[Path] = None) -> Tuple[float, float]:
+    """根据最近的结构化报告估算 (下载速率 字节/秒, 每首歌曲除下载外的耗时 秒)，并以当前全局限速为上限"""
+    throughput, overhead = DEFAULT_THROUGHPUT, DEFAULT_OVERHEAD_S
+    paths = sorted((Path(report_dir or config.REPORTS_DIR) / 'structured').glob('*.jsonl'),
+                   key=lambda path: path.stat().st_mtime)[-HISTORY_REPORTS:]
+    if paths:
+        stats = compute_stats(iter_structured_rows(paths))
+        if stats['total_download_s'] and stats['total_bytes']:
+            throughput = stats['total_bytes'] / stats['total_download_s']
+        elapsed, downloads = stats['timings']['elapsed_s'], stats['timings']['download_s']
+        if elapsed and downloads:
+            overhead = max(0.0, statistics.median(elapsed) - statistics.median(downloads)) + DEFAULT_OVERHEAD_S / 2
+    allowed = bandwidth_governor.allowed_rate()
+    if allowed:
+        throughput = min(throughput, allowed)
+    return throughput, overhead
+
+
+def _fill_estimates(songs: List[PlannedSong]) -> None:
+    known = [song.size for song in songs if song.size]
+    fallback = int(statistics.median(known)) if known else 0
+    for song in songs:
+        song.estimated_size = song.size or fallback
+
+
+def _moore_hodgson(songs: List[PlannedSong], duration: Callable[[PlannedSong], float],
+                   budget: float) -> Tuple[List[PlannedSong], List[PlannedSong]]:
+    """共同截止时间下使按时完成的歌曲数最多(Moore-Hodgson)
+
+    按原顺序累计耗时，超出截止时间时去掉已选歌曲中耗时最长的一首。
+    返回 (按时完成的歌曲(保持原顺序), 来不及的歌曲)。
+    """
+    chosen: List = []
+    late: List[PlannedSong] = []
+    elapsed = 0.0
+    for song in songs:
+        heapq.heappush(chosen, (-duration(song), song.index, song))
+        elapsed += duration(song)
+        if elapsed > budget:
+            longest = heapq.heappop(chosen)
+            elapsed += longest[0]
+            late.append(longest[2])
+    on_time = sorted((item[2] for item in chosen), key=lambda song: song.index)
+    return on_time, sorted(late, key=lambda song: song.index)
+
+
+def plan_downloads(songs: Iterable[PlannedSong], policy: str = ORDER_PLAYLIST,
+                   deadline: Optional[datetime] = None, throughput: Optional[float] = None,
+                   overhead_s: Optional[float] = None) -> DownloadPlan:
+    """按策略排列歌曲并估算总量和耗时
+
+    deadline 策略保持歌单顺序，但只把截止时间前来得及完成的歌曲排在前面(尽量多)，其余排在最后；
+    大小未知的歌曲排序时按中位数估算。
+    """
+    if policy not in ORDER_POLICIES:
+        raise ValueError(f"未知的下载顺序: {policy}")
+    songs = list(songs)
+    _fill_estimates(songs)
+    if throughput is None or overhead_s is None:
+        estimated_throughput, estimated_overhead = estimate_throughput()
+        throughput = throughput or estimated_throughput
+        overhead_s = estimated_overhead if overhead_s is None else overhead_s
+    plan = DownloadPlan(songs, policy, throughput, overhead_s, deadline)
+
+    if policy == ORDER_SJF:
+        songs.sort(key=lambda song: (song.estimated_size, song.index))
+    elif policy == ORDER_LJF:
+        songs.sort(key=lambda song: (-song.estimated_size, song.index))
+    elif policy == ORDER_DEADLINE and deadline:
+        budget = (deadline - plan.started_at).total_seconds()
+        on_time, late = _moore_hodgson(songs, plan.duration, budget)
+        songs[:] = on_time + late
+        plan.late = len(late)
+    return plan
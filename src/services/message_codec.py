@@ -0,0 +1,99 @@
+import json
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from ..utils.song_key import song_idempotency_key
+
+try:
+    import msgpack
+except ImportError:  # 未安装 msgpack 时分块消息退回紧凑 JSON
+    msgpack = None
+
+MESSAGE_TYPE_CHUNK = "chunk"
+
+# 分块消息的格式版本，格式变化时递增，消费端拒绝不认识的版本
+CHUNK_SCHEMA_VERSION = 1
+SUPPORTED_CHUNK_VERSIONS = {1}
+
+# 分块消息最多携带的歌曲数：下载服务逐首处理完整个分块后才确认，
+# 须在 RabbitMQ 的 consumer_timeout(默认 30 分钟)内完成，同时不让交互式请求等待太久
+MAX_CHUNK_SIZE = 10
+
+
+class UnsupportedMessageError(ValueError):
+    """无法解析的消息(未知的格式版本等)"""
+
+
+def build_chunk_message(songs: List[str], quality: int = 11, download_lyrics: bool = True,
+                        embed_lyrics: bool = True, submitter: Optional[str] = None,
+                        playlist: Optional[str] = None, chunk_id: Optional[str] = None) -> Dict:
+    """构造分块消息：一条消息携带多首歌曲，音质和歌词选项只保存一份
+
+    字段使用短名称以减小体积：
+    v 格式版本, id 分块ID, o 共享选项(q 音质, dl 下载歌词, el 嵌入歌词),
+    s 歌曲列表, sub 提交者, pl 歌单, t 入队时间。
+    """
+    return {
+        "type": MESSAGE_TYPE_CHUNK,
+        "v": CHUNK_SCHEMA_VERSION,
+        "id": chunk_id or uuid.uuid4().hex,
+        "o": {"q": quality, "dl": download_lyrics, "el": embed_lyrics},
+        "s": songs,
+        "sub": submitter,
+        "pl": playlist,
+        "t": time.time()
+    }
+
+
+def chunk_song_message_id(chunk_id: str, index: int) -> str:
+    """分块中第 index 首歌曲的消息ID"""
+    return f"{chunk_id}:{index}"
+
+
+def is_chunk(body: Dict) -> bool:
+    return body.get("type") == MESSAGE_TYPE_CHUNK
+
+
+def expand_chunk(body: Dict) -> List[Dict]:
+    """把分块消息展开为单曲消息体列表，单曲消息原样返回"""
+    if not is_chunk(body):
+        return [body]
+
+    if body.get("v") not in SUPPORTED_CHUNK_VERSIONS:
+        raise UnsupportedMessageError(f"不支持的分块消息版本: {body.get('v')}")
+
+    options = body.get("o", {})
+    return [
+        {
+            "song_name": song,
+            "quality": options.get("q", 11),
+            "download_lyrics": options.get("dl", True),
+            "embed_lyrics": options.get("el", True),
+            "retry_count": 0,
+            "enqueued_at": body.get("t"),
+            "submitter": body.get("sub"),
+            "playlist": body.get("pl"),
+            "idempotency_key": song_idempotency_key(song),
+            "message_id": chunk_song_message_id(body["id"], index)
+        }
+        for index, song in enumerate(body.get("s", []))
+    ]
+
+
+def encode_message(body: Dict) -> bytes:
+    """编码消息：分块消息优先使用 msgpack，其余使用 JSON(兼容旧版消费端)"""
+    if is_chunk(body):
+        if msgpack is not None:
+            return msgpack.packb(body, use_bin_type=True)
+        return json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode()
+    return json.dumps(body).encode()
+
+
+def decode_message(data: bytes) -> Dict:
+    """解码消息，根据首字节区分 JSON 与 msgpack"""
+    if data[:1] == b'{':
+        return json.loads(data.decode())
+    if msgpack is None:
+        raise UnsupportedMessageError("收到 msgpack 编码的消息，但未安装 msgpack")
+    return msgpack.unpackb(data, raw=False)
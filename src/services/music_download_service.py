@@ -1,182 +1,554 @@
-import json
+import threading
 import time
+import uuid
 import random
-from typing import Optional, Callable
+from dataclasses import dataclass
+from functools import partial
+from typing import Optional, Callable, Dict
 
-import aio_pika
 import asyncio
 
+from .admission import AdmissionController
+from .chunk_progress import ChunkProgressStore
+from .dedupe_store import DedupeStore
+from .message_codec import decode_message, expand_chunk, is_chunk, MAX_CHUNK_SIZE
+from .queue_backend import QueueBackend, QueueMessage, create_queue_backend
+from .song_lock import SongLock, SongLockLost, LockBackend, SQLiteLockBackend
+from .scheduler import LaneScheduler, LANE_BULK, LANE_INTERACTIVE, DEFAULT_LANE_WEIGHTS, lane_queue_name, lane_queue_names
+from ..core.bandwidth import bandwidth_governor
 from ..core.batch_downloader import BatchDownloader
+from ..core.downloader import ERROR_LOW_CONFIDENCE
+from ..utils.pause import is_paused, wait_while_paused
+from ..utils.song_key import song_idempotency_key
 from ..utils.song_scanner import SongScanner
 from ..core.config import Config
 
+# 每个分片队列的预取消息数。预取的消息要等本地逐首处理完才确认，而 RabbitMQ 的 consumer_timeout
+# (默认 30 分钟)内未确认的消息会导致通道被关闭、预取的消息全部重新投递，
+# 因此 预取数 × 消费的队列数 × 每首歌曲的耗时 须小于 consumer_timeout，超出时按上限截断
+DEFAULT_PREFETCH_COUNT = 2
+CONSUMER_TIMEOUT = 1800
+# 每首歌曲的保守耗时估计(下载 + 歌曲间 5~10 秒的等待)
+SONG_SECONDS_ESTIMATE = 60
+# 本地调度器中积压的歌曲数(分块消息按其中的歌曲数计)达到该值时停止接收新消息(逐首下载，几首的缓冲已足够)
+DEFAULT_MAX_PIPELINE_DEPTH = 8
+
+
+@dataclass
+class SongTask:
+    """调度器中的任务：单曲消息或分块消息"""
+    body: Dict
+    message: QueueMessage
+    # 包含的歌曲数
+    songs: int = 1
+
+    @property
+    def label(self) -> str:
+        if is_chunk(self.body):
+            return f"分块消息({self.songs} 首)"
+        return self.body.get("song_name")
+
 
 class MusicDownloadService(BatchDownloader):
+    """队列下载服务
+
+    rabbitmq_url 为队列地址：amqp:// 使用 RabbitMQ，sqlite:///路径 使用内置的 SQLite 队列，
+    也可以直接传入 backend。
+    """
+
     def __init__(self,
                  rabbitmq_url: str,
                  queue_name: str,
                  callback: Optional[Callable] = None,
-                 max_retries: int = 3):
-        super().__init__(callback=callback, auto_retry=False)
+                 max_retries: int = 3,
+                 retry_base_delay: int = 30,
+                 retry_max_delay: int = 3600,
+                 lane_weights: Optional[Dict[str, int]] = None,
+                 metrics_interval: int = 20,
+                 prefetch_count: int = DEFAULT_PREFETCH_COUNT,
+                 dedupe_store: Optional[DedupeStore] = None,
+                 lock_backend: Optional[LockBackend] = None,
+                 lock_ttl: int = 300,
+                 backend: Optional[QueueBackend] = None,
+                 chunk_progress: Optional[ChunkProgressStore] = None,
+                 admission: Optional[AdmissionController] = None,
+                 max_pipeline_depth: Optional[int] = DEFAULT_MAX_PIPELINE_DEPTH,
+                 max_bandwidth: Optional[float] = None):
+        super().__init__(callback=callback, auto_retry=False, pause_event=threading.Event())
         self.rabbitmq_url = rabbitmq_url
         self.queue_name = queue_name
         self.max_retries = max_retries
-        self.connection = None
-        self.channel = None
-        self.queue = None
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.scheduler = LaneScheduler(lane_weights or DEFAULT_LANE_WEIGHTS)
+        # 公平调度由服务端的分片队列和本地调度器共同完成，预取数保持很小
+        # (见 benchmarks/fair_share_simulation.py)
+        self.prefetch_count = self._bounded_prefetch(prefetch_count)
+        self.backend = backend or create_queue_backend(rabbitmq_url, prefetch_count=self.prefetch_count)
+        self.metrics_interval = metrics_interval
+        self.processed_count = 0
+        self._stopping = asyncio.Event()
+        # 处理中的歌曲：工作任务 -> 单曲任务
+        self.in_flight: Dict[asyncio.Task, SongTask] = {}
+        self.dedupe_store = dedupe_store or DedupeStore(queue_url=rabbitmq_url)
+        self.chunk_progress = chunk_progress or ChunkProgressStore()
+        # 磁盘将满、上游接口异常或本地积压过多时暂停或放慢消费
+        # 下载速率上限未指定时使用限速器当前允许的速率(见 src/core/bandwidth.py)
+        self.admission = admission or AdmissionController(Config.DOWNLOADS_DIR, max_bandwidth=max_bandwidth,
+                                                          max_pipeline_depth=max_pipeline_depth,
+                                                          rate_meter=bandwidth_governor, callback=self.log)
+        # 是否正在接收各队列的消息(准入暂停、服务暂停或本地积压过多时取消订阅)
+        self._consuming = False
+        # 多个服务共享下载目录时，用歌曲锁避免同一首歌被同时下载
+        self.song_lock = SongLock(lock_backend or SQLiteLockBackend(), ttl=lock_ttl, callback=self.log)
         self.existing_songs = SongScanner.get_existing_songs(Config.DOWNLOADS_DIR, Config.DOWNLOADS_FILE)
+        # 每首歌曲的耗时、字节数等写入结构化报告，可用 python -m src.handlers.report stats 统计
+        self.structured_report = self.report_manager.start_structured_report(f"service_{queue_name}")
 
     async def connect(self):
-        """连接到RabbitMQ"""
+        """连接到队列后端并声明所需的队列"""
         try:
-            self.connection = await aio_pika.connect_robust(self.rabbitmq_url)
-            self.channel = await self.connection.channel()
-            
-            # 设置 QoS，限制未确认消息的数量为 10
-            await self.channel.set_qos(prefetch_count=10)
-
-            # 声明一个持久化的队列
-            self.queue = await self.channel.declare_queue(
-                self.queue_name,
-                durable=True
-            )
+            await self.backend.connect()
+
+            # 为每个优先级通道的每个分片声明一个持久化的队列
+            for queue_name in self._consumed_queues():
+                await self.backend.declare_queue(queue_name)
 
             # 声明一个死信队列用于存放失败的消息
-            await self.channel.declare_queue(
-                f"{self.queue_name}_failed",
-                durable=True
-            )
+            await self.backend.declare_queue(f"{self.queue_name}_failed")
 
-            self.log("已连接到RabbitMQ")
+            self.log("已连接到下载队列")
         except Exception as e:
-            self.log(f"连接RabbitMQ失败: {str(e)}")
+            self.log(f"连接下载队列失败: {str(e)}")
             raise
 
-    async def process_message(self, message: aio_pika.IncomingMessage):
-        """处理队列消息"""
+    def _consumed_queues(self) -> Dict[str, str]:
+        """消费的所有队列: 队列名称 -> 通道"""
+        return {queue_name: lane for lane in self.scheduler.weights
+                for queue_name in lane_queue_names(self.queue_name, lane)}
+
+    def _bounded_prefetch(self, prefetch_count: int) -> int:
+        """预取数上限：本地缓存的消息须在 consumer_timeout 内处理完"""
+        limit = max(1, CONSUMER_TIMEOUT // (SONG_SECONDS_ESTIMATE * len(self._consumed_queues())))
+        if prefetch_count > limit:
+            self.log(f"预取数 {prefetch_count} 过大，预取的消息可能超过确认时限被重新投递，已改为 {limit}")
+            return limit
+        return prefetch_count
+
+    async def _on_message(self, lane: str, message: QueueMessage):
+        """收到消息后放入本地调度器，由工作循环按通道权重和提交者公平处理
+
+        分块消息整体放入调度器，按其中的歌曲数计入公平调度的额度和本地积压。
+        本地积压达到上限时停止接收，之后的消息留在队列中，可由其他下载服务消费；
+        停止接收前已投递过来的消息直接归还，本地缓存的歌曲都能在 consumer_timeout 内处理完。
+        """
         try:
-            async with message.process():
-                body = json.loads(message.body.decode())
-                song_name = body.get("song_name")
-                retry_count = body.get("retry_count", 0)
-
-                # 检查歌曲是否已存在
-                song_key = song_name.split(' - ')[0].strip()
-                if song_key in self.existing_songs:
-                    self.log(f"歌曲已存在，跳过: {song_name}")
-                    return
+            body = decode_message(message.body)
+            songs = expand_chunk(body)
+        except Exception as e:
+            self.log(f"无法解析的消息，已丢弃: {str(e)}")
+            await message.reject()
+            return
 
-                self.log(f"开始下载歌曲: {song_name} (重试次数: {retry_count})")
+        limit = self.admission.max_pipeline_depth
+        if limit and self._local_depth() >= limit:
+            await message.nack(requeue=True)
+            await self._stop_intake()
+            return
 
-                success = await self.download_song(
-                    song_name,
-                    quality=body.get("quality", 11),
-                    download_lyrics=body.get("download_lyrics", True),
-                    embed_lyrics=body.get("embed_lyrics", True)
-                )
+        if is_chunk(body) and len(songs) > MAX_CHUNK_SIZE:
+            self.log(f"分块消息包含 {len(songs)} 首歌曲，超过上限 {MAX_CHUNK_SIZE}，"
+                     f"可能超过确认时限被重新投递(已处理的歌曲不会重复处理)")
+        self._schedule(lane, SongTask(body, message, len(songs)))
+        if not self.admission.intake_allowed(self._local_depth()):
+            await self._stop_intake()
 
+    def _local_depth(self) -> int:
+        """本地积压的歌曲数"""
+        return int(self.scheduler.cost())
 
-                if success:
-                    # 下载成功，将歌曲添加到已存在列表中
-                    self.existing_songs.add(song_key)
-                    time.sleep(random.randint(5, 10))
-                elif retry_count < self.max_retries:
-                    # 下载失败，重新入队
-                    await self.requeue_failed_message(song_name, retry_count + 1, 
-                                                    body.get("quality", 11), 
-                                                    body.get("download_lyrics", True), 
-                                                    body.get("embed_lyrics", True))
-                    time.sleep(random.randint(10, 20))
-                else:
-                    # 超过最大重试次数，发送到死信队列
-                    await self.send_to_failed_queue(song_name)
-
-        except aio_pika.exceptions.ChannelClosed:
-            # 向上层抛出channel关闭异常，触发重连
-            raise
+    async def _start_intake(self):
+        """开始(或恢复)接收各队列的消息"""
+        if self._consuming:
+            return
+        for queue_name, lane in self._consumed_queues().items():
+            await self.backend.consume(queue_name, partial(self._on_message, lane))
+        self._consuming = True
+
+    async def _stop_intake(self, return_buffered: bool = False):
+        """停止接收新消息，消息留在队列中，可由其他下载服务消费
+
+        return_buffered 为 True 时同时归还本地缓存的消息：暂停可能持续较长时间，
+        缓存的消息不能一直不确认(超过 consumer_timeout 会被重新投递)。
+        """
+        if self._consuming:
+            self._consuming = False
+            await self.backend.cancel_consumers()
+        if return_buffered:
+            await self._return_buffered()
+
+    def _schedule(self, lane: str, task: SongTask):
+        body = task.body
+        if is_chunk(body):
+            enqueued_at, submitter, playlist = body.get("t"), body.get("sub"), body.get("pl")
+        else:
+            enqueued_at, submitter, playlist = body.get("enqueued_at"), body.get("submitter"), body.get("playlist")
+        self.scheduler.put(lane, task, enqueued_at=enqueued_at, submitter=submitter, playlist=playlist,
+                           cost=task.songs)
+
+    async def process_message(self, message: QueueMessage, lane: str = LANE_BULK, body: Optional[Dict] = None):
+        """处理队列消息(单曲消息或分块消息)
+
+        处理中出现意外错误时和下载失败一样按重试次数重新入队或进入失败队列，然后确认原消息。
+        """
+        try:
+            async with message.process():
+                if body is None:
+                    body = decode_message(message.body)
+                try:
+                    if is_chunk(body):
+                        await self._process_chunk(body, lane, message)
+                    else:
+                        await self._run_song(body, lane, message.message_id)
+                except asyncio.CancelledError:
+                    # 停止期限已到时被中断，消息重新投递后从断点继续下载
+                    await message.nack(requeue=True)
+                    raise
         except Exception as e:
             self.log(f"处理消息时出错: {str(e)}")
             raise
 
-    async def requeue_failed_message(self, song_name: str, retry_count: int, 
-                                       quality: int, download_lyrics: bool, 
-                                       embed_lyrics: bool):
-        """重新将失败的消息加入队列"""
-        message_body = json.dumps({
-            "song_name": song_name,
-            "retry_count": retry_count,
-            "quality": quality,
-            "download_lyrics": download_lyrics,
-            "embed_lyrics": embed_lyrics
-        })
-        
-        await self.channel.default_exchange.publish(
-            aio_pika.Message(
-                body=message_body.encode(),
-                delivery_mode=aio_pika.DeliveryMode.PERSISTENT
-            ),
-            routing_key=self.queue_name
-        )
-        
-        self.log(f"消息已重新入队: {song_name} (重试次数: {retry_count})")
-
-    async def send_to_failed_queue(self, song_name: str):
-        """将彻底失败的消息发送到死信队列"""
-        message_body = json.dumps({"song_name": song_name})
-
-        await self.channel.default_exchange.publish(
-            aio_pika.Message(
-                body=message_body.encode(),
-                delivery_mode=aio_pika.DeliveryMode.PERSISTENT
-            ),
-            routing_key=f"{self.queue_name}_failed"
+    async def _process_chunk(self, body: Dict, lane: str, message: QueueMessage):
+        """逐首处理分块消息中的歌曲，全部处理完后确认一次
+
+        每首歌曲处理完(下载成功、跳过，或失败后作为单曲消息重新入队、进入失败队列)即记入 chunk_progress，
+        分块被重新投递(停止、暂停、崩溃或连接断开)时跳过已处理的歌曲。
+        分块最多 MAX_CHUNK_SIZE 首，可以在 consumer_timeout 内处理完。
+        """
+        songs = expand_chunk(body)
+        completed = self.chunk_progress.completed(body["id"])
+        for index, song in enumerate(songs):
+            if index in completed:
+                continue
+            if self._stopping.is_set() or is_paused(self.pause_event):
+                # 暂停可能持续较长时间，不能一直持有未确认的分块：归还后从未处理的歌曲继续
+                self.log(f"分块消息尚有 {len(songs) - index} 首未处理，已归还队列")
+                await message.nack(requeue=True)
+                return
+            await self._run_song(song, lane)
+            self.chunk_progress.mark(body["id"], [index])
+        await message.ack()
+        self.chunk_progress.clear(body["id"])
+
+    async def _run_song(self, body: Dict, lane: str, message_id: Optional[str] = None):
+        """处理一首歌曲，意外错误和下载失败一样按重试次数重新入队或进入失败队列"""
+        try:
+            await self._process_song(body, lane, message_id)
+        except Exception as e:
+            if not self.backend.is_connected:
+                raise
+            self.log(f"处理歌曲时出错: {body.get('song_name')} ({str(e)})")
+            body.setdefault("attempts", []).append({
+                "at": time.time(),
+                "quality": body.get("quality", 11),
+                "n": body.get("n", 1),
+                "error": f"exception:{type(e).__name__}",
+                "elapsed": 0.0
+            })
+            await self._retry_or_fail(body, lane)
+
+    async def _process_song(self, body: Dict, lane: str, message_id: Optional[str] = None):
+        """下载一首歌曲：去重、加锁、下载，失败时按重试次数重新入队或进入失败队列"""
+        song_name = body.get("song_name")
+        retry_count = body.get("retry_count", 0)
+        # 旧版消息没有幂等键，补齐后随重试消息一起传递
+        idempotency_key = body.setdefault("idempotency_key", song_idempotency_key(song_name))
+        message_id = body.setdefault("message_id", message_id or uuid.uuid4().hex)
+        body.setdefault("first_enqueued_at", body.get("enqueued_at"))
+
+        # 检查歌曲是否已存在
+        song_key = song_name.split(' - ')[0].strip()
+        if (song_key in self.existing_songs and lane == LANE_INTERACTIVE
+                and not SongScanner.song_exists(Config.DOWNLOADS_DIR, song_key)):
+            # 用户重新请求的歌曲可能已被删除，以下载目录为准
+            self.existing_songs.discard(song_key)
+        if song_key in self.existing_songs:
+            self.log(f"歌曲已存在，跳过: {song_name}")
+            self.dedupe_store.mark_done(idempotency_key)
+            return
+
+        # 同一首歌已由其他消息处理中或近期已完成，重复消息直接丢弃
+        if not self.dedupe_store.claim(idempotency_key, message_id):
+            self.log(f"重复的下载请求，跳过: {song_name}")
+            return
+
+        # 从解析到落盘全程持有歌曲锁，租约丢失时下载被中断，避免两个服务同时写入同一首歌
+        try:
+            async with self.song_lock.lease(idempotency_key) as acquired:
+                if not acquired:
+                    # 持有者也可能是租约尚未到期的已崩溃服务，不能直接丢弃：延迟后重新入队，不计入重试次数；
+                    # 重新入队的消息 message_id 不变，仍持有幂等键
+                    self.log(f"其他下载服务正在处理该歌曲，稍后重试: {song_name}")
+                    await self.requeue_failed_message(body, lane, count_retry=False)
+                    return
+
+                # 获取锁后复查：其他服务可能刚刚完成下载
+                if SongScanner.song_exists(Config.DOWNLOADS_DIR, song_key):
+                    self.log(f"歌曲已由其他服务下载完成，跳过: {song_name}")
+                    self.existing_songs.add(song_key)
+                    self.dedupe_store.mark_done(idempotency_key)
+                    return
+
+                self.log(f"开始下载歌曲: {song_name} (通道: {lane}, 重试次数: {retry_count})")
+
+                started = time.monotonic()
+                queue_wait = time.time() - body["enqueued_at"] if body.get("enqueued_at") else None
+                try:
+                    success = await self.download_song(
+                        song_name,
+                        n=body.get("n", 1),
+                        quality=body.get("quality", 11),
+                        download_lyrics=body.get("download_lyrics", True),
+                        embed_lyrics=body.get("embed_lyrics", True)
+                    )
+                except asyncio.CancelledError:
+                    # 部分文件保留在临时路径；释放认领，重新投递的消息可以再次认领
+                    self.log(f"下载被中断，已保留部分文件以便续传: {song_name}")
+                    self.dedupe_store.release(idempotency_key, message_id)
+                    raise
+                self.last_timings['elapsed_s'] = round(time.monotonic() - started, 3)
+                row = self._song_row(song_name, 'success' if success else 'failed', body.get("playlist"),
+                                     body.get("quality", 11))
+                row.update(lane=lane, retry_count=retry_count, attempts=retry_count + 1,
+                           queue_wait_s=round(max(0.0, queue_wait), 3) if queue_wait is not None else None)
+                self.structured_report.add(row)
+                if self.last_error != ERROR_LOW_CONFIDENCE:
+                    # 匹配置信度过低不是下载故障，不计入准入控制的错误率
+                    self.admission.record_result(success)
+                if not success:
+                    # 每次失败的原因和参数随重试消息传递，最终进入失败队列
+                    body.setdefault("attempts", []).append({
+                        "at": time.time(),
+                        "quality": body.get("quality", 11),
+                        "n": body.get("n", 1),
+                        "error": self.last_error or "unknown",
+                        "elapsed": round(time.monotonic() - started, 2)
+                    })
+        except SongLockLost:
+            self.log(f"歌曲锁已丢失，停止下载，稍后重试: {song_name}")
+            await self.requeue_failed_message(body, lane, count_retry=False)
+            return
+
+        if success:
+            # 下载成功，将歌曲添加到已存在列表中
+            self.existing_songs.add(song_key)
+            self.dedupe_store.mark_done(idempotency_key)
+            # 使用异步等待，期间仍可接收各通道的新消息；停止中不再等待
+            if not self._stopping.is_set():
+                await asyncio.sleep(random.randint(5, 10))
+        else:
+            # 匹配置信度过低时重试无意义，直接进入失败队列，
+            # 可以确认后用 dead_letters replay -n 指定搜索结果序号重新发布
+            await self._retry_or_fail(body, lane, retryable=self.last_error != ERROR_LOW_CONFIDENCE)
+
+    async def _retry_or_fail(self, body: Dict, lane: str, retryable: bool = True):
+        """下载失败后重新入队或进入失败队列
+
+        未超过最大重试次数时放入延迟队列，到期后自动回到所属通道；
+        否则(或 retryable 为 False)发送到死信队列，并释放幂等键以便之后重新提交。
+        """
+        if retryable and body.get("retry_count", 0) < self.max_retries:
+            await self.requeue_failed_message(body, lane)
+        else:
+            await self.send_to_failed_queue(body, lane)
+            self.dedupe_store.release(body.get("idempotency_key"), body.get("message_id"))
+
+    async def requeue_failed_message(self, body: Dict, lane: str = LANE_BULK, count_retry: bool = True):
+        """将失败的消息按指数退避延迟后重新放回所属通道
+
+        count_retry 为 False 时(歌曲锁被占用或丢失，不是下载失败)不增加重试次数，按首次重试的延迟等待。
+        """
+        retry_count = body.get("retry_count", 0) + (1 if count_retry else 0)
+        delay = self._retry_delay(max(1, retry_count))
+        # 入队时间记为延迟到期时刻，通道延迟统计不计入退避等待
+        await self.backend.publish(
+            lane_queue_name(self.queue_name, lane, body.get("submitter"), body.get("playlist")),
+            {
+                **body,
+                "retry_count": retry_count,
+                "enqueued_at": time.time() + delay
+            },
+            delay=delay
         )
 
-        self.log(f"消息已发送到失败队列: {song_name}")
+        self.log(f"消息将在 {delay} 秒后重新入队: {body.get('song_name')} (重试次数: {retry_count})")
+
+    def _retry_delay(self, retry_count: int) -> int:
+        """按重试次数计算指数退避的延迟秒数"""
+        return min(self.retry_base_delay * 2 ** (retry_count - 1), self.retry_max_delay)
+
+    async def send_to_failed_queue(self, body: Dict, lane: str = LANE_BULK):
+        """将彻底失败的消息连同失败原因发送到死信队列
+
+        可用 python -m src.handlers.dead_letters 导出、统计并重新发布。
+        """
+        attempts = body.get("attempts", [])
+        last_error = attempts[-1]["error"] if attempts else "unknown"
+        await self.backend.publish(f"{self.queue_name}_failed", {
+            **body,
+            "lane": lane,
+            "failed_at": time.time(),
+            "last_error": last_error,
+            "qualities_tried": sorted({attempt["quality"] for attempt in attempts}),
+            "total_elapsed": round(sum(attempt["elapsed"] for attempt in attempts), 2)
+        })
+
+        self.log(f"消息已发送到失败队列: {body.get('song_name')} (原因: {last_error})")
 
     async def start_consuming(self):
-        """开始消费队列消息"""
-        while True:  # 添加永久循环
+        """开始消费队列消息，直到调用 request_stop"""
+        while not self._stopping.is_set():
             try:
-                if not self.connection or self.connection.is_closed:
+                if not self.backend.is_connected:
                     await self.connect()
 
                 self.log(f"已扫描到 {len(self.existing_songs)} 首已存在歌曲")
 
-                async with self.queue.iterator() as queue_iter:
-                    self.log("开始监听下载队列...")
-                    async for message in queue_iter:
-                        try:
-                            await self.process_message(message)
-                        except aio_pika.exceptions.ChannelClosed:
-                            # 如果channel关闭，尝试重连
-                            self.log("Channel已关闭，尝试重新连接...")
-                            if await self.reconnect():
-                                # 重新发送消息到队列
-                                await message.nack(requeue=True)
+                self._consuming = False
+                await self._start_intake()
+                self.log("开始监听下载队列...")
+
+                while not self._stopping.is_set():
+                    if is_paused(self.pause_event):
+                        # 暂停期间不取新歌曲，处理中的下载也暂停读取；停止接收并归还本地缓存的消息
+                        self.log("下载服务已暂停")
+                        await self._stop_intake(return_buffered=True)
+                        if await self._unless_stopping(wait_while_paused(self.pause_event)) is None:
                             break
-                        except Exception as e:
-                            self.log(f"处理消息时出错: {str(e)}")
-                            await message.nack(requeue=True)
+                        self.log("下载服务继续")
+                    admitted = self.admission.wait_admitted(on_pause=partial(self._stop_intake, return_buffered=True))
+                    if await self._unless_stopping(admitted) is None:
+                        break
+                    if self.admission.intake_allowed(self._local_depth()):
+                        await self._start_intake()
+                    next_task = await self._unless_stopping(self.scheduler.get())
+                    if next_task is None:
+                        break
+                    lane, task = next_task.result()
+                    worker = asyncio.create_task(self.process_message(task.message, lane, task.body))
+                    self.in_flight[worker] = task
+                    try:
+                        # 用 wait 而不是直接 await，停止期限到时只中断下载任务本身
+                        await asyncio.wait({worker})
+                        if worker.cancelled():
                             continue
+                        worker.result()
+                    except Exception as e:
+                        if not self.backend.is_connected:
+                            # 连接已断开，本地缓存的消息已无法确认，由队列重新投递
+                            self.log("队列连接已断开，尝试重新连接...")
+                            self.scheduler.clear()
+                            break
+                        self.log(f"处理消息时出错: {str(e)}")
+                        if not task.message.processed:
+                            await task.message.nack(requeue=True)
+                        continue
+                    finally:
+                        self.in_flight.pop(worker, None)
+                        self._record_processed()
+
+                if self._stopping.is_set():
+                    await self._stop_intake(return_buffered=True)
+                    await self._flush()
 
             except Exception as e:
                 self.log(f"消费消息时出错: {str(e)}")
+                self.scheduler.clear()
                 # 等待一段时间后重试
-                await asyncio.sleep(5)
+                if not self._stopping.is_set():
+                    await asyncio.sleep(5)
             finally:
-                if self.connection and not self.connection.is_closed:
-                    await self.connection.close()
+                await self.backend.close()
+
+        self.log("下载服务已停止")
+
+    def pause(self):
+        """暂停：停止接收消息并归还本地缓存的消息，处理中的下载停止读取数据(较长时间后断开连接，继续时断点续传)"""
+        self.pause_event.set()
+
+    def resume(self):
+        """继续暂停的下载"""
+        self.pause_event.clear()
+
+    def request_stop(self, deadline: Optional[float] = None):
+        """请求停止：不再取新歌曲，等待处理中的歌曲完成后归还本地缓存的消息并退出 start_consuming
+
+        deadline 秒后仍未完成的下载会被中断，部分文件保留，消息重新投递后断点续传。
+        """
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        songs = [task.label for task in self.in_flight.values()]
+        if songs:
+            self.log(f"收到停止请求，等待处理中的歌曲完成: {', '.join(songs)}")
+        else:
+            self.log("收到停止请求")
+        if deadline is not None and songs:
+            asyncio.get_running_loop().call_later(deadline, self.abort_in_flight)
+
+    def abort_in_flight(self):
+        """立即中断处理中的下载"""
+        for worker, task in list(self.in_flight.items()):
+            if not worker.done():
+                self.log(f"中断下载: {task.label}")
+                worker.cancel()
+
+    async def _flush(self):
+        """停止前输出统计并关闭本地状态存储"""
+        self.log(f"共处理 {self.processed_count} 首歌曲 | 排队延迟: {self.scheduler.latency_report()} | "
+                 f"消费准入: {self.admission.summary()} | 带宽: {bandwidth_governor.summary()}")
+        self.dedupe_store.close()
+        self.chunk_progress.close()
+        self.resolution_cache.close()
+        self.structured_report.close()
+        await self.song_lock.backend.close()
+
+    async def _unless_stopping(self, coro) -> Optional[asyncio.Future]:
+        """等待 coro 完成并返回对应的任务；期间收到停止请求时取消它并返回 None"""
+        task = asyncio.ensure_future(coro)
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        done, _ = await asyncio.wait({task, stopping}, return_when=asyncio.FIRST_COMPLETED)
+        stopping.cancel()
+        if task in done:
+            return task
+        task.cancel()
+        return None
+
+    async def _return_buffered(self):
+        """把本地调度器中尚未处理的消息归还队列，由其他下载服务继续处理"""
+        returned = 0
+        for task in self.scheduler.clear():
+            if not task.message.processed:
+                await task.message.nack(requeue=True)
+                returned += 1
+        if returned:
+            self.log(f"已归还 {returned} 条未处理的消息")
+
+    def _record_processed(self):
+        """统计已处理消息数，并定期输出各通道的排队延迟"""
+        self.processed_count += 1
+        if self.processed_count % self.metrics_interval == 0:
+            self.log(f"通道积压: {self.scheduler.backlog()} | 排队延迟: {self.scheduler.latency_report()} | "
+                     f"消费准入: {self.admission.state}, {self.admission.summary()} | "
+                     f"带宽: {bandwidth_governor.summary()}")
 
     async def reconnect(self):
-        """重新连接到RabbitMQ"""
+        """重新连接到队列后端"""
         try:
-            if self.connection and not self.connection.is_closed:
-                await self.connection.close()
-            
+            await self.backend.close()
             await self.connect()
-            self.log("已重新连接到RabbitMQ")
+            self.log("已重新连接到下载队列")
             return True
         except Exception as e:
-            self.log(f"重新连接RabbitMQ失败: {str(e)}")
+            self.log(f"重新连接下载队列失败: {str(e)}")
             return False
@@ -0,0 +1,402 @@
+import asyncio
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Callable, Dict, Iterable, List, Awaitable, AsyncIterator
+from urllib.parse import urlparse
+
+from ..core.config import config
+from ..utils.sqlite_utils import connect_sqlite, ImmediateTransaction
+from .message_codec import encode_message
+
+
+@dataclass
+class PublishStats:
+    """一次批量发布的统计信息"""
+    published: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    confirm_latencies: List[float] = field(default_factory=list)
+    failed_messages: List[Dict] = field(default_factory=list)
+    # 因重复(已在队列中或近期已下载完成)未发布的歌曲
+    duplicates: List[str] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """入队吞吐量(条/秒)"""
+        return self.published / self.elapsed if self.elapsed > 0 else 0.0
+
+    def latency_percentile(self, percent: float) -> float:
+        """发布确认延迟的百分位数(秒)"""
+        if not self.confirm_latencies:
+            return 0.0
+        ordered = sorted(self.confirm_latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+    def merge(self, other: "PublishStats") -> None:
+        """合并另一批发布的统计，elapsed 累加为总发布耗时"""
+        self.published += other.published
+        self.failed += other.failed
+        self.elapsed += other.elapsed
+        self.confirm_latencies.extend(other.confirm_latencies)
+        self.failed_messages.extend(other.failed_messages)
+        self.duplicates.extend(other.duplicates)
+
+    def summary(self) -> str:
+        return (f"成功 {self.published} 条, 失败 {self.failed} 条, 耗时 {self.elapsed:.2f}s, "
+                f"吞吐 {self.throughput:.1f} 条/秒, 确认延迟 p50 {self.latency_percentile(50) * 1000:.1f}ms "
+                f"p95 {self.latency_percentile(95) * 1000:.1f}ms")
+
+
+@dataclass
+class QueueStats:
+    """队列状态：可消费的消息数、已被消费者取走尚未确认的消息数、等待重试延迟到期的消息数
+    和可消费消息中最早一条已等待的秒数"""
+    depth: int = 0
+    in_flight: int = 0
+    delayed: int = 0
+    oldest_age: float = 0.0
+
+
+class QueueMessage(ABC):
+    """队列消息"""
+
+    def __init__(self, body: bytes, message_id: Optional[str] = None):
+        self.body = body
+        self.message_id = message_id
+        self.processed = False
+
+    @abstractmethod
+    async def ack(self) -> None:
+        """确认消息"""
+
+    @abstractmethod
+    async def nack(self, requeue: bool = True) -> None:
+        """拒绝消息，requeue 为 True 时重新入队"""
+
+    async def reject(self) -> None:
+        """丢弃消息"""
+        await self.nack(requeue=False)
+
+    @asynccontextmanager
+    async def process(self) -> AsyncIterator["QueueMessage"]:
+        """处理上下文：正常结束时确认，出现异常时丢弃(与 aio_pika 的 process 一致)"""
+        try:
+            yield self
+        except BaseException:
+            if not self.processed:
+                await self.reject()
+            raise
+        else:
+            if not self.processed:
+                await self.ack()
+
+
+MessageCallback = Callable[[QueueMessage], Awaitable[None]]
+
+
+class QueueBackend(ABC):
+    """队列后端
+
+    下载服务、发布端和机器人都只依赖这个接口，
+    可以在 RabbitMQ 和内置的 SQLite 队列之间切换。
+    """
+
+    @abstractmethod
+    async def connect(self) -> None:
+        """建立连接"""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """关闭连接"""
+
+    @property
+    @abstractmethod
+    def is_connected(self) -> bool:
+        """连接是否可用"""
+
+    @abstractmethod
+    async def declare_queue(self, queue_name: str) -> None:
+        """声明(创建)队列"""
+
+    @abstractmethod
+    async def publish(self, queue_name: str, body: Dict, priority: Optional[int] = None,
+                      delay: int = 0) -> None:
+        """发布单条消息，delay 大于 0 时消息在延迟到期后才可被消费"""
+
+    @abstractmethod
+    async def publish_batch(self, queue_name: str, bodies: Iterable[Dict],
+                            priority: Optional[int] = None) -> PublishStats:
+        """批量发布消息"""
+
+    @abstractmethod
+    async def consume(self, queue_name: str, callback: MessageCallback) -> None:
+        """开始消费队列，收到的消息交给 callback"""
+
+    @abstractmethod
+    async def cancel_consumers(self) -> None:
+        """停止消费所有队列，之后不再收到新消息；已收到未确认的消息仍可确认或归还"""
+
+    @abstractmethod
+    async def queue_stats(self, queue_name: str) -> QueueStats:
+        """查询队列中等待消费的消息数、已被消费者取走未确认的消息数、延迟重试中的消息数和最早消息的等待时间，
+        不取出消息"""
+
+
+class SQLiteMessage(QueueMessage):
+    """SQLite 队列中被租用的消息"""
+
+    def __init__(self, backend: "SQLiteQueueBackend", row_id: int, body: bytes, message_id: Optional[str]):
+        super().__init__(body, message_id)
+        self.backend = backend
+        self.row_id = row_id
+
+    async def ack(self) -> None:
+        self.processed = True
+        self.backend._finish(self.row_id, delete=True)
+
+    async def nack(self, requeue: bool = True) -> None:
+        self.processed = True
+        self.backend._finish(self.row_id, delete=not requeue)
+
+
+class SQLiteQueueBackend(QueueBackend):
+    """内置的持久化队列，基于 SQLite
+
+    消费者按可见性超时租用消息：处理期间后台定期续租，
+    进程崩溃后租约到期，消息自动重新可见；延迟消息在 available_at 之前不可见。
+    适合单机部署和测试，不需要 RabbitMQ。
+    """
+
+    def __init__(self, db_path: Optional[Path] = None,
+                 prefetch_count: int = 10,
+                 visibility_timeout: int = 300,
+                 poll_interval: float = 1.0):
+        self.db_path = Path(db_path or config.STATE_DIR / 'queue.db')
+        self.prefetch_count = prefetch_count
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.consumer_id = uuid.uuid4().hex
+        self._conn = None
+        self._tasks: List[asyncio.Task] = []
+        # 正在消费的队列 -> 轮询任务，停止消费时移除，轮询任务随后自行退出
+        self._pollers: Dict[str, asyncio.Task] = {}
+        self._in_flight: Dict[str, set] = {}
+        self._wakeup: Dict[str, asyncio.Event] = {}
+
+    @property
+    def is_connected(self) -> bool:
+        return self._conn is not None
+
+    async def connect(self) -> None:
+        if self._conn is not None:
+            return
+        self._conn = connect_sqlite(self.db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, queue TEXT NOT NULL, body BLOB NOT NULL, "
+            "message_id TEXT, priority INTEGER NOT NULL DEFAULT 0, enqueued_at REAL NOT NULL, "
+            "available_at REAL NOT NULL, lease_owner TEXT, lease_expires REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_ready ON messages (queue, available_at, priority)"
+        )
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._pollers.clear()
+        if self._conn is not None:
+            # 归还尚未确认的消息
+            self._conn.execute(
+                "UPDATE messages SET lease_owner = NULL, lease_expires = NULL WHERE lease_owner = ?",
+                (self.consumer_id,)
+            )
+            self._conn.close()
+            self._conn = None
+        self._in_flight.clear()
+
+    async def declare_queue(self, queue_name: str) -> None:
+        # 队列在 messages 表中按名称区分，无需单独创建
+        await self.connect()
+
+    async def publish(self, queue_name: str, body: Dict, priority: Optional[int] = None,
+                      delay: int = 0) -> None:
+        await self.connect()
+        now = time.time()
+        with ImmediateTransaction(self._conn):
+            self._insert(queue_name, body, priority, now, now + delay)
+        self._notify(queue_name)
+
+    async def publish_batch(self, queue_name: str, bodies: Iterable[Dict],
+                            priority: Optional[int] = None) -> PublishStats:
+        await self.connect()
+        stats = PublishStats()
+        start_time = time.monotonic()
+        now = time.time()
+        # 单个事务批量写入，提交即相当于发布确认
+        with ImmediateTransaction(self._conn):
+            for body in bodies:
+                self._insert(queue_name, body, priority, now, now)
+                stats.published += 1
+        stats.elapsed = time.monotonic() - start_time
+        stats.confirm_latencies.append(stats.elapsed)
+        self._notify(queue_name)
+        return stats
+
+    def _insert(self, queue_name: str, body: Dict, priority: Optional[int],
+                enqueued_at: float, available_at: float) -> None:
+        self._conn.execute(
+            "INSERT INTO messages (queue, body, message_id, priority, enqueued_at, available_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (queue_name, encode_message(body), body.get("message_id"), priority or 0,
+             enqueued_at, available_at)
+        )
+
+    def _notify(self, queue_name: str) -> None:
+        event = self._wakeup.get(queue_name)
+        if event:
+            event.set()
+
+    async def consume(self, queue_name: str, callback: MessageCallback) -> None:
+        await self.connect()
+        # 重新开始消费时保留之前收到、尚未确认的消息
+        self._in_flight.setdefault(queue_name, set())
+        self._wakeup.setdefault(queue_name, asyncio.Event())
+        if not self._tasks:
+            self._tasks.append(asyncio.create_task(self._extend_leases()))
+        poller = asyncio.create_task(self._poll(queue_name, callback))
+        self._pollers[queue_name] = poller
+        self._tasks.append(poller)
+
+    async def cancel_consumers(self) -> None:
+        # 不直接取消轮询任务(可能正在回调中，也可能就是调用者)，唤醒后由其自行退出
+        for queue_name in list(self._pollers):
+            del self._pollers[queue_name]
+            self._notify(queue_name)
+
+    async def queue_stats(self, queue_name: str) -> QueueStats:
+        await self.connect()
+        now = time.time()
+        depth, oldest = self._conn.execute(
+            "SELECT COUNT(*), MIN(available_at) FROM messages "
+            "WHERE queue = ? AND available_at <= ? AND (lease_expires IS NULL OR lease_expires < ?)",
+            (queue_name, now, now)
+        ).fetchone()
+        in_flight = self._conn.execute(
+            "SELECT COUNT(*) FROM messages WHERE queue = ? AND lease_expires >= ?",
+            (queue_name, now)
+        ).fetchone()[0]
+        # 延迟消息与普通消息在同一队列中，available_at 之前不可见
+        delayed = self._conn.execute(
+            "SELECT COUNT(*) FROM messages WHERE queue = ? AND available_at > ? "
+            "AND (lease_expires IS NULL OR lease_expires < ?)",
+            (queue_name, now, now)
+        ).fetchone()[0]
+        return QueueStats(depth=depth, in_flight=in_flight, delayed=delayed,
+                          oldest_age=now - oldest if oldest else 0.0)
+
+    async def _poll(self, queue_name: str, callback: MessageCallback) -> None:
+        """轮询租用可见的消息，保持未确认消息数不超过 prefetch_count"""
+        in_flight = self._in_flight[queue_name]
+        wakeup = self._wakeup[queue_name]
+        poller = asyncio.current_task()
+        while self._pollers.get(queue_name) is poller:
+            capacity = self.prefetch_count - len(in_flight)
+            leased = self._lease(queue_name, capacity) if capacity > 0 else []
+            for position, (row_id, body, message_id) in enumerate(leased):
+                if self._pollers.get(queue_name) is not poller:
+                    # 已停止消费，归还尚未交给回调的消息
+                    for row in leased[position:]:
+                        self._finish(row[0], delete=False)
+                    return
+                in_flight.add(row_id)
+                await callback(SQLiteMessage(self, row_id, body, message_id))
+            if not leased:
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _lease(self, queue_name: str, limit: int) -> List[tuple]:
+        now = time.time()
+        with ImmediateTransaction(self._conn):
+            rows = self._conn.execute(
+                "SELECT id, body, message_id FROM messages "
+                "WHERE queue = ? AND available_at <= ? AND (lease_expires IS NULL OR lease_expires < ?) "
+                "ORDER BY priority DESC, id LIMIT ?",
+                (queue_name, now, now, limit)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE messages SET lease_owner = ?, lease_expires = ? WHERE id = ?",
+                [(self.consumer_id, now + self.visibility_timeout, row[0]) for row in rows]
+            )
+        return rows
+
+    async def _extend_leases(self) -> None:
+        """处理中的消息定期续租，避免长时间下载时消息被其他消费者取走"""
+        while True:
+            await asyncio.sleep(max(1, self.visibility_timeout // 3))
+            with ImmediateTransaction(self._conn):
+                self._conn.execute(
+                    "UPDATE messages SET lease_expires = ? WHERE lease_owner = ?",
+                    (time.time() + self.visibility_timeout, self.consumer_id)
+                )
+
+    def _finish(self, row_id: int, delete: bool) -> None:
+        """确认(删除)或归还消息"""
+        with ImmediateTransaction(self._conn):
+            if delete:
+                self._conn.execute(
+                    "DELETE FROM messages WHERE id = ? AND lease_owner = ?", (row_id, self.consumer_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE messages SET lease_owner = NULL, lease_expires = NULL, available_at = ? "
+                    "WHERE id = ? AND lease_owner = ?",
+                    (time.time(), row_id, self.consumer_id)
+                )
+        for queue_name, in_flight in self._in_flight.items():
+            if row_id in in_flight:
+                in_flight.discard(row_id)
+                self._notify(queue_name)
+                break
+
+
+def create_queue_backend(url: str, prefetch_count: int = 10,
+                         management_url: Optional[str] = None) -> QueueBackend:
+    """按地址创建队列后端
+
+    amqp:// 或 amqps:// 使用 RabbitMQ，sqlite:///路径 使用内置的 SQLite 队列
+    (sqlite:// 不带路径时使用默认的 state/queue.db)。
+    management_url 为 RabbitMQ 管理插件的 HTTP 地址，查询队列状态时使用，不指定时按连接地址推断。
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        db_path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else ""
+        return SQLiteQueueBackend(Path(db_path) if db_path else None, prefetch_count=prefetch_count)
+    if parsed.scheme in ("amqp", "amqps"):
+        # 按需导入，只使用 SQLite 队列时不需要安装 aio_pika
+        from .rabbitmq_backend import RabbitMQQueueBackend
+        return RabbitMQQueueBackend(url, prefetch_count=prefetch_count, management_url=management_url)
+    raise ValueError(f"不支持的队列地址: {url}")
+
+
+# 发布端按地址复用的队列后端
+_backends: Dict[str, QueueBackend] = {}
+
+
+def get_queue_backend(url: str) -> QueueBackend:
+    """获取(或创建)指定地址的队列后端，供发布端复用"""
+    backend = _backends.get(url)
+    if backend is None:
+        backend = create_queue_backend(url)
+        _backends[url] = backend
+    return backend
@@ -0,0 +1,145 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Optional, Callable, Dict, List, Iterable
+
+import aio_pika
+from aio_pika.pool import Pool
+
+from .message_codec import encode_message
+from .queue_backend import PublishStats
+
+
+class QueuePublisher:
+    """RabbitMQ发布器
+
+    复用长连接和通道池，按窗口流水线发布消息并等待发布确认，
+    确认失败的消息会在窗口内重试。
+    """
+
+    def __init__(self,
+                 rabbitmq_url: str,
+                 callback: Optional[Callable] = None,
+                 max_connections: int = 2,
+                 max_channels: int = 10,
+                 confirm_window: int = 200,
+                 max_attempts: int = 3):
+        self.callback = callback or print
+        self.rabbitmq_url = rabbitmq_url
+        self.max_connections = max_connections
+        self.max_channels = max_channels
+        self.confirm_window = confirm_window
+        self.max_attempts = max_attempts
+        self._connection_pool: Optional[Pool] = None
+        self._channel_pool: Optional[Pool] = None
+
+    def log(self, message: str):
+        """日志输出"""
+        self.callback(message)
+
+    def _ensure_pools(self):
+        """延迟创建连接池和通道池(需在事件循环中调用)"""
+        if self._channel_pool is None:
+            self._connection_pool = Pool(self._get_connection, max_size=self.max_connections)
+            self._channel_pool = Pool(self._get_channel, max_size=self.max_channels)
+
+    async def _get_connection(self) -> aio_pika.abc.AbstractRobustConnection:
+        return await aio_pika.connect_robust(self.rabbitmq_url)
+
+    async def _get_channel(self) -> aio_pika.abc.AbstractChannel:
+        async with self._connection_pool.acquire() as connection:
+            return await connection.channel(publisher_confirms=True)
+
+    async def publish(self, body: Dict, routing_key: str, priority: Optional[int] = None) -> bool:
+        """发布单条消息并等待确认"""
+        stats = await self.publish_batch([body], routing_key, priority=priority)
+        return stats.failed == 0
+
+    async def publish_batch(self, bodies: Iterable[Dict], routing_key: str,
+                            priority: Optional[int] = None) -> PublishStats:
+        """批量发布消息
+
+        每个窗口内的消息并发发布，再统一等待发布确认；
+        被拒绝或超时的消息最多重试 max_attempts 次。
+        """
+        self._ensure_pools()
+        stats = PublishStats()
+        start_time = time.monotonic()
+
+        async with self._channel_pool.acquire() as channel:
+            await self._ensure_open(channel)
+            window: List[Dict] = []
+            for body in bodies:
+                window.append(body)
+                if len(window) >= self.confirm_window:
+                    await self._publish_window(channel, window, routing_key, priority, stats)
+                    window = []
+            if window:
+                await self._publish_window(channel, window, routing_key, priority, stats)
+
+        stats.elapsed = time.monotonic() - start_time
+        return stats
+
+    async def _publish_window(self, channel: aio_pika.abc.AbstractChannel, window: List[Dict],
+                              routing_key: str, priority: Optional[int], stats: PublishStats) -> None:
+        """发布一个窗口的消息，并对未确认的消息重试"""
+        pending = window
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt > 1:
+                # 发布出错时服务端可能已关闭通道，重试前重新打开
+                await self._ensure_open(channel)
+            results = await asyncio.gather(
+                *(self._publish_one(channel, body, routing_key, priority) for body in pending),
+                return_exceptions=True
+            )
+
+            retry = []
+            for body, result in zip(pending, results):
+                if isinstance(result, BaseException):
+                    retry.append(body)
+                else:
+                    stats.published += 1
+                    stats.confirm_latencies.append(result)
+
+            if not retry:
+                return
+            if attempt < self.max_attempts:
+                self.log(f"{len(retry)} 条消息未被确认，重试发布 ({attempt}/{self.max_attempts})")
+                await asyncio.sleep(attempt)
+            pending = retry
+
+        stats.failed += len(pending)
+        stats.failed_messages.extend(pending)
+        self.log(f"{len(pending)} 条消息发布失败")
+
+    async def _ensure_open(self, channel: aio_pika.abc.AbstractChannel) -> None:
+        """通道池不会剔除已关闭的通道，取出后检查并在原对象上重新打开"""
+        if channel.is_closed:
+            self.log("发布通道已关闭，重新打开")
+            await channel.reopen()
+
+    @staticmethod
+    async def _publish_one(channel: aio_pika.abc.AbstractChannel, body: Dict,
+                           routing_key: str, priority: Optional[int]) -> float:
+        """发布一条消息，返回从发布到收到确认的耗时"""
+        start_time = time.monotonic()
+        await channel.default_exchange.publish(
+            aio_pika.Message(
+                body=encode_message(body),
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                priority=priority,
+                # 管理接口据此给出队首消息的等待时间
+                timestamp=datetime.now(timezone.utc)
+            ),
+            routing_key=routing_key
+        )
+        return time.monotonic() - start_time
+
+    async def close(self):
+        """关闭通道池和连接池"""
+        if self._channel_pool is not None:
+            await self._channel_pool.close()
+            await self._connection_pool.close()
+            self._channel_pool = None
+            self._connection_pool = None
+
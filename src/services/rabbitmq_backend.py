@@ -0,0 +1,174 @@
+import re
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, Iterable, Set
+from urllib.parse import urlparse, quote, unquote
+
+import aio_pika
+import httpx
+
+from .message_codec import encode_message
+from .queue_backend import QueueBackend, QueueMessage, MessageCallback, PublishStats, QueueStats
+from .queue_publisher import QueuePublisher
+
+
+class RabbitMQMessage(QueueMessage):
+    """对 aio_pika 消息的包装"""
+
+    def __init__(self, message: aio_pika.abc.AbstractIncomingMessage):
+        super().__init__(message.body, message.message_id)
+        self.message = message
+
+    async def ack(self) -> None:
+        self.processed = True
+        await self.message.ack()
+
+    async def nack(self, requeue: bool = True) -> None:
+        self.processed = True
+        await self.message.nack(requeue=requeue)
+
+
+class RabbitMQQueueBackend(QueueBackend):
+    """RabbitMQ 队列后端
+
+    延迟消息发布到按延迟时长命名的 TTL 队列，到期后经默认交换机死信转发回目标队列；
+    批量发布使用带发布确认的 QueuePublisher；队列状态通过管理插件的 HTTP 接口查询。
+    """
+
+    def __init__(self, rabbitmq_url: str, prefetch_count: int = 10, management_url: Optional[str] = None):
+        self.rabbitmq_url = rabbitmq_url
+        self.prefetch_count = prefetch_count
+        # 管理插件的 HTTP 地址，用于查询未确认的消息数和队首消息的等待时间
+        self.management_url = management_url or self.default_management_url(rabbitmq_url)
+        self._http: Optional[httpx.AsyncClient] = None
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self.channel: Optional[aio_pika.abc.AbstractChannel] = None
+        self.publisher = QueuePublisher(rabbitmq_url)
+        self._queues: Dict[str, aio_pika.abc.AbstractQueue] = {}
+        self._delay_queues: Set[str] = set()
+        # 队列名称 -> 消费者标签
+        self._consumers: Dict[str, str] = {}
+
+    @property
+    def is_connected(self) -> bool:
+        return (self.connection is not None and not self.connection.is_closed
+                and self.channel is not None and not self.channel.is_closed)
+
+    async def connect(self) -> None:
+        if self.is_connected:
+            return
+        self.connection = await aio_pika.connect_robust(self.rabbitmq_url)
+        self.channel = await self.connection.channel()
+        # 设置 QoS，限制每个消费者未确认消息的数量
+        await self.channel.set_qos(prefetch_count=self.prefetch_count)
+        self._queues.clear()
+        self._delay_queues.clear()
+        self._consumers.clear()
+
+    async def close(self) -> None:
+        if self.connection and not self.connection.is_closed:
+            await self.connection.close()
+        self.connection = None
+        self.channel = None
+        await self.publisher.close()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def declare_queue(self, queue_name: str) -> None:
+        await self._declare(queue_name)
+
+    async def _declare(self, queue_name: str) -> aio_pika.abc.AbstractQueue:
+        """声明一个持久化的队列"""
+        await self.connect()
+        if queue_name not in self._queues:
+            self._queues[queue_name] = await self.channel.declare_queue(queue_name, durable=True)
+        return self._queues[queue_name]
+
+    async def _declare_delay_queue(self, queue_name: str, delay: int) -> str:
+        """声明延迟队列：消息在其中等待TTL到期后，经默认交换机死信转发回目标队列"""
+        delay_queue = self.delay_queue_name(queue_name, delay)
+        if delay_queue not in self._delay_queues:
+            await self.channel.declare_queue(
+                delay_queue,
+                durable=True,
+                arguments={
+                    "x-message-ttl": delay * 1000,
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": queue_name
+                }
+            )
+            self._delay_queues.add(delay_queue)
+        return delay_queue
+
+    @staticmethod
+    def delay_queue_name(queue_name: str, delay: int) -> str:
+        """延迟队列名称，按延迟时长命名以便复用和修改配置"""
+        return f"{queue_name}_retry_{delay}s"
+
+    async def publish(self, queue_name: str, body: Dict, priority: Optional[int] = None,
+                      delay: int = 0) -> None:
+        await self.connect()
+        routing_key = await self._declare_delay_queue(queue_name, delay) if delay > 0 else queue_name
+        await self.channel.default_exchange.publish(
+            aio_pika.Message(
+                body=encode_message(body),
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                priority=priority,
+                timestamp=datetime.now(timezone.utc)
+            ),
+            routing_key=routing_key
+        )
+
+    async def publish_batch(self, queue_name: str, bodies: Iterable[Dict],
+                            priority: Optional[int] = None) -> PublishStats:
+        return await self.publisher.publish_batch(bodies, routing_key=queue_name, priority=priority)
+
+    async def consume(self, queue_name: str, callback: MessageCallback) -> None:
+        queue = await self._declare(queue_name)
+
+        async def on_message(message: aio_pika.abc.AbstractIncomingMessage):
+            await callback(RabbitMQMessage(message))
+
+        self._consumers[queue_name] = await queue.consume(on_message)
+
+    async def cancel_consumers(self) -> None:
+        for queue_name, consumer_tag in list(self._consumers.items()):
+            del self._consumers[queue_name]
+            if self.is_connected:
+                await self._queues[queue_name].cancel(consumer_tag)
+
+    async def queue_stats(self, queue_name: str) -> QueueStats:
+        """通过管理插件的 HTTP 接口查询，AMQP 只能查到可消费的消息数
+
+        延迟重试中的消息数为该队列所有延迟队列(delay_queue_name)中的消息数之和。
+        """
+        vhost = quote(unquote(urlparse(self.rabbitmq_url).path[1:]) or "/", safe='')
+        if self._http is None:
+            self._http = httpx.AsyncClient(trust_env=False, timeout=10.0)
+        response = await self._http.get(f"{self.management_url.rstrip('/')}/api/queues/{vhost}",
+                                        params={"columns": "name,messages,messages_ready,"
+                                                           "messages_unacknowledged,head_message_timestamp"})
+        response.raise_for_status()
+        delay_queue = re.compile(re.escape(queue_name) + r"_retry_\d+s")
+        stats = QueueStats()
+        for info in response.json():
+            name = info.get("name", "")
+            if name == queue_name:
+                stats.depth = info.get("messages_ready", 0)
+                stats.in_flight = info.get("messages_unacknowledged", 0)
+                # 队首消息的发布时间，发布时设置了 timestamp 属性才有
+                head_timestamp = info.get("head_message_timestamp")
+                if stats.depth and head_timestamp:
+                    stats.oldest_age = max(0.0, time.time() - head_timestamp)
+            elif delay_queue.fullmatch(name):
+                stats.delayed += info.get("messages", 0)
+        return stats
+
+    @staticmethod
+    def default_management_url(rabbitmq_url: str) -> str:
+        """按连接地址推断管理插件的 HTTP 地址：同一主机的 15672 端口，使用相同的用户名和密码"""
+        parsed = urlparse(rabbitmq_url)
+        scheme = "https" if parsed.scheme == "amqps" else "http"
+        credentials = f"{parsed.username or 'guest'}:{parsed.password or 'guest'}"
+        return f"{scheme}://{credentials}@{parsed.hostname or 'localhost'}:15672"
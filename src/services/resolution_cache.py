@@ -0,0 +1,77 @@
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from ..core.config import config
+from ..utils.song_key import normalize_song_name
+from ..utils.sqlite_utils import connect_sqlite
+
+# 按匹配得分选择的结果记在 n = 0 下，与按序号记录的搜索结果分开
+MATCH_N = 0
+
+
+class ResolutionCache:
+    """搜索关键词到歌曲 mid 的映射
+
+    按关键词搜索并取第 n 个结果需要一次搜索请求，而通过 mid 获取歌曲信息更便宜。
+    第一次解析(或搜索)后记录 (规范化关键词, n) -> mid，之后的下载、降音质重试和
+    仅下载歌词都直接使用 mid。
+    匹配模式选出的结果记在 n = MATCH_N 下并附带匹配得分，读取时可要求得分不低于阈值。
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or config.STATE_DIR / 'resolution_cache.db')
+        self._conn = connect_sqlite(self.db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS resolutions ("
+            "keyword TEXT NOT NULL, n INTEGER NOT NULL, mid TEXT NOT NULL, "
+            "song TEXT, singer TEXT, resolved_at REAL NOT NULL, score REAL, PRIMARY KEY (keyword, n))"
+        )
+        # 旧版本建立的表没有 score 列
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(resolutions)")}
+        if 'score' not in columns:
+            self._conn.execute("ALTER TABLE resolutions ADD COLUMN score REAL")
+
+    def get(self, keyword: str, n: int = 1, min_score: Optional[float] = None) -> Optional[str]:
+        """已记录的 mid，没有时返回 None；指定 min_score 时只返回匹配得分不低于它的记录"""
+        row = self._conn.execute(
+            "SELECT mid, score FROM resolutions WHERE keyword = ? AND n = ?", (normalize_song_name(keyword), n)
+        ).fetchone()
+        if not row:
+            return None
+        if min_score is not None and (row[1] is None or row[1] < min_score):
+            return None
+        return row[0]
+
+    def put(self, keyword: str, n: int, mid: str, song: Optional[str] = None,
+            singer: Optional[str] = None, score: Optional[float] = None) -> None:
+        """记录关键词第 n 个结果(n 为 MATCH_N 时为匹配选出的结果)的 mid"""
+        if not mid:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO resolutions (keyword, n, mid, song, singer, resolved_at, score) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (normalize_song_name(keyword), n, mid, song, singer, time.time(), score)
+        )
+
+    def put_search_results(self, keyword: str, results: Iterable) -> None:
+        """记录一次搜索的全部结果，第 i 个结果对应 n = i"""
+        now = time.time()
+        key = normalize_song_name(keyword)
+        rows = [(key, n, song.mid, song.song, song.singer, now)
+                for n, song in enumerate(results, 1) if song.mid]
+        if rows:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO resolutions (keyword, n, mid, song, singer, resolved_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def forget(self, keyword: str, n: int = 1) -> None:
+        """删除记录，例如记录的 mid 已无法下载"""
+        self._conn.execute(
+            "DELETE FROM resolutions WHERE keyword = ? AND n = ?", (normalize_song_name(keyword), n)
+        )
+
+    def close(self) -> None:
+        self._conn.close()
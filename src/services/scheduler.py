@@ -0,0 +1,257 @@
+import asyncio
+import time
+import zlib
+from collections import deque, Counter
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# 交互式请求(如 /song 单曲)与批量歌单使用不同的通道
+# 每个通道是独立的队列，由消费端按权重轮询取出，不使用 AMQP 消息优先级(同一队列内的消息优先级都相同)
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+
+# 消息未携带提交者/歌单信息时使用的默认值
+DEFAULT_SUBMITTER = "anonymous"
+DEFAULT_PLAYLIST = ""
+
+# 默认消费权重：交互通道每取 8 条，批量通道取 1 条，避免批量任务被完全饿死
+DEFAULT_LANE_WEIGHTS = {
+    LANE_INTERACTIVE: 8,
+    LANE_BULK: 1,
+}
+
+
+# 各通道在服务端的分片队列数。批量通道按 (提交者, 歌单) 散列到不同的分片，消费端同时消费所有分片，
+# 每个分片只预取少量消息，再由本地调度器在各分片的消息之间公平选择：
+# 一个超大歌单只占一个分片，其他人的歌曲不必排在它后面等待(随机公平排队)。
+# 分片数只能增加：减少后，超出范围的分片中的消息不会再被消费。
+LANE_SHARDS = {
+    LANE_INTERACTIVE: 1,
+    LANE_BULK: 8,
+}
+
+
+def flow_shard(submitter: Optional[str], playlist: Optional[str], shards: int) -> int:
+    """(提交者, 歌单) 散列到 shards 个分片中的序号"""
+    if shards <= 1:
+        return 0
+    flow = f"{submitter or DEFAULT_SUBMITTER}\0{playlist or DEFAULT_PLAYLIST}"
+    return zlib.crc32(flow.encode('utf-8')) % shards
+
+
+def lane_shard(lane: str, submitter: Optional[str] = None, playlist: Optional[str] = None) -> int:
+    """(提交者, 歌单) 在通道中对应的分片序号，发布端和消费端(失败重试)使用同一算法"""
+    return flow_shard(submitter, playlist, LANE_SHARDS.get(lane, 1))
+
+
+def shard_queue_name(queue_name: str, lane: str, shard: int = 0) -> str:
+    """通道分片对应的队列名称，批量通道沿用原队列名，第 0 个分片不加后缀"""
+    name = queue_name if lane == LANE_BULK else f"{queue_name}_{lane}"
+    return name if shard == 0 else f"{name}_s{shard}"
+
+
+def lane_queue_name(queue_name: str, lane: str, submitter: Optional[str] = None,
+                    playlist: Optional[str] = None) -> str:
+    """(提交者, 歌单) 的消息应发布到的队列名称"""
+    return shard_queue_name(queue_name, lane, lane_shard(lane, submitter, playlist))
+
+
+def lane_queue_names(queue_name: str, lane: str) -> List[str]:
+    """通道的所有分片队列名称，消费和统计积压时使用"""
+    return [shard_queue_name(queue_name, lane, shard) for shard in range(LANE_SHARDS.get(lane, 1))]
+
+
+class LatencyStats:
+    """延迟统计，保留最近的样本用于计算百分位数"""
+
+    def __init__(self, max_samples: int = 1000):
+        self.count = 0
+        self.samples: Deque[float] = deque(maxlen=max_samples)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.samples.append(value)
+
+    def percentile(self, percent: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+    def summary(self) -> str:
+        return (f"{self.count} 条, p50 {self.percentile(50):.1f}s, "
+                f"p95 {self.percentile(95):.1f}s, max {self.percentile(100):.1f}s")
+
+
+class FairQueue:
+    """按提交者和歌单公平调度的队列
+
+    每个(提交者, 歌单)对应一个子队列，按差额轮询(DRR)依次取出：
+    每一轮每个提交者获得相同的额度，并在其活跃的歌单之间平分，
+    因此一个人提交的超大歌单不会让其他人的请求一直排队。
+    """
+
+    def __init__(self, quantum: float = 1.0):
+        self.quantum = quantum
+        self.flows: Dict[Tuple[str, str], Deque[Tuple[float, Any]]] = {}
+        self.active: Deque[Tuple[str, str]] = deque()
+        self.deficits: Dict[Tuple[str, str], float] = {}
+        self._granted: Dict[Tuple[str, str], bool] = {}
+        self._playlists_per_submitter: Counter = Counter()
+        self._size = 0
+        self._cost = 0.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def cost(self) -> float:
+        """排队中消息的总额度"""
+        return self._cost
+
+    def push(self, item: Any, submitter: str = DEFAULT_SUBMITTER,
+             playlist: str = DEFAULT_PLAYLIST, cost: float = 1.0) -> None:
+        """放入一条消息，cost 为处理该消息消耗的额度"""
+        flow = (submitter, playlist)
+        if flow not in self.flows:
+            self.flows[flow] = deque()
+            self.active.append(flow)
+            self.deficits[flow] = 0.0
+            self._granted[flow] = False
+            self._playlists_per_submitter[submitter] += 1
+        self.flows[flow].append((cost, item))
+        self._size += 1
+        self._cost += cost
+
+    def pop(self) -> Any:
+        """按差额轮询取出下一条消息"""
+        if not self._size:
+            raise IndexError("pop from empty FairQueue")
+
+        while True:
+            flow = self.active[0]
+            queue = self.flows[flow]
+            cost, item = queue[0]
+
+            if self.deficits[flow] >= cost:
+                queue.popleft()
+                self.deficits[flow] -= cost
+                self._size -= 1
+                self._cost -= cost
+                if not queue:
+                    self._remove_flow(flow)
+                return item
+
+            if self._granted[flow]:
+                # 本轮额度已用完，轮到下一个子队列
+                self._granted[flow] = False
+                self.active.rotate(-1)
+            else:
+                submitter = flow[0]
+                self.deficits[flow] += self.quantum / self._playlists_per_submitter[submitter]
+                self._granted[flow] = True
+
+    def _remove_flow(self, flow: Tuple[str, str]) -> None:
+        """子队列取空后移除，空闲的子队列不累积额度"""
+        self.active.popleft()
+        del self.flows[flow]
+        del self.deficits[flow]
+        del self._granted[flow]
+        self._playlists_per_submitter[flow[0]] -= 1
+        if not self._playlists_per_submitter[flow[0]]:
+            del self._playlists_per_submitter[flow[0]]
+
+    def items(self) -> List[Any]:
+        """所有排队中的消息"""
+        return [item for queue in self.flows.values() for _, item in queue]
+
+    def backlog(self) -> Dict[str, int]:
+        """各提交者排队中的消息数"""
+        result: Counter = Counter()
+        for (submitter, _), queue in self.flows.items():
+            result[submitter] += len(queue)
+        return dict(result)
+
+    def clear(self) -> None:
+        self.flows.clear()
+        self.active.clear()
+        self.deficits.clear()
+        self._granted.clear()
+        self._playlists_per_submitter.clear()
+        self._size = 0
+        self._cost = 0.0
+
+
+class LaneScheduler:
+    """多通道调度器
+
+    各通道的消息先缓存在本地，再按平滑加权轮询取出，
+    使交互式请求可以越过大量批量消息优先处理；
+    通道内部按提交者和歌单公平调度。
+    """
+
+    def __init__(self, weights: Optional[Dict[str, int]] = None):
+        self.weights = dict(weights or DEFAULT_LANE_WEIGHTS)
+        self.lanes: Dict[str, FairQueue] = {lane: FairQueue() for lane in self.weights}
+        self._current: Dict[str, int] = {lane: 0 for lane in self.weights}
+        self._available = asyncio.Event()
+        self.wait_stats: Dict[str, LatencyStats] = {lane: LatencyStats() for lane in self.weights}
+
+    def put(self, lane: str, item: Any, enqueued_at: Optional[float] = None,
+            submitter: Optional[str] = None, playlist: Optional[str] = None, cost: float = 1.0) -> None:
+        """放入一条消息，enqueued_at 为消息最初入队的时间戳，cost 为处理它消耗的额度(如包含的歌曲数)"""
+        self.lanes[lane].push(
+            (enqueued_at or time.time(), item),
+            submitter or DEFAULT_SUBMITTER,
+            playlist or DEFAULT_PLAYLIST,
+            cost
+        )
+        self._available.set()
+
+    async def get(self) -> Tuple[str, Any]:
+        """按权重取出下一条消息，没有消息时等待"""
+        while True:
+            lane = self._pick_lane()
+            if lane is not None:
+                enqueued_at, item = self.lanes[lane].pop()
+                self.wait_stats[lane].add(max(0.0, time.time() - enqueued_at))
+                return lane, item
+            self._available.clear()
+            await self._available.wait()
+
+    def _pick_lane(self) -> Optional[str]:
+        """平滑加权轮询选择一个非空通道"""
+        candidates = [lane for lane, items in self.lanes.items() if items]
+        if not candidates:
+            return None
+
+        total = 0
+        for lane in candidates:
+            self._current[lane] += self.weights[lane]
+            total += self.weights[lane]
+        chosen = max(candidates, key=lambda lane: self._current[lane])
+        self._current[chosen] -= total
+        return chosen
+
+    def depths(self) -> Dict[str, int]:
+        """各通道本地积压的消息数"""
+        return {lane: len(items) for lane, items in self.lanes.items()}
+
+    def cost(self) -> float:
+        """所有通道本地积压消息的总额度"""
+        return sum(queue.cost for queue in self.lanes.values())
+
+    def backlog(self) -> Dict[str, Dict[str, int]]:
+        """各通道中各提交者排队中的消息数"""
+        return {lane: queue.backlog() for lane, queue in self.lanes.items()}
+
+    def clear(self) -> List[Any]:
+        """清空所有通道，返回被丢弃的消息"""
+        dropped = [item for queue in self.lanes.values() for _, item in queue.items()]
+        for queue in self.lanes.values():
+            queue.clear()
+        return dropped
+
+    def latency_report(self) -> str:
+        """各通道等待延迟汇总"""
+        return "; ".join(f"{lane}: {stats.summary()}" for lane, stats in self.wait_stats.items())
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, Callable, Dict, AsyncIterator
+
+import aio_pika
+
+from ..core.config import config
+from ..utils.sqlite_utils import connect_sqlite, ImmediateTransaction
+
+
+def default_lock_owner() -> str:
+    """当前进程的锁持有者标识"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class SongLockLost(Exception):
+    """持有锁期间续约失败，租约可能已被其他节点接管"""
+
+
+class LockBackend(ABC):
+    """歌曲锁后端"""
+
+    @abstractmethod
+    async def acquire(self, key: str, owner: str, ttl: int) -> bool:
+        """尝试获取锁，不等待"""
+
+    @abstractmethod
+    async def renew(self, key: str, owner: str, ttl: int) -> bool:
+        """续约，锁已丢失时返回 False"""
+
+    @abstractmethod
+    async def release(self, key: str, owner: str) -> None:
+        """释放锁"""
+
+    async def close(self) -> None:
+        pass
+
+
+class SQLiteLockBackend(LockBackend):
+    """单机锁后端：同一台机器上的多个下载服务共享一个 SQLite 文件，租约到期自动失效"""
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or config.STATE_DIR / 'locks.db')
+        self._conn = connect_sqlite(self.db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS song_locks ("
+            "key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    async def acquire(self, key: str, owner: str, ttl: int) -> bool:
+        now = time.time()
+        with ImmediateTransaction(self._conn):
+            row = self._conn.execute(
+                "SELECT owner, expires_at FROM song_locks WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] > now and row[0] != owner:
+                return False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO song_locks (key, owner, expires_at) VALUES (?, ?, ?)",
+                (key, owner, now + ttl)
+            )
+            return True
+
+    async def renew(self, key: str, owner: str, ttl: int) -> bool:
+        with ImmediateTransaction(self._conn):
+            cursor = self._conn.execute(
+                "UPDATE song_locks SET expires_at = ? WHERE key = ? AND owner = ?",
+                (time.time() + ttl, key, owner)
+            )
+            return cursor.rowcount == 1
+
+    async def release(self, key: str, owner: str) -> None:
+        with ImmediateTransaction(self._conn):
+            self._conn.execute("DELETE FROM song_locks WHERE key = ? AND owner = ?", (key, owner))
+
+    async def close(self) -> None:
+        self._conn.close()
+
+
+class RabbitMQLockBackend(LockBackend):
+    """多节点锁后端：利用 RabbitMQ 排他队列实现
+
+    每把锁对应一个以锁名命名的排他队列，同一时刻只有一个连接能声明成功。
+    持有者断线后服务端会在心跳超时后删除队列，相当于租约过期，
+    因此租约时长由连接心跳决定，ttl 参数仅用于续约时检查连接是否存活。
+    """
+
+    def __init__(self, rabbitmq_url: str, prefix: str = "music_download_lock", heartbeat: int = 30):
+        self.rabbitmq_url = rabbitmq_url
+        self.prefix = prefix
+        self.heartbeat = heartbeat
+        self.connection: Optional[aio_pika.abc.AbstractConnection] = None
+        self._held: Dict[str, aio_pika.abc.AbstractChannel] = {}
+
+    async def _ensure_connection(self) -> aio_pika.abc.AbstractConnection:
+        # 不使用 robust 连接：断线后锁已丢失，不能在重连时自动重新声明排他队列
+        if self.connection is None or self.connection.is_closed:
+            self._held.clear()
+            self.connection = await aio_pika.connect(self.rabbitmq_url, heartbeat=self.heartbeat)
+        return self.connection
+
+    def _queue_name(self, key: str) -> str:
+        return f"{self.prefix}.{hashlib.sha1(key.encode()).hexdigest()}"
+
+    async def acquire(self, key: str, owner: str, ttl: int) -> bool:
+        if key in self._held:
+            return True
+        connection = await self._ensure_connection()
+        channel = await connection.channel()
+        try:
+            await channel.declare_queue(self._queue_name(key), exclusive=True, auto_delete=True)
+        except aio_pika.exceptions.ChannelClosed:
+            # RESOURCE_LOCKED：其他节点持有该锁，服务端已关闭此通道
+            return False
+        self._held[key] = channel
+        return True
+
+    async def renew(self, key: str, owner: str, ttl: int) -> bool:
+        channel = self._held.get(key)
+        return (channel is not None and not channel.is_closed
+                and self.connection is not None and not self.connection.is_closed)
+
+    async def release(self, key: str, owner: str) -> None:
+        channel = self._held.pop(key, None)
+        if channel is None or channel.is_closed:
+            return
+        try:
+            await channel.queue_delete(self._queue_name(key))
+        finally:
+            await channel.close()
+
+    async def close(self) -> None:
+        if self.connection and not self.connection.is_closed:
+            await self.connection.close()
+        self._held.clear()
+
+
+class SongLock:
+    """歌曲级租约锁
+
+    获取成功后在后台按 ttl/3 的间隔心跳续约，直到退出上下文时释放；
+    续约失败(租约已被其他节点接管)时中断上下文中的代码并抛出 SongLockLost，
+    保证从解析到落盘只有一个节点在写入。
+    """
+
+    def __init__(self, backend: LockBackend, ttl: int = 300,
+                 owner: Optional[str] = None, callback: Optional[Callable] = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.owner = owner or default_lock_owner()
+        self.callback = callback or print
+
+    def log(self, message: str):
+        """日志输出"""
+        self.callback(message)
+
+    @asynccontextmanager
+    async def lease(self, key: str) -> AsyncIterator[bool]:
+        """持有锁的上下文，产出是否获取成功；租约丢失时抛出 SongLockLost"""
+        if not await self.backend.acquire(key, self.owner, self.ttl):
+            yield False
+            return
+
+        lost = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(key, asyncio.current_task(), lost))
+        try:
+            yield True
+        except asyncio.CancelledError:
+            if not lost.is_set():
+                raise
+            # 中断由租约丢失引起，而不是外部的停止请求
+            task = asyncio.current_task()
+            if hasattr(task, "uncancel"):
+                task.uncancel()
+            raise SongLockLost(f"歌曲锁已丢失: {key}") from None
+        finally:
+            heartbeat.cancel()
+            try:
+                await heartbeat
+            except asyncio.CancelledError:
+                pass
+            await self.backend.release(key, self.owner)
+
+    async def _heartbeat(self, key: str, holder: asyncio.Task, lost: asyncio.Event):
+        """定期续约，续约失败或出错时中断持有锁的任务
+
+        续约出错时无法确认租约是否仍然有效，同样按租约丢失处理，避免在不再续约的情况下继续写入。
+        """
+        while True:
+            await asyncio.sleep(max(1, self.ttl // 3))
+            try:
+                if await self.backend.renew(key, self.owner, self.ttl):
+                    continue
+                self.log(f"歌曲锁续约失败，租约可能已丢失，中断处理: {key}")
+            except Exception as e:
+                self.log(f"歌曲锁续约出错，按租约丢失处理，中断处理: {key}: {e}")
+            lost.set()
+            holder.cancel()
+            return
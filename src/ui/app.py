@@ -30,6 +30,8 @@ class MusicDownloaderApp:
     def _init_variables(self) -> None:
         """Initialize variables"""
         self.stop_event = threading.Event()
+        # 设置时暂停下载(见 DownloadManager)，清除时继续
+        self.pause_event = threading.Event()
         self.last_progress_line = None
         self.last_update_time = 0
         self.download_thread: Optional[threading.Thread] = None
@@ -6,7 +6,9 @@ from typing import Optional
 import flet as ft
 
 from src.core.batch_downloader import BatchDownloader
+from src.core.config import config
 from src.core.downloader import MusicDownloader
+from src.handlers.report import latest_structured_report
 from src.ui.constants import UIConstants
 
 
@@ -53,7 +55,8 @@ class EventHandler:
 
             self.app.ui.download_btn.disabled = True
             self.app.ui.download_btn.style.bgcolor = ft.colors.BLUE_200
-            self.app.page.update()
+            self.app.pause_event.clear()
+            self._set_pause_buttons_state(True)
 
             self.app.download_thread = threading.Thread(
                 target=self._run_async_download_single,
@@ -89,7 +92,8 @@ class EventHandler:
 
             self.app.download_thread = threading.Thread(
                 target=self._run_async_download_batch,
-                args=(file_path, quality, lyrics_option, self.app.ui.retry_checkbox.value),
+                args=(file_path, quality, lyrics_option, self.app.ui.retry_checkbox.value,
+                      self.app.ui.resume_checkbox.value),
                 daemon=True
             )
             self.app.download_thread.start()
@@ -97,6 +101,53 @@ class EventHandler:
             self.app.log_message(f"启动批量下载时出错: {str(e)}")
             self._set_batch_buttons_state(False)
 
+    def on_retry_failed(self, _):
+        """重试失败歌曲：路径输入框中是结构化报告(.jsonl)时使用该报告，否则使用最近一次的结构化报告"""
+        try:
+            report_path = self.app.ui.file_path_input.value
+            if not report_path or not report_path.endswith('.jsonl'):
+                latest = latest_structured_report(config.REPORTS_DIR)
+                if not latest:
+                    self.app.page.show_snack_bar(ft.SnackBar(content=ft.Text("没有找到下载报告")))
+                    return
+                report_path = str(latest)
+            self.app.log_message(f"重试报告中失败的歌曲: {report_path}")
+
+            lyrics_option = self.app.ui.batch_lyrics_radio.value
+            self.app.stop_event.clear()
+            self._set_batch_buttons_state(True)
+
+            self.app.download_thread = threading.Thread(
+                target=self._run_async_retry_failed,
+                args=(report_path, lyrics_option),
+                daemon=True
+            )
+            self.app.download_thread.start()
+        except Exception as e:
+            self.app.log_message(f"启动重试时出错: {str(e)}")
+            self._set_batch_buttons_state(False)
+
+    def on_pause_download(self, _):
+        """暂停/继续下载：暂停时不再读取数据并让出带宽，继续时从断点接着下载"""
+        if self.app.pause_event.is_set():
+            self.app.pause_event.clear()
+            self.app.log_message("继续下载")
+        else:
+            self.app.pause_event.set()
+            self.app.log_message("正在暂停下载...")
+        self._set_pause_buttons_state(True)
+
+    def _set_pause_buttons_state(self, is_downloading: bool) -> None:
+        """设置暂停按钮状态，下载结束时清除暂停"""
+        if not is_downloading:
+            self.app.pause_event.clear()
+        paused = self.app.pause_event.is_set()
+        for button in (self.app.ui.pause_btn, self.app.ui.single_pause_btn):
+            button.disabled = not is_downloading
+            button.content = ft.Text("继续" if paused else "暂停", size=16)
+            button.style.bgcolor = ft.colors.ORANGE if is_downloading else ft.colors.ORANGE_200
+        self.app.page.update()
+
     def on_stop_download(self, _):
         """处理停止下载事件"""
         if self.app.download_thread and self.app.download_thread.is_alive():
@@ -138,6 +189,8 @@ class EventHandler:
         """设置批量下载按钮状态"""
         self.app.ui.batch_download_btn.disabled = is_downloading
         self.app.ui.batch_download_btn.style.bgcolor = ft.colors.BLUE_200 if is_downloading else ft.colors.BLUE
+        self.app.ui.retry_failed_btn.disabled = is_downloading
+        self._set_pause_buttons_state(is_downloading)
         self.app.ui.stop_btn.disabled = not is_downloading
         self.app.ui.stop_btn.style.bgcolor = ft.colors.RED if is_downloading else ft.colors.RED_200
         self.app.page.update()
@@ -155,7 +208,7 @@ class EventHandler:
         """Single download thread"""
         try:
             lyrics_option = self.app.ui.lyrics_radio.value
-            downloader = MusicDownloader(callback=self.app.log_message)
+            downloader = MusicDownloader(callback=self.app.log_message, pause_event=self.app.pause_event)
 
             self.app.log_message(f"开始下载: {song_name}")
             quality = self._get_quality_value()
@@ -193,7 +246,7 @@ class EventHandler:
         finally:
             self.app.ui.download_btn.disabled = False
             self.app.ui.download_btn.style.bgcolor = ft.colors.BLUE
-            self.app.page.update()
+            self._set_pause_buttons_state(False)
 
     def _run_async_download_single(self, song_name: str) -> None:
         """Run async download task wrapper"""
@@ -207,18 +260,19 @@ class EventHandler:
         finally:
             self.app.ui.download_btn.disabled = False
             self.app.ui.download_btn.style.bgcolor = ft.colors.BLUE
-            self.app.page.update()
+            self._set_pause_buttons_state(False)
 
     def _run_async_download_batch(
             self, file_path: str, quality: Optional[int], lyrics_option: str,
-            auto_retry: bool = True
+            auto_retry: bool = True, resume: bool = True
     ) -> None:
         try:
             self._setup_event_loop()
             downloader = BatchDownloader(
                 callback=self.app.log_message,
                 stop_event=self.app.stop_event,
-                auto_retry=auto_retry
+                auto_retry=auto_retry,
+                pause_event=self.app.pause_event
             )
 
             download_lyrics = lyrics_option in ("save_lyrics", "save_and_embed")
@@ -231,6 +285,7 @@ class EventHandler:
                     download_lyrics=download_lyrics,
                     embed_lyrics=embed_lyrics,
                     only_lyrics=lyrics_option == "only_lyrics",
+                    resume=resume,
                 )
             )
 
@@ -240,6 +295,25 @@ class EventHandler:
             self._set_batch_buttons_state(False)
             self.app.page.update()
 
+    def _run_async_retry_failed(self, report_path: str, lyrics_option: str) -> None:
+        try:
+            self._setup_event_loop()
+            downloader = BatchDownloader(callback=self.app.log_message, stop_event=self.app.stop_event,
+                                         pause_event=self.app.pause_event)
+            self.loop.run_until_complete(
+                downloader.retry_from_report(
+                    report_path,
+                    download_lyrics=lyrics_option in ("save_lyrics", "save_and_embed"),
+                    embed_lyrics=lyrics_option in ("embed_only", "save_and_embed"),
+                    only_lyrics=lyrics_option == "only_lyrics",
+                )
+            )
+        except Exception as e:
+            self.app.log_message(f"重试失败歌曲出错: {str(e)}")
+        finally:
+            self._set_batch_buttons_state(False)
+            self.app.page.update()
+
     def on_search(self, e):
         """搜索按钮点击事件"""
         keyword = self.app.ui.search_input.value
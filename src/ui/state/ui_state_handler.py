@@ -16,7 +16,9 @@ class UIStateHandler:
         
     def _update_download_buttons(self, state: AppState) -> None:
         """更新下载按钮状态"""
-        is_downloading = state.download.status == DownloadStatus.DOWNLOADING
+        # 暂停中仍视为下载中：可以继续或停止
+        is_downloading = state.download.status in (DownloadStatus.DOWNLOADING, DownloadStatus.PAUSED)
+        is_paused = state.download.status == DownloadStatus.PAUSED
         
         # 单曲下载按钮
         self.app.ui.download_btn.disabled = is_downloading
@@ -30,6 +32,11 @@ class UIStateHandler:
             ft.colors.BLUE_200 if is_downloading else ft.colors.BLUE
         )
         
+        # 暂停/继续按钮
+        for button in (self.app.ui.pause_btn, self.app.ui.single_pause_btn):
+            button.disabled = not is_downloading
+            button.content = ft.Text("继续" if is_paused else "暂停", size=16)
+
         # 停止按钮
         self.app.ui.stop_btn.disabled = not is_downloading
         self.app.ui.stop_btn.style.bgcolor = (
@@ -53,7 +60,7 @@ class UIStateHandler:
         
     def _update_batch_status(self, state: AppState) -> None:
         """更新批量下载状态"""
-        if state.download.status == DownloadStatus.DOWNLOADING:
+        if state.download.status in (DownloadStatus.DOWNLOADING, DownloadStatus.PAUSED):
             # 更新进度信息
             if state.batch.total_songs > 0:
                 progress = (state.batch.current_index / state.batch.total_songs) * 100
@@ -128,6 +128,7 @@ class UIComponents:
             height=50,
             content=ft.Text("下载", size=16),
         )
+        self.single_pause_btn = self._create_pause_button()
         self.control_options = ft.Column(
             [
                 ft.Text("控制选项", size=14),
@@ -244,6 +245,12 @@ class UIComponents:
             value=True,
         )
 
+        # 继续下载选项：上次批量下载中断(停止或程序退出)时从中断处继续
+        self.resume_checkbox = ft.Checkbox(
+            label="从上次中断处继续",
+            value=True,
+        )
+
         # 批量下载歌词选项
         self.batch_lyrics_radio = ft.RadioGroup(
             content=ft.Column([
@@ -275,6 +282,17 @@ class UIComponents:
             content=ft.Text("开始批量下载", size=16),
         )
 
+        # 只重试上次报告中失败的歌曲
+        self.retry_failed_btn = ft.OutlinedButton(
+            text="重试失败歌曲",
+            on_click=self.app.event_handler.on_retry_failed,
+            tooltip="重试输入框中的结构化报告(.jsonl)或最近一次下载报告中失败的歌曲",
+            width=150,
+            height=50,
+        )
+
+        self.pause_btn = self._create_pause_button()
+
         self.stop_btn = ft.ElevatedButton(
             text="停止下载",
             on_click=self.app.event_handler.on_stop_download,
@@ -417,7 +435,11 @@ class UIComponents:
                                 margin=ft.margin.only(bottom=5)
                             ),
                             ft.Container(
-                                content=self.download_btn,
+                                content=ft.Row(
+                                    [self.download_btn, self.single_pause_btn],
+                                    alignment=ft.MainAxisAlignment.CENTER,
+                                    spacing=10
+                                ),
                                 alignment=ft.alignment.center
                             )
                         ]
@@ -434,6 +456,22 @@ class UIComponents:
             padding=ft.padding.only(bottom=0)
         )
 
+    def _create_pause_button(self) -> ft.ElevatedButton:
+        """暂停/继续按钮，下载中可用"""
+        return ft.ElevatedButton(
+            text="暂停",
+            on_click=self.app.event_handler.on_pause_download,
+            disabled=True,
+            style=ft.ButtonStyle(
+                color=ft.colors.WHITE,
+                bgcolor=ft.colors.ORANGE_200,
+                padding=3,
+            ),
+            width=120,
+            height=50,
+            content=ft.Text("暂停", size=16),
+        )
+
     def _create_batch_download_view(self) -> ft.Container:
         """创建批量下载视图"""
         return ft.Container(
@@ -447,7 +485,8 @@ class UIComponents:
                         [
                             self.batch_quality_dropdown,
                             self.batch_custom_quality,
-                            self.retry_checkbox
+                            self.retry_checkbox,
+                            self.resume_checkbox
                         ],
                         alignment=ft.MainAxisAlignment.START
                     ),
@@ -464,7 +503,7 @@ class UIComponents:
                         margin=ft.margin.only(bottom=15)
                     ),
                     ft.Row(
-                        [self.batch_download_btn, self.stop_btn],
+                        [self.batch_download_btn, self.retry_failed_btn, self.pause_btn, self.stop_btn],
                         alignment=ft.MainAxisAlignment.CENTER,
                         spacing=10
                     )
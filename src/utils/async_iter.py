@@ -0,0 +1,58 @@
+import asyncio
+from typing import AsyncIterable, AsyncIterator, Iterable, List, TypeVar, Union
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+async def aiter_items(items: Union[Iterable[T], AsyncIterable[T]]) -> AsyncIterator[T]:
+    """把列表等同步可迭代对象统一为异步迭代"""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def buffered(source: AsyncIterable[T], maxsize: int = 1000) -> AsyncIterator[T]:
+    """在后台持续读取 source 并缓存最多 maxsize 个元素
+
+    消费端处理较慢(例如逐首下载)时，上游的分页请求或流式响应仍可继续读取，
+    不会因长时间不读而超时；消费端提前结束时取消后台读取。
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put(item)
+            await queue.put(_DONE)
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+async def batches(source: AsyncIterable[T], size: int) -> AsyncIterator[List[T]]:
+    """按 size 个一组读取"""
+    batch: List[T] = []
+    async for item in source:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
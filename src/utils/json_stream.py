@@ -0,0 +1,72 @@
+import json
+import re
+from typing import Any, Dict, List
+
+
+class JsonArrayStream:
+    """增量解析 JSON 响应中指定键的数组
+
+    响应按块传入 feed，数组中每解析出一个完整元素就立即返回，
+    不必等待整个响应下载完成；其余字段在 finish 时解析。
+    数组元素不会保留在内存中，finish 返回的对象中该数组为空列表。
+    """
+
+    def __init__(self, key: str):
+        self._key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._skeleton: List[str] = []
+        self._state = "before"  # before: 数组之前, items: 数组中, after: 数组之后
+
+    def feed(self, text: str) -> List[Any]:
+        """传入一段响应文本，返回新解析出的数组元素"""
+        self._buffer += text
+        items = []
+
+        if self._state == "before":
+            match = self._key_pattern.search(self._buffer)
+            if not match:
+                # 保留末尾一段，键名可能被分在两块之间
+                keep = max(0, len(self._buffer) - 256)
+                self._skeleton.append(self._buffer[:keep])
+                self._buffer = self._buffer[keep:]
+                return items
+            self._skeleton.append(self._buffer[:match.end()])
+            self._buffer = self._buffer[match.end():]
+            self._state = "items"
+
+        if self._state == "items":
+            position = 0
+            while True:
+                while position < len(self._buffer) and self._buffer[position] in " \t\r\n,":
+                    position += 1
+                if position >= len(self._buffer):
+                    break
+                if self._buffer[position] == "]":
+                    self._skeleton.append("]")
+                    position += 1
+                    self._state = "after"
+                    break
+                try:
+                    item, end = self._decoder.raw_decode(self._buffer, position)
+                except json.JSONDecodeError:
+                    # 元素尚未完整，等待下一块
+                    break
+                if end >= len(self._buffer) and not isinstance(item, (str, list, dict)):
+                    # 数字等元素可能被截断，等待分隔符后再确认
+                    break
+                items.append(item)
+                position = end
+            self._buffer = self._buffer[position:]
+
+        if self._state == "after":
+            self._skeleton.append(self._buffer)
+            self._buffer = ""
+
+        return items
+
+    def finish(self) -> Dict:
+        """响应结束，解析数组以外的字段"""
+        if self._state == "items":
+            raise ValueError("响应在数组结束前中断")
+        return json.loads("".join(self._skeleton) + self._buffer)
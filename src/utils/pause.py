@@ -0,0 +1,29 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+# 暂停时检查是否已继续的间隔(秒)
+PAUSE_POLL_INTERVAL = 0.2
+
+
+def is_paused(pause_event: Optional[threading.Event]) -> bool:
+    return bool(pause_event and pause_event.is_set())
+
+
+async def wait_while_paused(pause_event: Optional[threading.Event],
+                            stop_event: Optional[threading.Event] = None,
+                            timeout: Optional[float] = None) -> bool:
+    """暂停中(pause_event 已设置)时等待，返回是否已继续
+
+    pause_event 和 stop_event 可以在其他线程(界面)中设置，因此定期检查而不是 await。
+    停止(stop_event 已设置)或等待超过 timeout 秒时返回 False，未暂停时立即返回 True。
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while is_paused(pause_event):
+        if stop_event and stop_event.is_set():
+            return False
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(PAUSE_POLL_INTERVAL)
+    return True
@@ -0,0 +1,24 @@
+import re
+import unicodedata
+from typing import Optional
+
+# 统一各种分隔符写法，例如 "歌名-歌手"、"歌名 — 歌手"
+_SEPARATOR_PATTERN = re.compile(r'\s*[-—–]\s*')
+_SPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_song_name(song_name: str) -> str:
+    """规范化 "歌名 - 歌手" 形式的歌曲名称，用于比较和去重"""
+    name = unicodedata.normalize('NFKC', song_name).strip()
+    if name.startswith('- '):
+        name = name[2:]
+    parts = [_SPACE_PATTERN.sub(' ', part).strip().casefold()
+             for part in _SEPARATOR_PATTERN.split(name, maxsplit=1)]
+    return ' - '.join(part for part in parts if part)
+
+
+def song_idempotency_key(song_name: Optional[str] = None, songmid: Optional[str] = None) -> str:
+    """歌曲的幂等键：优先使用 songmid，否则使用规范化后的歌名和歌手"""
+    if songmid:
+        return f"mid:{songmid}"
+    return f"song:{normalize_song_name(song_name or '')}"
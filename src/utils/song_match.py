@@ -0,0 +1,110 @@
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import List, Optional, Sequence, Set, Tuple
+
+# 括号及其中的内容，例如 "(Live)"、"【伴奏】"
+_BRACKET_PATTERN = re.compile(r'[\(（\[【《<].*?[\)）\]】》>]')
+_ARTIST_SEPARATOR_PATTERN = re.compile(r'\s*(?:/|、|,|，|&|;|；|\bfeat\.?|\bft\.?|\bx\b)\s*', re.IGNORECASE)
+_PUNCTUATION_PATTERN = re.compile(r'[\s\-—–_·.,，。!！?？\'"‘’“”]+')
+
+# 请求中没有这些词而候选结果中有时扣分(现场版、伴奏、翻唱等)
+VERSION_PENALTIES = {
+    'live': 0.3, '现场': 0.3, '演唱会': 0.3,
+    '伴奏': 0.5, 'instrumental': 0.5, '纯音乐': 0.4, 'karaoke': 0.5, 'ktv': 0.4,
+    '翻唱': 0.4, 'cover': 0.4,
+    'remix': 0.3, 'dj': 0.3, '0.8x': 0.3, '1.2x': 0.3, '降调': 0.3, '升调': 0.3,
+}
+
+TITLE_WEIGHT = 0.6
+ARTIST_WEIGHT = 0.4
+# 排名靠后的结果略微扣分，得分相同时优先原始排序
+POSITION_PENALTY = 0.01
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize('NFKC', text or '').casefold().strip()
+
+
+def _bare(text: str) -> str:
+    """去掉括号内容和标点后的文本，用于相似度比较"""
+    return _PUNCTUATION_PATTERN.sub('', _BRACKET_PATTERN.sub('', _normalize(text)))
+
+
+def split_song_name(song_name: str) -> Tuple[str, str]:
+    """把 "歌名 - 歌手" 拆分为 (歌名, 歌手)，没有歌手时歌手为空字符串"""
+    parts = re.split(r'\s+[-—–]\s+', song_name.strip(), maxsplit=1)
+    if len(parts) == 1:
+        parts = re.split(r'\s*[-—–]\s*', song_name.strip(), maxsplit=1)
+    title = parts[0].strip()
+    return title, parts[1].strip() if len(parts) > 1 else ''
+
+
+def split_artists(artists: str) -> Set[str]:
+    return {_bare(artist) for artist in _ARTIST_SEPARATOR_PATTERN.split(_normalize(artists)) if _bare(artist)}
+
+
+def title_similarity(requested: str, candidate: str) -> float:
+    requested, candidate = _bare(requested), _bare(candidate)
+    if not requested or not candidate:
+        return 0.0
+    if requested == candidate:
+        return 1.0
+    return SequenceMatcher(None, requested, candidate).ratio()
+
+
+def artist_overlap(requested: str, candidate: str) -> float:
+    """请求的歌手中出现在候选结果里的比例，名字互相包含也算匹配(例如带英文名的写法)"""
+    requested_artists, candidate_artists = split_artists(requested), split_artists(candidate)
+    if not requested_artists or not candidate_artists:
+        return 0.0
+    matched = sum(1 for artist in requested_artists
+                  if any(artist in other or other in artist for other in candidate_artists))
+    return matched / len(requested_artists)
+
+
+def _contains(text: str, word: str) -> bool:
+    if word.isascii():
+        # 英文标记按整词匹配，避免 "Alive" 被当作 "Live"
+        return re.search(r'(?<![a-z0-9])%s(?![a-z0-9])' % re.escape(word), text) is not None
+    return word in text
+
+
+def version_penalty(requested: str, candidate: str) -> float:
+    """候选结果带有请求中没有的版本标记(Live、伴奏等)时的扣分"""
+    requested, candidate = _normalize(requested), _normalize(candidate)
+    return sum(penalty for word, penalty in VERSION_PENALTIES.items()
+               if _contains(candidate, word) and not _contains(requested, word))
+
+
+def score_candidate(title: str, artist: str, candidate_song: str, candidate_singer: str,
+                    position: int = 1) -> float:
+    """候选结果与请求的匹配得分，范围 0 ~ 1
+
+    请求没有歌手时只比较歌名。
+    """
+    title_score = title_similarity(title, candidate_song)
+    if artist:
+        score = TITLE_WEIGHT * title_score + ARTIST_WEIGHT * artist_overlap(artist, candidate_singer)
+    else:
+        score = title_score
+    score -= version_penalty(f"{title} {artist}", f"{candidate_song} {candidate_singer}")
+    score -= POSITION_PENALTY * (position - 1)
+    return max(0.0, min(1.0, score))
+
+
+def rank_candidates(song_name: str, candidates: Sequence) -> List[Tuple[float, int, object]]:
+    """按得分从高到低排列搜索结果，返回 (得分, 原始序号(从1开始), 结果)
+
+    candidates 中的元素需要有 song 和 singer 属性(例如 SearchSongData)。
+    """
+    title, artist = split_song_name(song_name)
+    ranked = [(score_candidate(title, artist, candidate.song, candidate.singer, position), position, candidate)
+              for position, candidate in enumerate(candidates, 1)]
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+    return ranked
+
+
+def best_match(song_name: str, candidates: Sequence) -> Optional[Tuple[float, int, object]]:
+    ranked = rank_candidates(song_name, candidates)
+    return ranked[0] if ranked else None
@@ -27,4 +27,15 @@ class SongScanner:
         if downloads_file.exists():
             with open(downloads_file, 'r', encoding='utf-8') as f:
                 return {line.split(' - ')[0].strip() for line in f if line.endswith(('.mp3\n', '.flac\n'))}
-        return set() 
\ No newline at end of file
+        return set()
+
+    @staticmethod
+    def song_exists(downloads_dir: Path, song_name: str) -> bool:
+        """直接检查下载目录中是否已有该歌曲(用于多个服务共享下载目录时的复查)"""
+        if not downloads_dir.exists():
+            return False
+        with os.scandir(downloads_dir) as entries:
+            return any(
+                entry.name.endswith(('.mp3', '.flac')) and entry.name.split(' - ')[0].strip() == song_name
+                for entry in entries
+            )
@@ -0,0 +1,24 @@
+import sqlite3
+from pathlib import Path
+
+
+def connect_sqlite(db_path: Path) -> sqlite3.Connection:
+    """打开可被多个进程共享的 SQLite 数据库(自动提交 + WAL)"""
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class ImmediateTransaction:
+    """BEGIN IMMEDIATE 事务，保证多进程下"读取-写入"的原子性"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False